@@ -0,0 +1,32 @@
+"""add ticker_dataset_update
+
+Revision ID: 3b7e9c1d2a4f
+Revises: e1510d4281c2
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9c1d2a4f'
+down_revision: Union[str, None] = 'e1510d4281c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ticker_dataset_update',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('dataset', sa.String(length=50), nullable=False),
+    sa.Column('last_run', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], name="fk_ticker_dataset_update_ticker", ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ticker_id', 'dataset', name="pk_ticker_dataset_update")
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ticker_dataset_update')
@@ -0,0 +1,40 @@
+"""add pipeline_run_section_stats
+
+Revision ID: 5e2a8c4b7d13
+Revises: 7c4d2e9a1f35
+Create Date: 2026-10-18 17:05:44.318902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a8c4b7d13'
+down_revision: Union[str, None] = '7c4d2e9a1f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pipeline_run_section_stats',
+    sa.Column('run_id', sa.String(length=20), nullable=False),
+    sa.Column('section', sa.String(length=50), nullable=False),
+    sa.Column('tickers', sa.Integer(), nullable=False),
+    sa.Column('calls', sa.Integer(), nullable=False),
+    sa.Column('fetch_time', sa.Float(), nullable=False),
+    sa.Column('transform_time', sa.Float(), nullable=False),
+    sa.Column('db_time', sa.Float(), nullable=False),
+    sa.Column('total_time', sa.Float(), nullable=False),
+    sa.Column('p95_time', sa.Float(), nullable=True),
+    sa.Column('rows_inserted', sa.Integer(), nullable=False),
+    sa.Column('rows_unchanged', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('run_id', 'section', name="pk_pipeline_run_section_stats")
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pipeline_run_section_stats')
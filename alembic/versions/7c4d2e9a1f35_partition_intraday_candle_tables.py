@@ -0,0 +1,97 @@
+"""partition intraday candle tables by month
+
+Revision ID: 7c4d2e9a1f35
+Revises: 3b7e9c1d2a4f
+Create Date: 2026-10-18 15:42:08.731204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4d2e9a1f35'
+down_revision: Union[str, None] = '3b7e9c1d2a4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['candle_data_1_minute', 'candle_data_5_minutes', 'candle_data_1_hour']
+
+
+def drop_constraints_and_indexes(table: str, relation: str) -> None:
+    # __ the index-backed constraints and the indexes are named after the table, free the names for the new table __
+    op.execute(f"ALTER TABLE {relation} DROP CONSTRAINT IF EXISTS {table}_pkey")
+    op.execute(f"ALTER TABLE {relation} DROP CONSTRAINT IF EXISTS uix_{table}_ticker_date")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_ticker_id")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_date")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_ticker_id_date")
+
+
+def create_constraints_and_indexes(table: str, primary_key: str) -> None:
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({primary_key})")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT uix_{table}_ticker_date UNIQUE (ticker_id, date)")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_ticker_id_fkey FOREIGN KEY (ticker_id) REFERENCES ticker (id)")
+    op.execute(f"CREATE INDEX ix_{table}_ticker_id ON {table} (ticker_id)")
+    op.execute(f"CREATE INDEX ix_{table}_date ON {table} (date)")
+    op.execute(f"CREATE INDEX ix_{table}_ticker_id_date ON {table} (ticker_id, date)")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        old = f"{table}_unpartitioned"
+
+        # __ keep the id sequence: detach it from the old table before dropping it __
+        op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {table}_ticker_id_fkey")
+        drop_constraints_and_indexes(table=table, relation=old)
+
+        # __ partitioned table with the same columns and defaults (id from the same sequence) __
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (date)")
+        create_constraints_and_indexes(table=table, primary_key="id, date")
+
+        # __ monthly partitions (UTC bounds) from the oldest candle to two months ahead __
+        op.execute(f"""
+        DO $$
+        DECLARE
+            month_start date;
+        BEGIN
+            FOR month_start IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT min(date) FROM {old}), now()) AT TIME ZONE 'UTC')::date,
+                    date_trunc('month', now() AT TIME ZONE 'UTC')::date + interval '2 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+                    '{table}_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+                    month_start::timestamp AT TIME ZONE 'UTC',
+                    (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$;
+        """)
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        op.execute(f"DROP TABLE {old}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        old = f"{table}_partitioned"
+
+        op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {table}_ticker_id_fkey")
+        drop_constraints_and_indexes(table=table, relation=old)
+
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        create_constraints_and_indexes(table=table, primary_key="id")
+
+        # __ dropping the partitioned table drops its partitions __
+        op.execute(f"DROP TABLE {old}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
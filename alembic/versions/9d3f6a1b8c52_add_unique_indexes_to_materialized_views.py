@@ -0,0 +1,40 @@
+"""add unique indexes to the materialized views
+
+Revision ID: 9d3f6a1b8c52
+Revises: 5e2a8c4b7d13
+Create Date: 2026-10-18 19:12:08.541276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6a1b8c52'
+down_revision: Union[str, None] = '5e2a8c4b7d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# __ REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index on plain columns covering all the rows __
+UNIQUE_INDEXES = {
+    'mv_recent_candle_data_day_uidx': ('mv_recent_candle_data_day', 'ticker_id'),
+    'mv_last_info_trading_session_uidx': ('mv_last_info_trading_session', 'ticker_id'),
+    'mv_last_info_general_stock_uidx': ('mv_last_info_general_stock', 'symbol'),
+    'mv_last_info_sector_industry_uidx': ('mv_last_info_sector_industry', 'ticker_id'),
+    'mv_ticker_overview_uidx': ('mv_ticker_overview', 'ticker_id'),
+    'mv_pe_uidx': ('mv_pe', '"Ticker", date'),
+    'mv_next_earnings_per_ticker_uidx': ('mv_next_earnings_per_ticker', 'ticker_id'),
+    'mv_monthly_net_insider_transactions_uidx': ('mv_monthly_net_insider_transactions', 'ticker, month'),
+}
+
+
+def upgrade() -> None:
+    for index_name, (view_name, columns) in UNIQUE_INDEXES.items():
+        op.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON public.{view_name} ({columns});")
+
+
+def downgrade() -> None:
+    for index_name in UNIQUE_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS public.{index_name};")
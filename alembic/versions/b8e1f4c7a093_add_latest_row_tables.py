@@ -0,0 +1,188 @@
+"""add latest row per ticker tables
+
+Revision ID: b8e1f4c7a093
+Revises: 9d3f6a1b8c52
+Create Date: 2026-10-18 20:31:52.117604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e1f4c7a093'
+down_revision: Union[str, None] = '9d3f6a1b8c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DROP_TICKER_OVERVIEW_SQL = """
+DROP VIEW IF EXISTS public.v_ticker_overview;
+DROP MATERIALIZED VIEW IF EXISTS public.mv_ticker_overview;
+"""
+
+
+TICKER_OVERVIEW_SELECT_SQL = """
+SELECT
+    t.id AS ticker_id,
+    t.symbol,
+    t.company_name,
+    t.last_update AS ticker_last_update,
+    igs.exchange,
+    igs.last_update AS info_general_last_update,
+    its.market_cap,
+    its.fifty_two_week_high AS "52_week_high",
+    its.fifty_two_week_low AS "52_week_low",
+    its.two_hundred_day_average AS "200MA",
+    its.current_price AS price,
+    its.last_update AS info_trading_last_update,
+    its.trailing_pe,
+    its.forward_pe,
+    rcd.close,
+    rcd.last_update AS candle_day_last_update,
+    lisi.sector,
+    lisi.industry,
+    lisi.last_update AS sector_industry_last_update,
+    (sp.ticker_id IS NOT NULL) AS sp500
+FROM ticker AS t
+LEFT JOIN {general_stock} AS igs ON igs.ticker_id = t.id
+LEFT JOIN {trading_session} AS its ON its.ticker_id = t.id
+LEFT JOIN {candle_day} AS rcd ON rcd.ticker_id = t.id
+LEFT JOIN mv_sp_500_latest_date AS sp ON sp.ticker_id = t.id
+LEFT JOIN {sector_industry} AS lisi ON lisi.ticker_id = t.id
+"""
+
+
+CREATE_MV_TICKER_OVERVIEW_SQL = "CREATE MATERIALIZED VIEW public.mv_ticker_overview AS {select} WITH DATA;"
+
+
+CREATE_MV_TICKER_OVERVIEW_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS mv_ticker_overview_tid_idx
+    ON public.mv_ticker_overview (ticker_id);
+CREATE INDEX IF NOT EXISTS mv_ticker_overview_sym_idx
+    ON public.mv_ticker_overview (symbol);
+CREATE UNIQUE INDEX IF NOT EXISTS mv_ticker_overview_uidx
+    ON public.mv_ticker_overview (ticker_id);
+"""
+
+
+CREATE_V_TICKER_OVERVIEW_SQL = """
+CREATE OR REPLACE VIEW public.v_ticker_overview AS
+SELECT
+    mvo.ticker_id,
+    mvo.symbol,
+    mvo.company_name,
+    mvo.ticker_last_update,
+    mvo.exchange,
+    mvo.info_general_last_update,
+    mvo.market_cap,
+    mvo."52_week_high",
+    mvo."52_week_low",
+    mvo."200MA",
+    mvo.price,
+    mvo.info_trading_last_update,
+    mvo.trailing_pe,
+    mvo.forward_pe,
+    mvo.close,
+    mvo.candle_day_last_update,
+    mvo.sector,
+    mvo.industry,
+    mvo.sector_industry_last_update,
+    mvo.sp500
+FROM public.mv_ticker_overview AS mvo;
+"""
+
+
+# __ latest-state table: (history table, ordering column, columns copied) __
+LATEST_TABLES = {
+    'latest_candle_data_day': ('candle_data_day', 'date', ['date', 'open', 'high', 'low', 'close', 'adj_close', 'volume', 'last_update']),
+    'latest_info_trading_session': ('info_trading_session', 'last_update', ['last_update', 'market_cap', 'current_price', 'two_hundred_day_average',
+                                                                            'fifty_two_week_high', 'fifty_two_week_low', 'trailing_pe', 'forward_pe']),
+    'latest_info_general_stock': ('info_general_stock', 'last_update', ['last_update', 'symbol', 'exchange']),
+    'latest_info_sector_industry': ('info_sector_industry_history', 'last_update', ['last_update', 'sector', 'industry']),
+}
+
+
+BACKFILL_LATEST_TABLE_SQL = """
+INSERT INTO {latest_table} (ticker_id, {columns})
+SELECT DISTINCT ON (ticker_id) ticker_id, {columns}
+FROM {history_table}
+ORDER BY ticker_id, {order_by} DESC;
+"""
+
+
+def backfill_latest_tables() -> None:
+    for latest_table, (history_table, order_by, columns) in LATEST_TABLES.items():
+        op.execute(BACKFILL_LATEST_TABLE_SQL.format(latest_table=latest_table, history_table=history_table,
+                                                    order_by=order_by, columns=', '.join(columns)))
+
+
+def recreate_ticker_overview(general_stock: str, trading_session: str, candle_day: str, sector_industry: str) -> None:
+    select = TICKER_OVERVIEW_SELECT_SQL.format(general_stock=general_stock, trading_session=trading_session,
+                                               candle_day=candle_day, sector_industry=sector_industry)
+    op.execute(DROP_TICKER_OVERVIEW_SQL)
+    op.execute(CREATE_MV_TICKER_OVERVIEW_SQL.format(select=select))
+    op.execute(CREATE_MV_TICKER_OVERVIEW_INDEXES_SQL)
+    op.execute(CREATE_V_TICKER_OVERVIEW_SQL)
+
+
+def upgrade() -> None:
+    op.create_table('latest_candle_data_day',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('open', sa.Float(), nullable=False),
+    sa.Column('high', sa.Float(), nullable=False),
+    sa.Column('low', sa.Float(), nullable=False),
+    sa.Column('close', sa.Float(), nullable=False),
+    sa.Column('adj_close', sa.Float(), nullable=True),
+    sa.Column('volume', sa.Float(), nullable=True),
+    sa.Column('last_update', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], ),
+    sa.PrimaryKeyConstraint('ticker_id')
+    )
+    op.create_table('latest_info_trading_session',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.Column('market_cap', sa.BigInteger(), nullable=True),
+    sa.Column('current_price', sa.Numeric(precision=10, scale=4), nullable=True),
+    sa.Column('two_hundred_day_average', sa.Numeric(precision=13, scale=5), nullable=True),
+    sa.Column('fifty_two_week_high', sa.Numeric(precision=10, scale=4), nullable=True),
+    sa.Column('fifty_two_week_low', sa.Numeric(precision=10, scale=4), nullable=True),
+    sa.Column('trailing_pe', sa.Numeric(precision=13, scale=7), nullable=True),
+    sa.Column('forward_pe', sa.Numeric(precision=13, scale=7), nullable=True),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], ),
+    sa.PrimaryKeyConstraint('ticker_id')
+    )
+    op.create_table('latest_info_general_stock',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.Column('symbol', sa.String(length=10), nullable=False),
+    sa.Column('exchange', sa.String(length=10), nullable=True),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], ),
+    sa.PrimaryKeyConstraint('ticker_id')
+    )
+    op.create_table('latest_info_sector_industry',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.Column('sector', sa.String(length=100), nullable=False),
+    sa.Column('industry', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], ),
+    sa.PrimaryKeyConstraint('ticker_id')
+    )
+
+    # __ the overview reads the latest-state tables: fill them from the history before rebuilding it __
+    backfill_latest_tables()
+    recreate_ticker_overview(general_stock='latest_info_general_stock', trading_session='latest_info_trading_session',
+                             candle_day='latest_candle_data_day', sector_industry='latest_info_sector_industry')
+
+
+def downgrade() -> None:
+    recreate_ticker_overview(general_stock='mv_last_info_general_stock', trading_session='mv_last_info_trading_session',
+                             candle_day='mv_recent_candle_data_day', sector_industry='mv_last_info_sector_industry')
+
+    op.drop_table('latest_info_sector_industry')
+    op.drop_table('latest_info_general_stock')
+    op.drop_table('latest_info_trading_session')
+    op.drop_table('latest_candle_data_day')
@@ -0,0 +1,90 @@
+"""add sp_500_membership
+
+Revision ID: d4a7c2e9f615
+Revises: b8e1f4c7a093
+Create Date: 2026-10-18 21:46:19.630457
+
+"""
+from typing import Sequence, Union
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c2e9f615'
+down_revision: Union[str, None] = 'b8e1f4c7a093'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def build_membership_intervals(base_date, base_ids, changes):
+    # __ frozen copy of sp500_membership.build_membership_intervals at this revision: removes before adds each day,
+    #    a ticker removed and added again the same day keeps one interval __
+    open_from = {tid: base_date for tid in base_ids}
+    intervals = []
+
+    by_day = {}
+    for day, tid, add, remove in changes:
+        ops = by_day.setdefault(day, {"add": set(), "remove": set()})
+        if remove:
+            ops["remove"].add(tid)
+        if add:
+            ops["add"].add(tid)
+
+    for day in sorted(by_day):
+        removed_today = {}
+        for tid in by_day[day]["remove"]:
+            if tid in open_from:
+                removed_today[tid] = open_from.pop(tid)
+        for tid in by_day[day]["add"]:
+            if tid not in open_from:
+                open_from[tid] = removed_today.pop(tid, day)
+        intervals.extend((tid, valid_from, day) for tid, valid_from in removed_today.items())
+
+    intervals.extend((tid, valid_from, None) for tid, valid_from in open_from.items())
+    return sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+
+
+def backfill_sp_500_membership() -> None:
+    # __ same intervals as rebuild_sp500_membership: the first snapshot and the changes after it __
+    connection = op.get_bind()
+    base_date = connection.execute(sa.text("SELECT MIN(date) FROM sp_500_historical")).scalar()
+    if base_date is None:
+        return
+
+    base_ids = {r[0] for r in connection.execute(sa.text("SELECT ticker_id FROM sp_500_historical WHERE date = :d"), {"d": base_date})}
+    changes = [tuple(r) for r in connection.execute(
+        sa.text("SELECT date, ticker_id, add, remove FROM sp_500_changes WHERE date > :d ORDER BY date, ticker_id"), {"d": base_date}
+    )]
+    intervals = build_membership_intervals(base_date=base_date, base_ids=base_ids, changes=changes)
+    if not intervals:
+        return
+
+    membership = sa.table('sp_500_membership', sa.column('ticker_id', sa.Integer()), sa.column('valid_from', sa.Date()),
+                          sa.column('valid_to', sa.Date()), sa.column('last_update', sa.DateTime()))
+    now_ts = datetime.utcnow()
+    op.bulk_insert(membership, [{'ticker_id': tid, 'valid_from': valid_from, 'valid_to': valid_to, 'last_update': now_ts}
+                                for tid, valid_from, valid_to in intervals])
+
+
+def upgrade() -> None:
+    op.create_table('sp_500_membership',
+    sa.Column('ticker_id', sa.Integer(), nullable=False),
+    sa.Column('valid_from', sa.Date(), nullable=False),
+    sa.Column('valid_to', sa.Date(), nullable=True),
+    sa.Column('last_update', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['ticker_id'], ['ticker.id'], ),
+    sa.PrimaryKeyConstraint('ticker_id', 'valid_from')
+    )
+    op.create_index('ix_sp_500_membership_valid_from_valid_to', 'sp_500_membership', ['valid_from', 'valid_to'], unique=False)
+
+    # __ the breadth queries read the intervals: build them from the stored snapshots and changes __
+    backfill_sp_500_membership()
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sp_500_membership_valid_from_valid_to', table_name='sp_500_membership')
+    op.drop_table('sp_500_membership')
@@ -3,7 +3,7 @@ import logging.config
 from pathlib import Path
 from datetime import datetime
 import yaml
-from src.stock.src.RaiseOnErrorHandler import RaiseOnErrorHandler
+from src.stock.src.YFinanceErrorCollector import YFinanceErrorCollector
 
 
 def setup_logging():
@@ -38,6 +38,6 @@ LOGGER = setup_logging()
 # Configure the logger for yfinance
 logger = logging.getLogger("yfinance")
 logger.setLevel(logging.ERROR)
-error_handler = RaiseOnErrorHandler(flush_delay=1.5)  # Wait 1.5s before raising
-logger.addHandler(error_handler)
+yf_error_collector = YFinanceErrorCollector()  # Attach errors to the call that produced them
+logger.addHandler(yf_error_collector)
 
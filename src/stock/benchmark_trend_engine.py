@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from time import time
+
+from src.stock.src.db.database import session_local
+from src.stock.src.CandleAnalysisService import CandleAnalysisService
+from src.stock.src.CandleDataInterval import CandleDataInterval
+from src.stock.src.trend_engine import njit
+
+
+def synthetic_candles(n: int, seed: int = 0) -> pd.DataFrame:
+    """Random walk candles with the columns used by the trend analysis."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n))
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close})
+
+
+def with_zero_low(candles: pd.DataFrame, position: int) -> pd.DataFrame:
+    """Candles with one Low of 0 (bad yfinance data): the trend must give inf / nan, not raise."""
+    candles = candles.copy()
+    candles.loc[candles.index[position], 'Low'] = 0.0
+    return candles
+
+
+def benchmark(label: str, candles: pd.DataFrame) -> None:
+    """Run the iterrows and the array implementations of add_trend_atr / add_trend, check they match and print the timings."""
+    candles = CandleAnalysisService.add_true_range(candles.copy())
+    candles['ATR'] = candles['TR'].rolling(window=14).mean()
+    candles['ATR%'] = candles['ATR'] / candles['Close'] * 100
+
+    cases = [
+        ('add_trend_atr', CandleAnalysisService.add_trend_atr_iterrows, CandleAnalysisService.add_trend_atr),
+        ('add_trend', CandleAnalysisService.add_trend_iterrows, CandleAnalysisService.add_trend),
+    ]
+    for name, reference_function, engine_function in cases:
+        start_time = time()
+        expected = reference_function(candles.copy())
+        reference_time = time() - start_time
+
+        timings = {}
+        for use_numba in ([False, True] if njit is not None else [False]):
+            engine_function(candles.copy(), use_numba=use_numba)  # warm-up (numba compilation)
+            start_time = time()
+            result = engine_function(candles.copy(), use_numba=use_numba)
+            timings['numba' if use_numba else 'python'] = time() - start_time
+            pd.testing.assert_frame_equal(result, expected)
+
+        speedups = ', '.join(f"{key}: {round(value, 4)} sec (x{round(reference_time / value, 1)})" for key, value in timings.items())
+        print(f"{label.ljust(25)} {name.ljust(15)} {len(candles)} candles - iterrows: {round(reference_time, 3)} sec - {speedups}")
+
+
+if __name__ == "__main__":
+    # __ synthetic histories __
+    for n_candles in [1_000, 10_000, 50_000]:
+        benchmark(label="synthetic", candles=synthetic_candles(n=n_candles))
+    benchmark(label="synthetic zero low", candles=with_zero_low(synthetic_candles(n=1_000), position=500))
+
+    # __ stored histories __
+    session = session_local()
+    for symbol in ["AAPL", "MSFT", "KO"]:
+        analysis = CandleAnalysisService(session=session, symbol=symbol, interval=CandleDataInterval.DAY)
+        if not analysis.candle_data.empty:
+            candle_data = analysis.candle_data.rename(columns={"date": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close"})
+            benchmark(label=symbol, candles=candle_data)
+    session.close()
@@ -1,14 +1,18 @@
 from dataclasses import field
 import pandas as pd
 import pandas_ta as ta
-from typing import List, Optional
+from typing import Optional
 
 from sqlalchemy.orm import session as sess
+from sqlalchemy import select, func
 
 from src.stock.src.db.models import CandleDataDay, CandleDataWeek, CandleDataMonth, CandleData1Hour, CandleData5Minutes, CandleData1Minute
 from src.stock.src.db.models import CandleAnalysisCandlestickDay, CandleAnalysisIndicatorsDay, CandleAnalysisTrendMethod1Day
 from src.stock.src.TickerServiceBase import Ticker
+from src.stock.src.db.analysis_writer import upsert_analysis_frame
 from src.stock.src.CandleDataInterval import CandleDataInterval
+from src.stock.src.CandleCache import CandleCache, get_candle_signatures
+from src.stock.src.trend_engine import compute_trend, trend_columns_to_frame, TREND_CODES
 
 
 import matplotlib
@@ -16,13 +20,21 @@ from src.common.tools.library import *
 
 matplotlib.use('TkAgg')
 
+# __ candles before the last analyzed one reloaded by the incremental analysis: MA200 needs 199, RSI needs a warm-up __
+INCREMENTAL_LOOK_BACK = 250
+# __ trend blocks before the last analyzed one reloaded for the last minimums / maximums (2 previous blocks of the same trend) __
+INCREMENTAL_BLOCKS_BACK = 6
+
 
 @dataclass
 class CandleAnalysisService:
     symbol: str                                     # The ticker symbol
     session: sess.Session                           # The database session
     interval: CandleDataInterval                    # The time interval for the candlestick data
+    incremental: bool = False                       # Whether to analyze only the candles after the last analyzed one
+    candle_cache: Optional[CandleCache] = field(default_factory=CandleCache)  # Local copy of the candles (None = database only)
     candle_data: pd.DataFrame = field(init=False)   # DataFrame to store the candlestick data
+    incremental_state: Optional[dict] = field(default=None, init=False)  # State at the last analyzed candle
 
     # Mapping of intervals to corresponding models
     interval_model_map: dict = field(default_factory=lambda: {
@@ -36,17 +48,28 @@ class CandleAnalysisService:
 
     def __post_init__(self):
         """ Load the candlestick data from the database upon initialization. """
-        self.candle_data = self.load_candle_data()
+        if self.incremental and self.interval == CandleDataInterval.DAY:
+            self.candle_data = self.load_incremental_candle_data()
+        else:
+            self.candle_data = self.load_candle_data()
 
     def load_candle_data(self) -> Optional[pd.DataFrame]:
         """
-        Load candlestick data from the database based on the ticker and interval.
+        Load candlestick data based on the ticker and interval, from the candle cache if available and in step
+        with the database, otherwise from the database (the cache is then filled with the loaded history).
 
         :return: DataFrame containing the candlestick data.
         """
         # # __ sqlAlchemy __ create new session
         # session = session_local()
 
+        if self.candle_cache is not None and self.candle_cache.exists(interval=self.interval, symbol=self.symbol):
+            signature = get_candle_signatures(self.session, self.interval_model_map.get(self.interval), [self.symbol]).get(self.symbol)
+            df = self.candle_cache.read(interval=self.interval, symbol=self.symbol, signature=signature) if signature else None
+            if df is not None:
+                print(f"        - {df.shape[0]} candles loaded from cache for {self.symbol} with interval {self.interval.value}")
+                return df
+
         try:
             # Get the candlestick model corresponding to the interval
             model_class = self.interval_model_map.get(self.interval)
@@ -59,6 +82,9 @@ class CandleAnalysisService:
             # Convert the query results to a DataFrame
             df = pd.read_sql(query.statement, self.session.bind)
 
+            if self.candle_cache is not None:
+                self.candle_cache.write(interval=self.interval, symbol=self.symbol, df=df)
+
             print(f"        - {df.shape[0]} candles loaded for {self.symbol} with interval {self.interval.value}")
             return df
         except Exception as e:
@@ -68,6 +94,89 @@ class CandleAnalysisService:
         #     # Close the database session
         #     self.session.close()
 
+    def load_incremental_candle_data(self) -> Optional[pd.DataFrame]:
+        """
+        Load the candles after the last analyzed one plus the look-back window, with the trend columns persisted
+        for the analyzed candles, and rebuild the state of the trend at the last analyzed candle from its row.
+
+        Falls back to the full history when the ticker has never been analyzed, or when an analyzed candle
+        has been modified after its analysis (e.g. stock split adjustment) or is missing its analysis.
+
+        :return: DataFrame containing the candlestick data.
+        """
+        try:
+            trend_model = CandleAnalysisTrendMethod1Day
+            ticker = self.session.query(Ticker).filter(Ticker.symbol == self.symbol).first()
+            if not ticker:
+                raise ValueError(f"Ticker with symbol '{self.symbol}' not found.")
+
+            # __ last analyzed candle __
+            last = (self.session
+                    .query(CandleDataDay.date, trend_model)
+                    .join(trend_model, trend_model.candle_data_day_id == CandleDataDay.id)
+                    .filter(CandleDataDay.ticker_id == ticker.id)
+                    .order_by(CandleDataDay.date.desc())
+                    .first())
+            if last is None:
+                print(f"        - No previous analysis for {self.symbol}, loading the full history")
+                return self.load_candle_data()
+
+            last_date, last_row = last
+
+            # __ start of the window: look-back candles for the indicators and previous blocks for the extreme points __
+            look_back_date = (self.session
+                              .query(CandleDataDay.date)
+                              .filter(CandleDataDay.ticker_id == ticker.id, CandleDataDay.date <= last_date)
+                              .order_by(CandleDataDay.date.desc())
+                              .offset(INCREMENTAL_LOOK_BACK - 1)
+                              .limit(1)
+                              .scalar())
+            blocks_date = (self.session
+                           .query(func.min(CandleDataDay.date))
+                           .join(trend_model, trend_model.candle_data_day_id == CandleDataDay.id)
+                           .filter(CandleDataDay.ticker_id == ticker.id, trend_model.block >= last_row.block - INCREMENTAL_BLOCKS_BACK)
+                           .scalar())
+            start_date = min(date_ for date_ in [look_back_date, blocks_date, last_date] if date_ is not None)
+
+            query = (
+                select(CandleDataDay,
+                       trend_model.curr_max.label('currMax'),
+                       trend_model.curr_min.label('currMin'),
+                       trend_model.trend.label('Trend'),
+                       trend_model.session.label('Session'),
+                       trend_model.block.label('block'),
+                       trend_model.last_update.label('analysis_last_update'))
+                .outerjoin(trend_model, trend_model.candle_data_day_id == CandleDataDay.id)
+                .where(CandleDataDay.ticker_id == ticker.id, CandleDataDay.date >= start_date)
+                .order_by(CandleDataDay.date)
+            )
+            df = pd.read_sql(query, self.session.bind)
+
+            # __ the persisted analysis must still describe the candles up to the last analyzed one __
+            analyzed = df['date'] <= last_date
+            if df.loc[analyzed, 'Session'].isna().any() or (df.loc[analyzed, 'last_update'] > df.loc[analyzed, 'analysis_last_update']).any():
+                print(f"        - Analyzed candles changed for {self.symbol}, loading the full history")
+                return self.load_candle_data()
+
+            self.incremental_state = {
+                'last_date': last_date,
+                'last_session': int(last_row.session),
+                'last_block': int(last_row.block),
+                'last_trend': last_row.trend or '',  # __ NULL and '' are both "no trend" __
+                'trend': {'curr_max': last_row.curr_max,
+                          'curr_min': last_row.curr_min,
+                          'all_time_high': last_row.trend_all_time_high,
+                          'all_time_high_index': int(last_row.session - last_row.trend_days_from_all_time_high),
+                          'trend': TREND_CODES[last_row.trend or '']}
+            }
+
+            print(f"        - {int((~analyzed).sum())} new candles (+{int(analyzed.sum())} look-back) loaded for {self.symbol} with interval {self.interval.value}")
+            return df.drop(columns=['analysis_last_update'])
+        except Exception as e:
+            print(f"        - Error loading incremental candlestick data: {e}")
+            self.incremental_state = None
+            return self.load_candle_data()
+
     """ Perform Candlestick Analysis"""
     def analyze(self) -> pd.DataFrame:
         """
@@ -77,6 +186,9 @@ class CandleAnalysisService:
             print("     Candlestick data not available for analysis")
             return None
 
+        if self.incremental_state is not None:
+            return self.analyze_incremental()
+
         candle_data = self.candle_data.copy().rename(
             columns={"date": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close"}
         )
@@ -90,14 +202,7 @@ class CandleAnalysisService:
         candle_data = self.add_trend_atr(candles=candle_data)
         candle_data['Session'] = range(len(candle_data))
         candle_data = self.add_extreme_points(candles=candle_data)
-        candle_data = self.add_local_max(candles=candle_data, window=13)
-        candle_data = self.add_local_max(candles=candle_data, window=27)
-        candle_data = self.add_local_max(candles=candle_data, window=51)
-        candle_data = self.add_local_max(candles=candle_data, window=101)
-        candle_data = self.add_local_min(candles=candle_data, window=13)
-        candle_data = self.add_local_min(candles=candle_data, window=27)
-        candle_data = self.add_local_min(candles=candle_data, window=51)
-        candle_data = self.add_local_min(candles=candle_data, window=101)
+        candle_data = self.add_local_extrema(candles=candle_data, windows=[13, 27, 51, 101])
 
         # __ plot the candlestick data __
         # candle_data = candle_data.iloc[-1000:].reset_index(drop=True)
@@ -121,6 +226,55 @@ class CandleAnalysisService:
         self.candle_data = candle_data
         return candle_data
 
+    def analyze_incremental(self) -> pd.DataFrame:
+        """
+        Analyze only the candles after the last analyzed one.
+
+        The indicators and the candlestick patterns are computed on the look-back window, the trend resumes from
+        the state at the last analyzed candle (sessions and blocks continue its numbering) and the last minimums /
+        maximums are computed on the persisted trend of the previous blocks. RSI is an exponential average, so
+        its values are within the warm-up error of the look-back window instead of identical to a full run.
+
+        :return: DataFrame containing the analysis of the new candles only.
+        """
+        state = self.incremental_state
+        candle_data = self.candle_data.copy().rename(
+            columns={"date": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close"}
+        )
+
+        is_new = (candle_data['Date'] > state['last_date']).to_numpy()
+        if not is_new.any():
+            print("        - No new candles to analyze")
+            self.candle_data = candle_data.iloc[0:0]
+            return self.candle_data
+
+        # __ indicators, candlestick patterns and local extrema on the look-back window __
+        candle_data = self.add_volatility(candle_data=candle_data)
+        candle_data = self.add_moving_averages(candle_data)
+        candle_data = self.add_candlestick_info(candle_data=candle_data)
+        candle_data = self.add_relative_strength_index(candle_data=candle_data, period=14)
+        candle_data = self.add_local_extrema(candles=candle_data, windows=[13, 27, 51, 101])
+
+        # __ resume the trend from the last analyzed candle, indexed by session __
+        new_data = candle_data[is_new].drop(columns=['currMax', 'currMin', 'Trend', 'Session', 'block'])
+        new_data.index = pd.RangeIndex(state['last_session'] + 1, state['last_session'] + 1 + len(new_data))
+        new_data = self.add_trend_atr(candles=new_data, state=state['trend'])
+        new_data['Session'] = new_data.index
+        trend = new_data['Trend'].fillna('')
+        new_data['block'] = state['last_block'] + (trend != trend.shift(fill_value=state['last_trend'] or '')).cumsum()
+
+        # __ last minimums / maximums on the previous blocks (persisted trend) followed by the new candles __
+        previous_blocks = candle_data[~is_new & (candle_data['block'] >= state['last_block'] - INCREMENTAL_BLOCKS_BACK)]
+        blocks_data = pd.concat([previous_blocks[['Session', 'block', 'Trend', 'currMin', 'currMax', 'Low', 'High']], new_data], ignore_index=True)
+        blocks_data = self.add_last_minimums(blocks_data)
+        blocks_data = self.add_last_maximums(blocks_data)
+
+        candle_data = blocks_data.iloc[len(previous_blocks):].reset_index(drop=True)
+
+        print(f"        - Candlestick data analysis completed ({len(candle_data)} new candles)")
+        self.candle_data = candle_data
+        return candle_data
+
     def handle_candle_analysis_data(self, df: pd.DataFrame) -> None:
         """
         Handle the bulk update or insertion of candlestick analysis data into the database.
@@ -177,29 +331,7 @@ class CandleAnalysisService:
 
         :param df: DataFrame containing the candlestick analysis data to be processed.
         """
-        # __ fetch the ticker_id from the ticker symbol __
-        ticker = self.session.query(Ticker).filter(Ticker.symbol == self.symbol).first()
-        if not ticker:
-            print(f"        - Ticker with symbol '{self.symbol}' not found.")
-            return
-
-        ticker_id = ticker.id
-
-        # __ fetch all the candle_data_day_id for the specified ticker_id __
-        candle_data_ids = self.session.query(CandleDataDay.id).filter(CandleDataDay.ticker_id == ticker_id).all()
-        candle_data_ids = [candle_data_id[0] for candle_data_id in candle_data_ids]  # Flatten the list of tuples
-
-        # __ delete existing CandleAnalysisCandleStickDay records linked to those candle_data_day_ids __
-        self.session.query(CandleAnalysisCandlestickDay).filter(CandleAnalysisCandlestickDay.candle_data_day_id.in_(candle_data_ids)).delete(synchronize_session=False)
-
-        # __ create instances of CandleAnalysisDay from the DataFrame
-        new_records = self.dataframe_to_candle_analysis_candlestick_day(candle_data=df)
-
-        # __ perform bulk insert __
-        self.session.bulk_save_objects(new_records)
-        self.session.commit()
-
-        print(f"        - Candlestick patterns - inserted {len(new_records)} new records.")
+        self.write_candle_analysis_data(df=df, model_class=CandleAnalysisCandlestickDay, label='Candlestick patterns')
 
     def handle_candle_analysis_indicators_data(self, df: pd.DataFrame) -> None:
         """
@@ -207,36 +339,7 @@ class CandleAnalysisService:
 
         :param df: DataFrame containing the candlestick analysis data to be processed.
         """
-        # __ fetch the ticker_id from the ticker symbol __
-        ticker = self.session.query(Ticker).filter(Ticker.symbol == self.symbol).first()
-        if not ticker:
-            print(f"Ticker with symbol '{self.symbol}' not found.")
-            return
-
-        ticker_id = ticker.id
-
-        # __ fetch all the candle_data_day_id for the specified ticker_id __
-        candle_data_ids =  (self.session
-                           .query(CandleDataDay.id)
-                           .filter(CandleDataDay.ticker_id == ticker_id).all()
-                           )
-        candle_data_ids = [candle_data_id[0] for candle_data_id in candle_data_ids]  # Flatten the list of tuples
-
-        # __ delete existing CandleAnalysisCandleStickDay records linked to those candle_data_day_ids __
-        (self.session
-         .query(CandleAnalysisIndicatorsDay)
-         .filter(CandleAnalysisIndicatorsDay.candle_data_day_id.in_(candle_data_ids))
-         .delete(synchronize_session=False)
-         )
-
-        # __ create instances of CandleAnalysisDay from the DataFrame
-        new_records = self.dataframe_to_candle_analysis_indicators_day(candle_data=df)
-
-        # __ perform bulk insert __
-        self.session.bulk_save_objects(new_records)
-        self.session.commit()
-
-        print(f"        - Indicators - inserted {len(new_records)} new records.")
+        self.write_candle_analysis_data(df=df, model_class=CandleAnalysisIndicatorsDay, label='Indicators')
 
     def handle_candle_analysis_trend_method_1_data(self, df: pd.DataFrame) -> None:
         """
@@ -244,167 +347,47 @@ class CandleAnalysisService:
 
         :param df: DataFrame containing the candlestick analysis data to be processed.
         """
+        self.write_candle_analysis_data(df=df, model_class=CandleAnalysisTrendMethod1Day, label='Trend Method 1')
+
+    def write_candle_analysis_data(self, df: pd.DataFrame, model_class, label: str) -> None:
+        """
+        Upsert the analysis of the ticker into the analysis table (keyed on candle_data_day_id) with COPY, without
+        ORM objects. Outside the incremental mode the whole analysis of the ticker is replaced.
+
+        :param df: DataFrame containing the candlestick analysis data to be processed.
+        :param model_class: The SQLAlchemy model class of the analysis table.
+        :param label: Label of the table for logging.
+        """
         # __ fetch the ticker_id from the ticker symbol __
         ticker = self.session.query(Ticker).filter(Ticker.symbol == self.symbol).first()
         if not ticker:
-            print(f"Ticker with symbol '{self.symbol}' not found.")
+            print(f"        - Ticker with symbol '{self.symbol}' not found.")
             return
 
-        ticker_id = ticker.id
-
-        # __ fetch all the candle_data_day_id for the specified ticker_id __
-        candle_data_ids = (self.session
-                           .query(CandleDataDay.id)
-                           .filter(CandleDataDay.ticker_id == ticker_id).all()
-                           )
-        candle_data_ids = [candle_data_id[0] for candle_data_id in candle_data_ids]  # Flatten the list of tuples
-
-        # __ delete existing CandleAnalysisCandleStickDay records linked to those candle_data_day_ids __
-        (self.session
-         .query(CandleAnalysisTrendMethod1Day)
-         .filter(CandleAnalysisTrendMethod1Day.candle_data_day_id.in_(candle_data_ids))
-         .delete(synchronize_session=False)
-         )
-
-        # __ create instances of CandleAnalysisDay from the DataFrame
-        new_records = self.dataframe_to_candle_analysis_trend_method_1_day(candle_data=df)
-
-        # __ perform bulk insert __
-        self.session.bulk_save_objects(new_records)
+        replace_ticker_ids = [ticker.id] if self.incremental_state is None else None
+        written = upsert_analysis_frame(session=self.session, df=df, model_class=model_class, replace_ticker_ids=replace_ticker_ids)
         self.session.commit()
 
-        print(f"        - Trend Method 1 - inserted {len(new_records)} new records.")
+        print(f"        - {label} - upserted {written} records.")
 
     @staticmethod
-    def dataframe_to_candle_analysis_candlestick_day(candle_data: pd.DataFrame) -> List[CandleAnalysisCandlestickDay]:
-        """
-        Convert a DataFrame into a list of CandleAnalysisCandlestickDay instances for bulk insertion into the database.
-
-        :param candle_data: DataFrame containing the data to be converted.
-        :return: List of CandleAnalysisCandlestickDay instances.
-        """
-        return [
-            CandleAnalysisCandlestickDay(
-                candle_data_day_id=row['id'],  # Primary key linking to CandleDataDay
-                bullish=row['bullish'],  # Bullish flag
-                body_delta=row['bodyDelta'],  # Body delta
-                shadow_delta=row['shadowDelta'],  # Shadow delta
-                percent_body=row['%body'],  # Body percentage
-                percent_upper_shadow=row['%upperShadow'],  # Upper shadow percentage
-                percent_lower_shadow=row['%lowerShadow'],  # Lower shadow percentage
-                long_body=row['longBody'],  # Long body flag
-                shadow_imbalance=row['shadowImbalance'],  # Shadow imbalance
-                shaven_head=row['shavenHead'],  # Shaven head flag
-                shaven_bottom=row['shavenBottom'],  # Shaven bottom flag
-                doji=row['doji'],  # Doji flag
-                spinning_top=row['spinningTop'],  # Spinning top flag
-                umbrella_line=row['umbrellaLine'],  # Umbrella line flag
-                umbrella_line_inverted=row['umbrellaLineInverted'],  # Inverted umbrella line flag
-                mid_body=row['midBody'],  # Mid-body value
-                body_atr_percent=row['bodyATR%'],  # Body ATR percentage
-                body2atr_percent=row['body2ATR%'],  # Body 2ATR percentage
-                long_atr_candle=row['longATRCandle'],  # Long ATR candle flag
-                body2atr2_shadow_imbalance_ratio=row['body2ATR%2shadowImbalanceRatio'],  # Ratio of body 2ATR percentage to shadow imbalance
-                long_candle_light=row['longCandleLight'],  # Long candle light flag
-                long_candle_bullish_light=row['longCandleBullishLight'],  # Long candle bullish light flag
-                long_candle_bearish_light=row['longCandleBearishLight'],  # Long candle bearish light flag
-                long_candle=row['longCandle'],  # Long candle flag
-                long_candle_bullish=row['longCandleBullish'],  # Long candle bullish flag
-                long_candle_bearish=row['longCandleBearish'],  # Long candle bearish flag
-                engulfing_bullish=row['engulfingBullish'],  # Engulfing bullish flag
-                engulfing_bearish=row['engulfingBearish'],  # Engulfing bearish flag
-                dark_cloud_cover=row['darkCloudCover'],  # Dark cloud cover pattern
-                dark_cloud_cover_light=row['darkCloudCoverLight'],  # Light dark cloud cover pattern
-                piercing_pattern=row['piercingPattern'],  # Piercing pattern
-                piercing_pattern_light=row['piercingPatternLight'],  # Light piercing pattern
-                on_neck_pattern=row['onNeckPattern'],  # On neck pattern
-                in_neck_pattern=row['inNeckPattern'],  # In neck pattern
-                thrusting_pattern=row['thrustingPattern'],  # Thrusting pattern
-                star=row['star'],  # Star pattern
-                evening_star=row['eveningStar'],  # Evening star pattern
-                morning_star=row['morningStar'],  # Morning star pattern
-            )
-            for _, row in candle_data.iterrows()
-        ]
-
-    @staticmethod
-    def dataframe_to_candle_analysis_indicators_day(candle_data: pd.DataFrame) -> List[CandleAnalysisIndicatorsDay]:
-        """
-        Convert a DataFrame into a list of CandleAnalysisIndicatorsDay instances for bulk insertion into the database.
-
-        :param candle_data: DataFrame containing the data to be converted.
-        :return: List of CandleAnalysisIndicatorsDay instances.
-        """
-        return [
-            CandleAnalysisIndicatorsDay(
-                candle_data_day_id=row['id'],  # Primary key linking to CandleDataDay
-                prev_close=row['prevClose'],  # Previous close price
-                tr=row['TR'],  # True Range
-                atr=row['ATR'],  # Average True Range
-                atr_percent=row['ATR%'],  # ATR as a percentage
-                ma50=row['MA50'],  # 50-day moving average
-                ma100=row['MA100'],  # 100-day moving average
-                ma200=row['MA200'],  # 200-day moving average
-                ma200_distance_percent=row['MA200Distance%'],  # Distance from 200-day moving average as a percentage
-                rsi=row['RSI']  # Relative Strength Index
-            )
-            for _, row in candle_data.iterrows()
-        ]
-
-    @staticmethod
-    def dataframe_to_candle_analysis_trend_method_1_day(candle_data: pd.DataFrame) -> List[CandleAnalysisTrendMethod1Day]:
-        """
-        Convert a DataFrame into a list of CandleAnalysisTrendMethod1Day instances for bulk insertion into the database.
-
-        :param candle_data: DataFrame containing the data to be converted.
-        :return: List of CandleAnalysisTrendMethod1Day instances.
-        """
-        return [
-            CandleAnalysisTrendMethod1Day(
-                candle_data_day_id=row['id'],
-                trend_all_time_high=row['TrendAllTimeHigh'],
-                trend_down_from_all_time_high=row['TrendDownFromAllTimeHigh'],
-                trend_days_from_all_time_high=row['TrendDaysFromAllTimeHigh'],
-                curr_max=row['currMax'],
-                curr_min=row['currMin'],
-                down_from_high=row['DownFromHigh'],
-                up_from_low=row['UpFromLow'],
-                trend=row['Trend'],
-                trend_change=row['TrendChange'],
-                reversing=row['reversing'],
-                session=row['Session'],
-                block=row['block'],
-                curr_min_min=row['currMin_min'],
-                min_1=row['min_1'],
-                min_2=row['min_2'],
-                session_min_1=row['session_min_1'],
-                session_min_2=row['session_min_2'],
-                curr_max_max=row['currMax_max'],
-                max_1=row['max_1'],
-                max_2=row['max_2'],
-                session_max_1=row['session_max_1'],
-                session_max_2=row['session_max_2'],
-                last_update=datetime.now()
-            )
-            for _, row in candle_data.iterrows()
-        ]
-
-    def add_candlestick_info(self, candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_candlestick_info(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add additional properties to the candlestick data for analysis.
 
         :param candle_data:     DataFrame containing the candlestick data.
+        :param groups:          Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return:                DataFrame containing the candlestick data with additional properties.
         """
         # get current time to measure the time it takes to run the analysis
         start_time = time()
 
         # __ add one candle properties __
-        candle_data = self.add_one_candle_properties(candle_data=candle_data)
+        candle_data = CandleAnalysisService.add_one_candle_properties(candle_data=candle_data, groups=groups)
         one_candle_properties_time = time()
 
         # __ add candles patterns __
-        candle_data = self.add_two_candles_patterns(candle_data=candle_data)
+        candle_data = CandleAnalysisService.add_two_candles_patterns(candle_data=candle_data, groups=groups)
         two_candles_patterns_time = time()
 
         # _____ Selection _____
@@ -418,9 +401,39 @@ class CandleAnalysisService:
 
         return candle_data
 
+    """ Shift / rolling restarted at every ticker of a panel """
+    @staticmethod
+    def group_shift(values: pd.Series, periods: int = 1, groups: pd.Series = None) -> pd.Series:
+        """
+        Shift the values, without carrying values from one ticker to the next when the data holds many tickers.
+
+        :param values:      Series to shift.
+        :param periods:     Number of rows to shift.
+        :param groups:      Ticker of each row (None = a single ticker).
+        :return:            The shifted Series.
+        """
+        if groups is None:
+            return values.shift(periods)
+        return values.groupby(groups).shift(periods)
+
+    @staticmethod
+    def group_rolling(values, window: int, how: str = 'mean', groups: pd.Series = None):
+        """
+        Aggregate the values on a rolling window, restarted at every ticker when the data holds many tickers.
+
+        :param values:      Series or DataFrame to aggregate.
+        :param window:      Size of the rolling window.
+        :param how:         Name of the rolling aggregation (mean, max, min, ...).
+        :param groups:      Ticker of each row (None = a single ticker).
+        :return:            The aggregated Series or DataFrame, aligned on the index of values.
+        """
+        if groups is None:
+            return getattr(values.rolling(window=window), how)()
+        return getattr(values.groupby(groups).rolling(window=window), how)().droplevel(0)
+
     """ Add Candlestick Patterns"""
     @ staticmethod
-    def add_one_candle_properties(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_one_candle_properties(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add properties to the candlestick data for each individual candle.
 
@@ -481,6 +494,9 @@ class CandleAnalysisService:
                                         and the candle Close is less or equal than the min between the Open and the Close
                                         of the last two session (including this)
 
+        :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
+        :return: DataFrame containing the candlestick data with the one candle properties added.
         """
 
         # _____ one Candle Properties _____
@@ -509,29 +525,33 @@ class CandleAnalysisService:
         candle_data['body2ATR%2shadowImbalanceRatio'] = candle_data['body2ATR%'] / np.sqrt(candle_data['shadowImbalance'])
         # candle_data['trigger'] = candle_data['%body'].pow(2)/100 * candle_data['body2ATR%2shadowImbalanceRatio'] / 100
         candle_data['longCandleLight'] = candle_data['longATRCandle'] & candle_data['longBody']
-        candle_data['longCandleBullishLight'] = candle_data['longCandleLight'] & (candle_data['Close'] >= candle_data[['Close', 'Open']].rolling(2).max().max(axis=1))
-        candle_data['longCandleBearishLight'] = candle_data['longCandleLight'] & (candle_data['Close'] <= candle_data[['Close', 'Open']].rolling(2).min().min(axis=1))
+        last_two_max = CandleAnalysisService.group_rolling(candle_data[['Close', 'Open']], window=2, how='max', groups=groups).max(axis=1)
+        last_two_min = CandleAnalysisService.group_rolling(candle_data[['Close', 'Open']], window=2, how='min', groups=groups).min(axis=1)
+        candle_data['longCandleBullishLight'] = candle_data['longCandleLight'] & (candle_data['Close'] >= last_two_max)
+        candle_data['longCandleBearishLight'] = candle_data['longCandleLight'] & (candle_data['Close'] <= last_two_min)
 
         candle_data['longCandle'] = candle_data['longATRCandle'] & ((candle_data['%body'] > 90) | ((candle_data['%body'] > 80) & (candle_data['body2ATR%2shadowImbalanceRatio'] > 10)) | ((candle_data['%body'] > 70) & (candle_data['body2ATR%2shadowImbalanceRatio'] > 50)))
-        candle_data['longCandleBullish'] = candle_data['longCandle'] & (candle_data['Close'] >= candle_data[['Close', 'Open']].rolling(2).max().max(axis=1))
-        candle_data['longCandleBearish'] = candle_data['longCandle'] & (candle_data['Close'] <= candle_data[['Close', 'Open']].rolling(2).min().min(axis=1))
+        candle_data['longCandleBullish'] = candle_data['longCandle'] & (candle_data['Close'] >= last_two_max)
+        candle_data['longCandleBearish'] = candle_data['longCandle'] & (candle_data['Close'] <= last_two_min)
 
         return candle_data
 
-    def add_two_candles_patterns(self, candle_data: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def add_two_candles_patterns(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add properties to the candlestick data for two consecutive candles.
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with additional properties.
         """
-        candle_data = self.add_engulfing_pattern(candle_data)
-        candle_data = self.add_semi_engulfing_patterns(candle_data)
-        candle_data = self.add_stars_patterns(candle_data)
+        candle_data = CandleAnalysisService.add_engulfing_pattern(candle_data, groups=groups)
+        candle_data = CandleAnalysisService.add_semi_engulfing_patterns(candle_data, groups=groups)
+        candle_data = CandleAnalysisService.add_stars_patterns(candle_data, groups=groups)
         return candle_data
 
     @staticmethod
-    def add_engulfing_pattern(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_engulfing_pattern(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add engulfing patterns to the candlestick data:
 
@@ -542,14 +562,16 @@ class CandleAnalysisService:
                                 and the Open is greater or equal to the previous close and the Close is less or equal to the previous Open
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with engulfing patterns added.
         """
 
         # Shifting to get previous row values
-        prev_close = candle_data['Close'].shift(1)
-        prev_open = candle_data['Open'].shift(1)
-        prev_bullish = candle_data['bullish'].shift(1)
-        prev_doji = candle_data['doji'].shift(1)
+        shift = CandleAnalysisService.group_shift
+        prev_close = shift(candle_data['Close'], 1, groups)
+        prev_open = shift(candle_data['Open'], 1, groups)
+        prev_bullish = shift(candle_data['bullish'], 1, groups)
+        prev_doji = shift(candle_data['doji'], 1, groups)
 
         # Vectorized conditions for engulfing bullish pattern
         is_engulfing_bullish = (
@@ -576,7 +598,7 @@ class CandleAnalysisService:
         return candle_data
 
     @staticmethod
-    def add_semi_engulfing_patterns(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_semi_engulfing_patterns(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add semi-engulfing patterns to the candlestick data:
         :darkCloudCover         --> If the previous candle is a long bullish light candle
@@ -611,16 +633,18 @@ class CandleAnalysisService:
                                     and the current candle closes between the previous close and the previous midBody
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with semi-engulfing patterns added.
         """
         # Shifted columns to access previous candle data
-        prev_close = candle_data['Close'].shift(1)
-        prev_open = candle_data['Open'].shift(1)
-        prev_high = candle_data['High'].shift(1)
-        prev_low = candle_data['Low'].shift(1)
-        prev_mid_body = candle_data['midBody'].shift(1)
-        prev_long_bullish = candle_data['longCandleBullishLight'].shift(1)
-        prev_long_bearish = candle_data['longCandleBearishLight'].shift(1)
+        shift = CandleAnalysisService.group_shift
+        prev_close = shift(candle_data['Close'], 1, groups)
+        prev_open = shift(candle_data['Open'], 1, groups)
+        prev_high = shift(candle_data['High'], 1, groups)
+        prev_low = shift(candle_data['Low'], 1, groups)
+        prev_mid_body = shift(candle_data['midBody'], 1, groups)
+        prev_long_bullish = shift(candle_data['longCandleBullishLight'], 1, groups)
+        prev_long_bearish = shift(candle_data['longCandleBearishLight'], 1, groups)
 
         # darkCloudCover
         is_dark_cloud_cover = (
@@ -702,7 +726,7 @@ class CandleAnalysisService:
         return candle_data
 
     @staticmethod
-    def add_stars_patterns(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_stars_patterns(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """Add star patterns to the candlestick data:
 
         :star           --> If the previous candle is a long bullish light candle
@@ -724,14 +748,16 @@ class CandleAnalysisService:
                             and the current candle closes above the midBody of the candle before the previous candle
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with star patterns added.
         """
 
         # __ shifted columns to access previous candle data __
-        prev_close = candle_data['Close'].shift(1)
-        prev_long_bullish = candle_data['longCandleBullishLight'].shift(1)
-        prev_long_bearish = candle_data['longCandleBearishLight'].shift(1)
-        prev_mid_body_2 = candle_data['midBody'].shift(2)
+        shift = CandleAnalysisService.group_shift
+        prev_close = shift(candle_data['Close'], 1, groups)
+        prev_long_bullish = shift(candle_data['longCandleBullishLight'], 1, groups)
+        prev_long_bearish = shift(candle_data['longCandleBearishLight'], 1, groups)
+        prev_mid_body_2 = shift(candle_data['midBody'], 2, groups)
 
         # Star pattern conditions
         is_star = (
@@ -753,19 +779,19 @@ class CandleAnalysisService:
         candle_data['star'] = is_star
 
         # __ shifted 'star' column for the second part of the pattern
-        prev_star = candle_data['star'].shift(1)
+        prev_star = shift(candle_data['star'], 1, groups)
 
         # __ evening Star pattern conditions
         is_evening_star = (
                 prev_star &
-                prev_long_bullish.shift(1) &
+                shift(prev_long_bullish, 1, groups) &
                 (candle_data['Close'] <= prev_mid_body_2)
         )
 
         # Morning Star pattern conditions
         is_morning_star = (
                 prev_star &
-                prev_long_bearish.shift(1) &
+                shift(prev_long_bearish, 1, groups) &
                 (candle_data['Close'] >= prev_mid_body_2)
         )
 
@@ -776,7 +802,8 @@ class CandleAnalysisService:
         return candle_data
 
     """ Add volatility indicators"""
-    def add_volatility(self, candle_data: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def add_volatility(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add volatility indicators to the candlestick data:
 
@@ -786,21 +813,22 @@ class CandleAnalysisService:
 
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with volatility indicators added.
         """
 
-        candle_data = self.add_true_range(candle_data)
-        candle_data['ATR'] = candle_data['TR'].rolling(window=14).mean()
+        candle_data = CandleAnalysisService.add_true_range(candle_data, groups=groups)
+        candle_data['ATR'] = CandleAnalysisService.group_rolling(candle_data['TR'], window=14, groups=groups)
         candle_data['ATR%'] = candle_data['ATR'] / candle_data['Close'] * 100
         return candle_data
 
     @staticmethod
-    def add_true_range(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_true_range(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
 
         if candle_data.shape[0] == 0:
             return candle_data
 
-        candle_data['prevClose'] = candle_data['Close'].shift(1)
+        candle_data['prevClose'] = CandleAnalysisService.group_shift(candle_data['Close'], 1, groups)
         candle_data['hl'] = candle_data['High'] - candle_data['Low']
         candle_data['hc'] = abs(candle_data['High'] - candle_data['prevClose'])
         candle_data['lc'] = abs(candle_data['Low'] - candle_data['prevClose'])
@@ -810,7 +838,7 @@ class CandleAnalysisService:
 
     """ Add moving averages """
     @staticmethod
-    def add_moving_averages(candle_data: pd.DataFrame) -> pd.DataFrame:
+    def add_moving_averages(candle_data: pd.DataFrame, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add moving averages to the candlestick data:
 
@@ -819,32 +847,106 @@ class CandleAnalysisService:
         :MA200              --> The 200 samples rolling moving average of the close prices
 
         :param candle_data: DataFrame containing the candlestick data.
+        :param groups: Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return: DataFrame containing the candlestick data with moving averages added.
         """
-        candle_data['MA50'] = candle_data['Close'].rolling(window=50).mean()
-        candle_data['MA100'] = candle_data['Close'].rolling(window=100).mean()
-        candle_data['MA200'] = candle_data['Close'].rolling(window=200).mean()
+        candle_data['MA50'] = CandleAnalysisService.group_rolling(candle_data['Close'], window=50, groups=groups)
+        candle_data['MA100'] = CandleAnalysisService.group_rolling(candle_data['Close'], window=100, groups=groups)
+        candle_data['MA200'] = CandleAnalysisService.group_rolling(candle_data['Close'], window=200, groups=groups)
         candle_data['MA200Distance%'] = (candle_data['Close'] - candle_data['MA200']) / candle_data['MA200'] * 100
         return candle_data
 
     """ Add Oscillators"""
     @staticmethod
-    def add_relative_strength_index(candle_data: pd.DataFrame, period=14) -> pd.DataFrame:
+    def add_relative_strength_index(candle_data: pd.DataFrame, period=14, groups: pd.Series = None) -> pd.DataFrame:
         """
         Add the Relative Strength Index (RSI) to the candlestick data.
 
         :RSI        --> Relative Strength Index (default: 14 samples window)
 
+        Many tickers are computed with the same Wilder's moving average used by ta.rsi
+        (ewm with alpha = 1 / period and period minimum samples), restarted at every ticker.
+
         :param candle_data:     DataFrame containing the candlestick data.
         :param period:          The period for the RSI calculation (default: 14).
+        :param groups:          Ticker of each row when candle_data holds many tickers (None = a single ticker).
         :return:                DataFrame containing the candlestick data with the RSI added.
         """
-        candle_data['RSI'] = ta.rsi(candle_data['Close'], length=period)
+        if groups is None:
+            candle_data['RSI'] = ta.rsi(candle_data['Close'], length=period)
+            return candle_data
+
+        change = candle_data['Close'].groupby(groups).diff()
+        gains = change.clip(lower=0).groupby(groups).ewm(alpha=1 / period, min_periods=period).mean().droplevel(0)
+        losses = change.clip(upper=0).abs().groupby(groups).ewm(alpha=1 / period, min_periods=period).mean().droplevel(0)
+        candle_data['RSI'] = 100 * gains / (gains + losses)
         return candle_data
 
     """ Add trend """
     @staticmethod
-    def add_trend(candles, sens_up=10, sens_down=9):
+    def add_trend(candles, sens_up=10, sens_down=9, use_numba: bool = True):
+        """
+        Add the trend columns with fixed sensitivities, computed by the trend engine in one pass over numpy arrays.
+
+        :param candles: DataFrame containing the candlestick data.
+        :param sens_up: Percentage rise from the current minimum that starts an up trend.
+        :param sens_down: Percentage drop from the current maximum that starts a down trend.
+        :param use_numba: Whether to use the compiled kernel, when numba is installed.
+        :return: DataFrame containing the candlestick data with the trend columns added.
+        """
+        n = len(candles)
+        columns, _ = compute_trend(high=candles['High'].to_numpy(dtype=float),
+                                   low=candles['Low'].to_numpy(dtype=float),
+                                   close=candles['Close'].to_numpy(dtype=float),
+                                   sens_up=np.full(n, sens_up, dtype=float),
+                                   sens_down=np.full(n, sens_down, dtype=float),
+                                   index=candles.index.to_numpy(),
+                                   use_numba=use_numba)
+
+        names = ['TrendAllTimeHigh', 'TrendDownFromAllTimeHigh', 'TrendDaysFromAllTimeHigh', 'currMax', 'currMin',
+                 'DownFromHigh', 'UpFromLow', 'Trend', 'reversing']
+        trend = trend_columns_to_frame(columns=columns, index=candles.index, names=names)
+        for name in names:
+            candles[name] = trend[name]
+
+        return candles
+
+    @staticmethod
+    def add_trend_atr(candles, use_numba: bool = True, state: dict = None):
+        """
+        Add the trend columns with sensitivities proportional to the ATR% (SensUp = 4 * ATR%), computed by the
+        trend engine in one pass over numpy arrays.
+
+        :param candles: DataFrame containing the candlestick data, with the ATR% column (indexed by session).
+        :param use_numba: Whether to use the compiled kernel, when numba is installed.
+        :param state: Trend state after the last analyzed candle, to resume the trend (None = start from the first candle).
+        :return: DataFrame containing the candlestick data with the trend columns added.
+        """
+        sens_up = candles['ATR%'].to_numpy(dtype=float) * 4
+        sens_down = 100 * (1 - 100 / (100 + sens_up))
+
+        columns, _ = compute_trend(high=candles['High'].to_numpy(dtype=float),
+                                   low=candles['Low'].to_numpy(dtype=float),
+                                   close=candles['Close'].to_numpy(dtype=float),
+                                   sens_up=sens_up,
+                                   sens_down=sens_down,
+                                   index=candles.index.to_numpy(),
+                                   state=state,
+                                   use_numba=use_numba)
+        columns['SensUp'] = sens_up
+        columns['SensDown'] = sens_down
+
+        names = ['SensUp', 'SensDown', 'TrendAllTimeHigh', 'TrendDownFromAllTimeHigh', 'TrendDaysFromAllTimeHigh',
+                 'currMax', 'currMin', 'DownFromHigh', 'UpFromLow', 'Trend', 'TrendChange', 'reversing']
+        trend = trend_columns_to_frame(columns=columns, index=candles.index, names=names)
+        for name in names:
+            candles[name] = trend[name]
+
+        return candles
+
+    @staticmethod
+    def add_trend_iterrows(candles, sens_up=10, sens_down=9):
+        """ Reference implementation of add_trend (row by row), kept for benchmarks and validation. """
 
         curr_min = candles['Low'].iloc[0]
         curr_max = candles['High'].iloc[0]
@@ -898,7 +1000,8 @@ class CandleAnalysisService:
         return candles
 
     @staticmethod
-    def add_trend_atr(candles):
+    def add_trend_atr_iterrows(candles):
+        """ Reference implementation of add_trend_atr (row by row), kept for benchmarks and validation. """
 
         curr_min = candles['Low'].iloc[0]
         curr_max = candles['High'].iloc[0]
@@ -981,12 +1084,11 @@ class CandleAnalysisService:
         filtered = merged[merged['Low'] == merged['currMin_min']][["Session", "block", "currMin_min"]]
         # __ drop duplicates on 'block' to make sure there is only one block - keep only first entry__
         filtered = filtered.drop_duplicates(subset='block', keep='first')
-        filtered['min_1'] = filtered['currMin_min'].rolling(window=3, min_periods=1).min()
-        filtered['min_2'] = filtered['currMin_min'].rolling(window=3, min_periods=1).apply(lambda x: sorted(x)[1] if len(x) > 1 else np.nan)
 
-        # Calculate the corresponding dates for min_1 and min_2
-        filtered['session_min_1'] = filtered.apply(lambda row: filtered[(filtered['block'] <= row['block']) & (filtered['currMin_min'] == row['min_1'])]["Session"].max(), axis=1)
-        filtered['session_min_2'] = filtered.apply(lambda row: filtered[(filtered['block'] <= row['block']) & (filtered['currMin_min'] == row['min_2'])]["Session"].max(), axis=1)
+        # __ lowest and second-lowest minimum of the last 3 down blocks, with their sessions __
+        min_1, min_2, session_min_1, session_min_2 = CandleAnalysisService.last_two_extremes(
+            values=filtered['currMin_min'].to_numpy(), sessions=filtered['Session'].to_numpy(), largest=False)
+        filtered = filtered.assign(min_1=min_1, min_2=min_2, session_min_1=session_min_1, session_min_2=session_min_2)
 
         # Duplicate rows and increment block
         duplicated_df = filtered.copy()
@@ -1003,6 +1105,48 @@ class CandleAnalysisService:
 
         return candles
 
+    @staticmethod
+    def last_two_extremes(values: np.ndarray, sessions: np.ndarray, largest: bool, window: int = 3) -> tuple:
+        """
+        Single pass over the extreme of each block: the best and second-best value of the last `window` blocks
+        (lowest for minimums, highest for maximums) and the session of the latest block holding each of them.
+
+        Same results as rolling(window, min_periods=1) with min / sorted(x)[1] (or max / sorted(x)[-2]) followed
+        by the latest session of an earlier block with an equal value: sessions grow with the blocks, so that
+        block is always inside the window.
+
+        :param values: Extreme of each block, in block order.
+        :param sessions: Session of the extreme of each block.
+        :param largest: True for maximums, False for minimums.
+        :param window: Number of blocks considered.
+        :return: Arrays of best value, second-best value (NaN with one block), and their sessions.
+        """
+        n = len(values)
+        best = np.empty(n, dtype=np.float64)
+        second = np.full(n, np.nan)
+        best_position = np.empty(n, dtype=np.int64)
+        second_session = np.full(n, np.nan)
+
+        values_list = values.tolist()
+        for i in range(n):
+            # __ running top-2 over the blocks of the window, the latest block wins ties __
+            best_j, second_j = -1, -1
+            for j in range(max(0, i - window + 1), i + 1):
+                value = values_list[j]
+                if best_j < 0 or (value >= values_list[best_j] if largest else value <= values_list[best_j]):
+                    best_j, second_j = j, best_j
+                elif second_j < 0 or (value >= values_list[second_j] if largest else value <= values_list[second_j]):
+                    second_j = j
+
+            best[i] = values_list[best_j]
+            best_position[i] = best_j
+            if second_j >= 0:
+                second[i] = values_list[second_j]
+                # __ with equal values the latest block holds both __
+                second_session[i] = sessions[second_j] if values_list[second_j] != values_list[best_j] else sessions[best_j]
+
+        return best, second, sessions[best_position], second_session
+
     @staticmethod
     def add_last_maximums(candles) -> pd.DataFrame:
         # Filter for 'down' trend
@@ -1018,12 +1162,11 @@ class CandleAnalysisService:
         filtered = merged[merged['High'] == merged['currMax_max']][["Session", "block", "currMax_max"]]
         # __ drop duplicates on 'block' to make sure there is only one block - keep only first entry__
         filtered = filtered.drop_duplicates(subset='block', keep='first')
-        filtered['max_1'] = filtered['currMax_max'].rolling(window=3, min_periods=1).max()
-        filtered['max_2'] = filtered['currMax_max'].rolling(window=3, min_periods=1).apply(lambda x: sorted(x)[-2] if len(x) > 1 else np.nan)
 
-        # Calculate the corresponding dates for max_1 and max_2
-        filtered['session_max_1'] = filtered.apply(lambda row: filtered[(filtered['block'] <= row['block']) & (filtered['currMax_max'] == row['max_1'])]["Session"].max(), axis=1)
-        filtered['session_max_2'] = filtered.apply(lambda row: filtered[(filtered['block'] <= row['block']) & (filtered['currMax_max'] == row['max_2'])]["Session"].max(), axis=1)
+        # __ highest and second-highest maximum of the last 3 up blocks, with their sessions __
+        max_1, max_2, session_max_1, session_max_2 = CandleAnalysisService.last_two_extremes(
+            values=filtered['currMax_max'].to_numpy(), sessions=filtered['Session'].to_numpy(), largest=True)
+        filtered = filtered.assign(max_1=max_1, max_2=max_2, session_max_1=session_max_1, session_max_2=session_max_2)
 
         # Duplicate rows and increment block
         duplicated_df = filtered.copy()
@@ -1102,3 +1245,60 @@ class CandleAnalysisService:
 
 
 
+
+    @staticmethod
+    def sliding_window_extreme(values: np.ndarray, window: int, largest: bool) -> np.ndarray:
+        """
+        Centered sliding window maximum (or minimum) in O(n) whatever the window, with the van Herk / Gil-Werman
+        block scheme: prefix and suffix extremes of blocks of `window` values, combined at each position.
+
+        Same values as Series.rolling(window, center=True).max() / .min(): NaN on the first and last window // 2
+        positions and wherever the window holds a NaN.
+
+        :param values: The values (float64).
+        :param window: Size of the window (odd).
+        :param largest: True for the maximum, False for the minimum.
+        :return: Array of the extreme of the window centered on each position.
+        """
+        n = len(values)
+        extreme = np.full(n, np.nan)
+        if n < window:
+            return extreme
+
+        function = np.maximum if largest else np.minimum
+        padding = np.full(-n % window, -np.inf if largest else np.inf)
+        blocks = np.concatenate([values, padding]).reshape(-1, window)
+        prefix = function.accumulate(blocks, axis=1).ravel()
+        suffix = function.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+        # __ the window ending at j spans the suffix of its first block and the prefix of its last block __
+        extreme[window // 2:n - window // 2] = function(suffix[:n - window + 1], prefix[window - 1:n])
+        return extreme
+
+    @staticmethod
+    def add_local_extrema(candles: pd.DataFrame, windows: list[int] = None) -> pd.DataFrame:
+        """
+        Add the local maxima and minima columns of all the windows at once (same columns as add_local_max and
+        add_local_min called for each window, in the same order).
+
+        :local_max_{window}            --> High is the maximum of the centered window
+        :shifted_local_max_{window}    --> local_max shifted by half the window (known without future candles)
+        :local_min_{window}            --> Low is the minimum of the centered window
+        :shifted_local_min_{window}    --> local_min shifted by half the window (known without future candles)
+
+        :param candles: DataFrame with the 'High' and 'Low' columns.
+        :param windows: Sizes of the windows (even sizes are rounded up to the next odd number).
+        :return: DataFrame with the local extrema columns added.
+        """
+        windows = [window + 1 if window % 2 == 0 else window for window in (windows or [13, 27, 51, 101])]
+
+        columns = {}
+        for label, price, largest in [('max', 'High', True), ('min', 'Low', False)]:
+            values = candles[price].to_numpy(dtype=np.float64)
+            for window in windows:
+                is_extreme = values == CandleAnalysisService.sliding_window_extreme(values=values, window=window, largest=largest)
+                columns[f'local_{label}_{window}'] = is_extreme
+                columns[f'shifted_local_{label}_{window}'] = pd.Series(is_extreme, index=candles.index).shift(window // 2)
+
+        return pd.concat([candles.drop(columns=[column for column in columns if column in candles.columns]),
+                          pd.DataFrame(columns, index=candles.index)], axis=1)
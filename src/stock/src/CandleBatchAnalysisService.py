@@ -0,0 +1,152 @@
+from dataclasses import dataclass, field
+import pandas as pd
+from time import time
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import Ticker, CandleDataDay
+from src.stock.src.db.models import CandleAnalysisCandlestickDay, CandleAnalysisIndicatorsDay, CandleAnalysisTrendMethod1Day
+from src.stock.src.CandleAnalysisService import CandleAnalysisService
+from src.stock.src.db.analysis_writer import upsert_analysis_frame
+from src.stock.src.CandleCache import CandleCache, get_candle_signatures
+from src.stock.src.CandleDataInterval import CandleDataInterval
+
+
+@dataclass
+class CandleBatchAnalysisService:
+    """
+    Daily candlestick analysis of many tickers in one pipeline.
+
+    The candles of all the tickers are loaded with one query into a long (ticker_id, date) panel. True range,
+    ATR, moving averages, RSI and candlestick patterns are computed once on the whole panel with shifts and
+    rolling windows restarted at every ticker, so the results are the same as CandleAnalysisService per symbol.
+    The trend is a state machine, so it (and the blocks / extreme points built on it) runs per ticker on the
+    arrays of the panel. The results are written with one COPY and one upsert per table.
+    """
+    symbols: list[str]                              # The ticker symbols
+    session: sess.Session                           # The database session
+    candle_cache: Optional[CandleCache] = field(default_factory=CandleCache)  # Local copy of the candles (None = database only)
+    candle_data: pd.DataFrame = field(init=False)   # Panel of the candlestick data of all the tickers
+
+    def __post_init__(self):
+        """ Load the candlestick data of all the tickers from the database upon initialization. """
+        self.candle_data = self.load_candle_data()
+
+    def load_candle_data(self) -> pd.DataFrame:
+        """
+        Load the daily candles of all the tickers, sorted by ticker and date: the tickers in the candle cache
+        and in step with the database (one aggregate query) are read from it, the others with one query (and
+        written to the cache).
+
+        :return: DataFrame containing the candlestick data of all the tickers.
+        """
+        try:
+            frames, missing = [], []
+            signatures = get_candle_signatures(self.session, CandleDataDay, self.symbols) if self.candle_cache is not None and self.candle_cache.enabled else {}
+            for symbol in self.symbols:
+                signature = signatures.get(symbol)
+                df = self.candle_cache.read(interval=CandleDataInterval.DAY, symbol=symbol, signature=signature) if signature else None
+                if df is not None:
+                    frames.append(df)
+                else:
+                    missing.append(symbol)
+            n_cached = len(frames)
+
+            if missing:
+                query = (
+                    select(CandleDataDay, Ticker.symbol.label('symbol'))
+                    .join(Ticker, Ticker.id == CandleDataDay.ticker_id)
+                    .where(Ticker.symbol.in_(missing))
+                    .order_by(CandleDataDay.ticker_id, CandleDataDay.date)
+                )
+                loaded = pd.read_sql(query, self.session.bind)
+                for symbol, candles in loaded.groupby('symbol', sort=False):
+                    candles = candles.drop(columns=['symbol']).reset_index(drop=True)
+                    if self.candle_cache is not None:
+                        self.candle_cache.write(interval=CandleDataInterval.DAY, symbol=symbol, df=candles)
+                    frames.append(candles)
+
+            if not frames:
+                return pd.DataFrame()
+
+            df = pd.concat(frames, ignore_index=True).sort_values(by=['ticker_id', 'date'], kind='stable').reset_index(drop=True)
+
+            print(f"        - {df.shape[0]} candles loaded for {df['ticker_id'].nunique()} tickers ({n_cached} from cache)")
+            return df
+        except Exception as e:
+            print(f"        - Error loading candlestick data: {e}")
+            return pd.DataFrame()  # Return an empty DataFrame in case of error
+
+    def analyze(self) -> pd.DataFrame:
+        """
+        Perform the candlestick analysis of all the tickers.
+
+        :return: DataFrame containing the analysis of all the tickers.
+        """
+        if self.candle_data.empty:
+            print("     Candlestick data not available for analysis")
+            return self.candle_data
+
+        candle_data = self.candle_data.rename(
+            columns={"date": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close"}
+        ).reset_index(drop=True)
+        groups = candle_data['ticker_id']
+
+        # __ indicators and candlestick patterns on the whole panel __
+        start_time = time()
+        candle_data = CandleAnalysisService.add_volatility(candle_data=candle_data, groups=groups)
+        candle_data = CandleAnalysisService.add_moving_averages(candle_data, groups=groups)
+        candle_data = CandleAnalysisService.add_candlestick_info(candle_data=candle_data, groups=groups)
+        candle_data = CandleAnalysisService.add_relative_strength_index(candle_data=candle_data, period=14, groups=groups)
+        indicators_time = time()
+
+        # __ trend, extreme points and local extrema per ticker (a failing ticker is skipped, its analysis is kept) __
+        analyzed = []
+        for ticker_id, candles in candle_data.groupby('ticker_id', sort=False):
+            try:
+                candles = candles.reset_index(drop=True)
+                candles = CandleAnalysisService.add_trend_atr(candles=candles)
+                candles['Session'] = range(len(candles))
+                candles['block'] = (candles['Trend'] != candles['Trend'].shift()).cumsum()
+                candles = CandleAnalysisService.add_last_minimums(candles)
+                candles = CandleAnalysisService.add_last_maximums(candles)
+                candles = CandleAnalysisService.add_local_extrema(candles=candles, windows=[13, 27, 51, 101])
+                analyzed.append(candles)
+            except Exception as e:
+                print(f"        - Error analyzing ticker_id {ticker_id}, skipped: {e}")
+        if not analyzed:
+            self.candle_data = candle_data.iloc[0:0]
+            return self.candle_data
+        candle_data = pd.concat(analyzed, ignore_index=True)
+        trend_time = time()
+
+        print(f"        - Indicators and patterns: {round(indicators_time - start_time, 3)} sec")
+        print(f"        - Trend and extreme points: {round(trend_time - indicators_time, 3)} sec")
+        print(f"        - Candlestick data analysis completed for {candle_data['ticker_id'].nunique()} tickers")
+        self.candle_data = candle_data
+        return candle_data
+
+    def handle_candle_analysis_data(self, df: pd.DataFrame) -> None:
+        """
+        Replace the candlestick, indicators and trend method 1 analysis of all the tickers in one transaction.
+
+        :param df: DataFrame containing the candlestick analysis data of all the tickers.
+        """
+        if df.empty:
+            print("        - No candlestick analysis data to handle.")
+            return None
+
+        # __ replace the whole analysis of the analyzed tickers, COPY + upsert per table without ORM objects __
+        ticker_ids = df['ticker_id'].unique().tolist()
+        tables = [
+            ('Candlestick patterns', CandleAnalysisCandlestickDay),
+            ('Indicators', CandleAnalysisIndicatorsDay),
+            ('Trend Method 1', CandleAnalysisTrendMethod1Day),
+        ]
+        for label, model_class in tables:
+            written = upsert_analysis_frame(session=self.session, df=df, model_class=model_class, replace_ticker_ids=ticker_ids)
+            print(f"        - {label} - upserted {written} records.")
+
+        self.session.commit()
@@ -10,7 +10,7 @@ from dataclasses import dataclass, field
 from typing import Optional
 from sqlalchemy.orm import session as sess
 from sqlalchemy.sql import and_
-from sqlalchemy import select, func
+from sqlalchemy import select, func, delete
 from sqlalchemy.sql import literal
 from sqlalchemy.inspection import inspect
 
@@ -18,10 +18,17 @@ from src.common.tools.library import safe_execute
 
 from src.stock.src.CandleService import *
 from src.stock.src.TickerServiceBase import Ticker
-from src.stock.src.RaiseOnErrorHandler import RaiseOnErrorHandler
+from src.stock.src.yf_download import yf_download
+from src.stock.src.db.pg_copy import copy_dataframe
+from src.stock.src.db.partitions import ensure_candle_partitions
+from src.stock.src.db.candle_rollups import ROLLUP_SOURCES, get_covered_tickers, rollup_candles
+from src.stock.src.db.latest_rows import refresh_latest_rows
+from src.stock.src.RateLimiter import AdaptiveRateLimiter
+from src.stock.src.CandleCache import CandleCache
+from src.stock.src.PipelineStats import PIPELINE_STATS
 from src.stock.YFinanceDataError import YFinanceDataError
 
-from logger_setup import LOGGER, error_handler
+from logger_setup import LOGGER, yf_error_collector
 
 pd.set_option('future.no_silent_downcasting', True)
 
@@ -31,6 +38,10 @@ class CandleBulkService:
     session: sess.Session
     symbols: list[str]
     commit_enable: bool = True
+    copy_enable: bool = True
+    rollup_enable: bool = True
+    rate_limiter: AdaptiveRateLimiter = field(default_factory=lambda: AdaptiveRateLimiter(rate=10.0))
+    candle_cache: Optional[CandleCache] = field(default_factory=CandleCache)
     interval_map: dict = field(default_factory=lambda: {
         CandleDataInterval.DAY: '1d',
         CandleDataInterval.HOUR: '1h',
@@ -47,6 +58,10 @@ class CandleBulkService:
         CandleDataInterval.WEEK: CandleDataWeek,
         CandleDataInterval.MONTH: CandleDataMonth
     })
+    tickers: dict = field(default_factory=dict, init=False)
+    latest_candles: dict = field(default_factory=dict, init=False)
+    latest_candles_model: Type[Base] = field(default=None, init=False)
+    rollup_report: dict = field(default_factory=dict, init=False)
 
     @staticmethod
     def is_intraday_interval(interval: CandleDataInterval) -> bool:
@@ -175,20 +190,34 @@ class CandleBulkService:
         else:
             self.session.rollback()
 
+    def preload_latest_candles(self, model_class: Type[Base], tickers_df: pd.DataFrame) -> None:
+        """
+        Load the id and date of the last candle of every ticker of the batch with a single DISTINCT ON query.
+
+        Plain rows are kept instead of ORM instances, so they are not expired by the per-ticker commits.
+
+        :param model_class: The model class for the candle data.
+        :param tickers_df: DataFrame with the id and symbol of the tickers of the batch.
+        """
+        query = (
+            select(model_class.id, model_class.ticker_id, model_class.date)
+            .where(model_class.ticker_id.in_(tickers_df["id"].tolist()))
+            .order_by(model_class.ticker_id, model_class.date.desc())
+            .distinct(model_class.ticker_id)
+        )
+
+        symbols_by_id = dict(zip(tickers_df["id"], tickers_df["symbol"]))
+        self.latest_candles = {symbols_by_id[candle.ticker_id]: candle for candle in self.session.execute(query).all()}
+        self.latest_candles_model = model_class
+
     def filter_candles_max_date_quantile(self,
                                          model_class: Type[Base],
                                          tickers_df: pd.DataFrame,
                                          min_quantile: float = 0.1
                                          ) -> pd.DataFrame:
-        # __ fetch the oldest candle data date for the specified interval for all tickers_id__
-        max_dates_list = (
-            self.session
-            .query(Ticker.symbol, func.max(model_class.date).label("max_date"))
-            .join(Ticker, model_class.ticker_id == Ticker.id)
-            .filter(model_class.ticker_id.in_(tickers_df["id"].tolist()))
-            .group_by(model_class.ticker_id, Ticker.symbol)
-            .all()
-        )
+        # __ fetch the last candle for the specified interval for all tickers_id (shared with update_ticker_candles) __
+        self.preload_latest_candles(model_class=model_class, tickers_df=tickers_df)
+        max_dates_list = [(symbol, candle.date) for symbol, candle in self.latest_candles.items()]
 
         max_dates_df = pd.DataFrame(max_dates_list, columns=["symbol", "max_date"])
 
@@ -262,16 +291,16 @@ class CandleBulkService:
 
         # __ download the candle data from Yahoo Finance __
         try:
-            download = yf.download(
-                    tickers=symbols,
-                    interval=interval_str,
-                    period=period,
-                    # progress=False
-                )
+            with yf_error_collector.collect() as yf_errors:
+                download = yf_download(
+                        tickers=symbols,
+                        interval=interval_str,
+                        period=period,
+                        # progress=False
+                    )
 
-            # Ensure all errors are processed before proceeding
-            sleep(2)  # Give enough time for the timer to trigger
-            error_handler.check_for_exception()  # Check and raise exception in the main thread
+            # __ raise the errors logged by this download, if any __
+            yf_error_collector.check_for_exception(yf_errors)
 
         except RuntimeError as e:
             # LOGGER.info(str(e))
@@ -367,8 +396,9 @@ class CandleBulkService:
         LOGGER.debug(f"Recursion depth: {depth}, symbols: {symbols}")
 
         try:
-            # Try downloading the entire batch at once
-            yf.download(
+            # Try downloading the entire batch at once, within the request budget (one request per level)
+            self.rate_limiter.acquire()
+            yf_download(
                 tickers=symbols,  # Pass all symbols in one request
                 interval=interval_str,
                 period=period,
@@ -387,8 +417,6 @@ class CandleBulkService:
             mid = len(symbols) // 2
             first_half, second_half = symbols[:mid], symbols[mid:]
 
-            sleep(3)  # Avoid API rate limiting
-
             failed_first = self.handle_failed_download(first_half, interval_str, period, depth + 1, max_depth)
             failed_second = self.handle_failed_download(second_half, interval_str, period, depth + 1, max_depth)
 
@@ -500,13 +528,107 @@ class CandleBulkService:
 
         return new_records
 
+    def create_candle_data_frame(self, ticker: Ticker, df: pd.DataFrame, interval: CandleDataInterval) -> pd.DataFrame:
+        """
+        Create a DataFrame with the columns of the candle data table from the prepared candle data.
+        :param ticker: The Ticker object for the candle data.
+        :param df: DataFrame containing the prepared candle data.
+        :param interval: Interval for the candle data.
+        :return: DataFrame ready to be copied into the candle data table.
+        """
+        columns = ['date', 'open', 'high', 'low', 'close', 'adj_close', 'volume']
+        if self.is_intraday_interval(interval):
+            columns.append('time_zone')
+
+        frame = df.reindex(columns=columns)
+        if self.is_intraday_interval(interval):
+            frame['time_zone'] = frame['time_zone'].fillna('UTC')
+        else:
+            # __ daily and longer candles are stored as dates in the exchange time zone __
+            frame['date'] = frame['date'].dt.date
+
+        frame.insert(0, 'ticker_id', ticker.id)
+        frame['last_update'] = datetime.now()
+        return frame
+
+    def insert_candle_data(self, ticker: Ticker, df: pd.DataFrame, model_class: Type[Base], interval: CandleDataInterval) -> int:
+        """
+        Insert the prepared candle data, streaming it with COPY or falling back to ORM objects.
+        :param ticker: The Ticker object for the candle data.
+        :param df: DataFrame containing the prepared candle data.
+        :param model_class: The model class for the candle data.
+        :param interval: Interval for the candle data.
+        :return: Number of records inserted.
+        """
+        if not self.copy_enable:
+            new_records = self.create_candle_data_list_of_records(ticker=ticker, df=df, model_class=model_class, interval=interval)
+            self.session.bulk_save_objects(new_records)
+            return len(new_records)
+
+        frame = self.create_candle_data_frame(ticker=ticker, df=df, interval=interval)
+        return copy_dataframe(session=self.session, df=frame, table_name=model_class.__tablename__, columns=list(frame.columns))
+
+    def update_candle_cache(self, ticker: Ticker, symbol: str, model_class: Type[Base], interval: CandleDataInterval, from_date=None) -> None:
+        """
+        Copy the committed candles of a ticker to the candle cache: the candles from from_date are appended
+        (with the ids assigned by the database), or the whole history replaces the cache when from_date is None.
+
+        :param ticker: The ticker object (id).
+        :param symbol: The ticker symbol.
+        :param model_class: The model class for the candle data.
+        :param interval: The interval of the candles.
+        :param from_date: Date of the first candle to append (None = whole history).
+        """
+        if self.candle_cache is None or not self.candle_cache.enabled or not self.commit_enable:
+            return
+
+        try:
+            query = select(model_class).where(model_class.ticker_id == ticker.id).order_by(model_class.date)
+            if from_date is None:
+                self.candle_cache.write(interval=interval, symbol=symbol, df=pd.read_sql(query, self.session.connection()))
+            elif self.candle_cache.exists(interval=interval, symbol=symbol):
+                query = query.where(model_class.date >= from_date)
+                self.candle_cache.append(interval=interval, symbol=symbol, df=pd.read_sql(query, self.session.connection()))
+        except Exception as e:
+            # __ the cache is a copy: on failure drop it, the readers fall back to the database __
+            LOGGER.warning(f"{symbol.rjust(10)} - {'Candle Cache'.rjust(25)} - update failed, cache invalidated: {e}")
+            self.candle_cache.invalidate(interval=interval, symbol=symbol)
+
+    def download_candle_data_with_backoff(self, symbols: List[str], interval_str: str, period: str, max_retries: int = 5) -> Optional[pd.DataFrame]:
+        """
+        Download candle data within the request budget of the rate limiter, backing off exponentially on throttling.
+
+        Every attempt counts as one request. The last attempt lets YFinanceDataError propagate.
+
+        :param symbols: The list of symbols for which to download the candle data.
+        :param interval_str: The interval for the candle data.
+        :param period: The period for the candle data.
+        :param max_retries: Maximum number of retries after a throttling error.
+        :return: DataFrame containing the candle data.
+        """
+        for attempt in range(max_retries):
+            self.rate_limiter.acquire()
+            try:
+                candle_data = self.download_candle_data(symbols=symbols, interval_str=interval_str, period=period)
+                self.rate_limiter.on_success()
+                return candle_data
+            except YFinanceDataError as e:
+                LOGGER.info(f"{'Candle Data'.rjust(25)} - Retrying download after back-off ({attempt + 1}/{max_retries}).")
+                self.rate_limiter.backoff(reason=str(e))
+
+        self.rate_limiter.acquire()
+        return self.download_candle_data(symbols=symbols, interval_str=interval_str, period=period)
+
     def update_all_tickers_candles(self):
         # __ get all Ticker objects from DB __
         query = self.session.query(Ticker.id, Ticker.symbol).filter(Ticker.symbol.in_(self.symbols))
-        tickers_df = pd.DataFrame(query.all(), columns=["id", "symbol"])
+        self.tickers = {ticker.symbol: ticker for ticker in query.all()}
+        tickers_df = pd.DataFrame(list(self.tickers.values()), columns=["id", "symbol"])
 
-        intervals = list(CandleDataInterval)
+        # __ finest intervals first, so the derived intervals are rolled up from the candles just downloaded __
+        intervals = list(reversed(CandleDataInterval))
         # intervals = [CandleDataInterval.MINUTE_5]
+        self.rollup_report = {}
         for interval in intervals:
             # __ fetch the appropriate model for the interval __
             model_class = self.interval_model_map.get(interval)
@@ -523,8 +645,21 @@ class CandleBulkService:
             # __ log how many tickers are left after filtering __
             LOGGER.info(f"{'Total tickers after quantile filtering:'.ljust(35)} {len(filtered_df)}")
 
+            # __ stats of the bulk stages of the interval, per batch ('*') and per ticker __
+            section = f"bulk_candle_{interval.value}"
+
+            # __ derive the candles of the tickers covered by the finer interval, download only the others __
+            with PIPELINE_STATS.timer('db', section=section, symbol='*'):
+                derived = self.rollup_candle_data(interval=interval, symbols=symbols_to_update)
+            symbols_to_update = [symbol for symbol in symbols_to_update if symbol not in derived]
+            self.rollup_report[interval] = {'derived': derived, 'downloaded': symbols_to_update}
+            LOGGER.info(f"{'Derived / downloaded:'.ljust(35)} {len(derived)} / {len(symbols_to_update)}")
+
+            if not symbols_to_update:
+                continue
+
             # __ get min date __
-            min_date = filtered_df["max_date"].min()
+            min_date = filtered_df.loc[filtered_df["symbol"].isin(symbols_to_update), "max_date"].min()
 
             # __ get the period for fetching the new candle data __
             period = self.get_period(last_date=min_date, interval=interval)
@@ -536,23 +671,79 @@ class CandleBulkService:
             interval_str = self.interval_map.get(interval)
 
             # __ download the candle data for the specified interval and period __
-            try:
-                candle_data = self.download_candle_data(symbols=symbols_to_update, interval_str=interval_str, period=period)
-            except YFinanceDataError:
-                LOGGER.info(f"{'Candle Data'.rjust(25)} - Retrying download after 90 seconds.")
-                sleep(90)
-                candle_data = self.download_candle_data(symbols=symbols_to_update, interval_str=interval_str, period=period)
+            with PIPELINE_STATS.timer('fetch', section=section, symbol='*'):
+                candle_data = self.download_candle_data_with_backoff(symbols=symbols_to_update, interval_str=interval_str, period=period)
+
+            with PIPELINE_STATS.timer('transform', section=section, symbol='*'):
+                candle_data = self.post_download(candle_data)
 
-            candle_data = self.post_download(candle_data)
+            # __ create the monthly partitions of the downloaded range (partitioned intraday tables) __
+            # __ committed on their own, so the rollback of a ticker does not drop them __
+            with PIPELINE_STATS.timer('db', section=section, symbol='*'):
+                if ensure_candle_partitions(self.session, model_class, pd.Series(candle_data.index)):
+                    self.session.commit()
 
             for ticker in candle_data.columns.levels[0]:
-                candles = candle_data[ticker].copy()
-                candles.columns = candles.columns.get_level_values(0)
-                self.update_ticker_candles(candles, ticker, interval, model_class, model_class_name)
+                with PIPELINE_STATS.section(section, ticker):
+                    with PIPELINE_STATS.timer('transform'):
+                        candles = candle_data[ticker].copy()
+                        candles.columns = candles.columns.get_level_values(0)
+                    self.update_ticker_candles(candles, ticker, interval, model_class, model_class_name)
+
+            metrics = self.rate_limiter.metrics()
+            LOGGER.info(f"{'Rate limiter:'.ljust(35)} {metrics['rate']} req/sec, {metrics['backoff_events']} back-offs ({metrics['backoff_time_secs']} sec)")
+
+        self.log_rollup_report()
+
+    def rollup_candle_data(self, interval: CandleDataInterval, symbols: List[str]) -> List[str]:
+        """
+        Derive the candles of the interval from the finer interval stored in the database (5m / 1h from 1m,
+        week / month from day) for the tickers whose finer candles cover the range to update, with set-based
+        SQL instead of a download. The last candle of each ticker is rebuilt together with the new ones.
 
-            sleep_time = 2.5 + ((len(symbols_to_update) - 1) / 499) * (20 - 0.5)
-            LOGGER.info(f"Sleeping for {round(sleep_time, 2)} seconds...")
-            sleep(sleep_time)
+        :param interval: The interval of the candles to derive.
+        :param symbols: The symbols to update.
+        :return: The symbols whose candles were derived (the others have to be downloaded).
+        """
+        if not self.rollup_enable or interval not in ROLLUP_SOURCES or not symbols:
+            return []
+
+        source_interval, bucket = ROLLUP_SOURCES[interval]
+        source_model, model_class = self.interval_model_map[source_interval], self.interval_model_map[interval]
+        symbols_by_id = {self.tickers[symbol].id: symbol for symbol in symbols if symbol in self.tickers}
+
+        try:
+            covered = get_covered_tickers(self.session, source_model=source_model, target_model=model_class, ticker_ids=list(symbols_by_id))
+            if not covered:
+                return []
+
+            # __ the rebuilt range starts at the last candle: create its partitions (partitioned intraday tables) __
+            ensure_candle_partitions(self.session, model_class, pd.Series([from_date for _, from_date in covered] + [datetime.now(pytz.utc)]))
+
+            inserted = rollup_candles(self.session, source_model=source_model, target_model=model_class, bucket=bucket,
+                                      covered=covered, intraday=self.is_intraday_interval(interval))
+            self.commit()
+        except Exception as e:
+            # __ fall back to the download of all the symbols __
+            LOGGER.error(f"{'Rollup'.rjust(50)} - {self.format_model_class_name(model_class)} - failed: {e}")
+            self.session.rollback()
+            return []
+
+        LOGGER.info(f"{'Rollup'.rjust(50)} - {self.format_model_class_name(model_class)} - {inserted} records derived from "
+                    f"{self.format_model_class_name(source_model)} for {len(covered)} tickers.")
+
+        for ticker_id, from_date in covered:
+            symbol = symbols_by_id[ticker_id]
+            self.update_candle_cache(ticker=self.tickers[symbol], symbol=symbol, model_class=model_class, interval=interval, from_date=from_date)
+
+        return [symbols_by_id[ticker_id] for ticker_id, _ in covered]
+
+    def log_rollup_report(self) -> None:
+        """ Log, per interval, how many tickers were derived from a finer interval and how many were downloaded. """
+        for interval, report in self.rollup_report.items():
+            source = ROLLUP_SOURCES[interval][0].value if interval in ROLLUP_SOURCES else '-'
+            LOGGER.info(f"{interval.value.rjust(10)} - derived from {source.rjust(5)}: {str(len(report['derived'])).rjust(5)}"
+                        f" - downloaded: {str(len(report['downloaded'])).rjust(5)}")
 
     def update_ticker_candles(self,
                               candles: pd.DataFrame,
@@ -570,19 +761,26 @@ class CandleBulkService:
             return
 
         # __ get ticker_object __
-        ticker_obj = self.get_ticker_by_symbol(ticker)
+        ticker_obj = self.tickers.get(ticker) or self.get_ticker_by_symbol(ticker)
 
         # __ prepare the candle data for insertion or update __
-        candles = self.prepare_candle_data(candles, interval)
-        last_candle = self.get_latest_candle_by_symbol(ticker, model_class)
+        with PIPELINE_STATS.timer('transform'):
+            candles = self.prepare_candle_data(candles, interval)
+        if self.latest_candles_model is model_class:
+            last_candle = self.latest_candles.get(ticker)
+        else:
+            last_candle = self.get_latest_candle_by_symbol(ticker, model_class)
 
         # __ if there's no last date, bulk update all the data __
         if not last_candle:
-            # __ convert DataFrame rows to a list of CandleData instances __
-            new_records = self.create_candle_data_list_of_records(ticker=ticker_obj, df=candles, model_class=model_class, interval=interval)
             # __ perform the bulk insert __
-            self.session.bulk_save_objects(new_records)
-            LOGGER.info(f"{ticker.rjust(10)} (id: {str(ticker_obj.id).rjust(5)}) - {model_class_name} - {len(new_records)} records inserted.")
+            with PIPELINE_STATS.timer('db'):
+                inserted = self.insert_candle_data(ticker=ticker_obj, df=candles, model_class=model_class, interval=interval)
+                refresh_latest_rows(self.session, model_class, ticker_ids=[ticker_obj.id])
+                self.commit()
+            PIPELINE_STATS.rows(inserted=inserted)
+            LOGGER.info(f"{ticker.rjust(10)} (id: {str(ticker_obj.id).rjust(5)}) - {model_class_name} - {inserted} records inserted.")
+            self.update_candle_cache(ticker=ticker_obj, symbol=ticker, model_class=model_class, interval=interval)
             return None
 
         # __ filter out candles that are older than the last_candle's date __
@@ -607,20 +805,23 @@ class CandleBulkService:
 
         # __ delete the last record if it exists __
         try:
-            with self.session.begin_nested():
+            with PIPELINE_STATS.timer('db'), self.session.begin_nested():
                 if not last_data_df.empty:
-                    self.session.delete(last_candle)
-                    self.session.flush()
+                    self.session.execute(delete(model_class).where(model_class.id == last_candle.id, model_class.date == last_candle.date))
 
                 # __ insert the remaining new records __
                 if not new_data_df.empty:
-                    # __ convert DataFrame rows to a list of CandleData instances __
-                    new_records = self.create_candle_data_list_of_records(ticker=ticker_obj, df=new_data_df, model_class=model_class, interval=interval)
-                    # __ perform the bulk insert __
-                    self.session.bulk_save_objects(new_records)
-                    LOGGER.info(f"{ticker.rjust(10)} (id: {str(ticker_obj.id).rjust(5)}) - {model_class_name} - {len(new_records)} records inserted.")
+                    # __ perform the bulk insert in the same savepoint of the delete __
+                    inserted = self.insert_candle_data(ticker=ticker_obj, df=new_data_df, model_class=model_class, interval=interval)
+                    PIPELINE_STATS.rows(inserted=inserted)
+                    LOGGER.info(f"{ticker.rjust(10)} (id: {str(ticker_obj.id).rjust(5)}) - {model_class_name} - {inserted} records inserted.")
 
+                # __ latest candle of the ticker (latest-state table of the daily candles) in the same transaction __
+                refresh_latest_rows(self.session, model_class, ticker_ids=[ticker_obj.id])
                 self.commit()
         except Exception as e:
             self.session.rollback()
-            print(f"Error: {e}")
\ No newline at end of file
+            print(f"Error: {e}")
+            return None
+
+        self.update_candle_cache(ticker=ticker_obj, symbol=ticker, model_class=model_class, interval=interval, from_date=last_candle.date)
\ No newline at end of file
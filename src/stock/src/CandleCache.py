@@ -0,0 +1,162 @@
+import os
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Type
+from dataclasses import dataclass, field
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import session as sess
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, without it the cache is disabled and the candles are read from the database
+    pa = pq = None
+
+from src.stock.src.CandleDataInterval import CandleDataInterval
+from src.stock.src.db.models import Base, Ticker
+
+
+@dataclass
+class CandleCache:
+    """
+    Local columnar copy of the candle_data_* tables, one directory of Parquet parts per (interval, ticker).
+
+    The candles are written as they are stored in the database (id, ticker_id, date, prices, ...), so the
+    readers can use them in place of the query. CandleBulkService appends a part after each committed
+    insert; a part overrides the candles of the same date in the previous parts (the last candle of the
+    ticker is deleted and inserted again on every update). The parts are compacted into one file when they
+    exceed max_parts. A ticker without cache directory is a miss: the reader loads it from the database and
+    writes the whole history.
+
+    Other writers (CandleService, the stock split adjustment) do not go through the cache, so the readers pass
+    the signature of the ticker in the database (get_candle_signatures): a copy that does not match it is a miss.
+
+    :param root: Directory of the cache.
+    :param max_parts: Number of parts of a ticker above which they are compacted into one file.
+    """
+    root: Path = field(default_factory=lambda: Path(os.environ.get('CANDLE_CACHE_DIR', Path(__file__).parent.parent.joinpath('candle_cache'))))
+    max_parts: int = 20
+
+    @property
+    def enabled(self) -> bool:
+        return pq is not None
+
+    def ticker_dir(self, interval: CandleDataInterval, symbol: str) -> Path:
+        return self.root.joinpath(interval.value, symbol)
+
+    def exists(self, interval: CandleDataInterval, symbol: str) -> bool:
+        return self.enabled and any(self.ticker_dir(interval, symbol).glob('part-*.parquet'))
+
+    def parts(self, interval: CandleDataInterval, symbol: str) -> list[Path]:
+        return sorted(self.ticker_dir(interval, symbol).glob('part-*.parquet'))
+
+    @staticmethod
+    def signature(df: pd.DataFrame) -> tuple:
+        """ (number of candles, max id, max last_update) of the candles, the same aggregate as get_candle_signatures. """
+        return candle_signature(len(df), df['id'].max(), df['last_update'].max())
+
+    def read(self, interval: CandleDataInterval, symbol: str, signature: Optional[tuple] = None) -> Optional[pd.DataFrame]:
+        """
+        Read the candles of a ticker, memory-mapping the parts.
+
+        :param interval: The interval of the candles.
+        :param symbol: The ticker symbol.
+        :param signature: Signature of the candles of the ticker in the database, a copy not matching it is stale.
+        :return: DataFrame of the candles sorted by date, or None on miss or stale copy (or cache disabled).
+        """
+        if not self.enabled:
+            return None
+
+        parts = self.parts(interval, symbol)
+        if not parts:
+            return None
+
+        try:
+            df = pd.concat([pq.read_table(part, memory_map=True).to_pandas() for part in parts], ignore_index=True)
+        except (OSError, pa.ArrowException):
+            # __ a damaged part is a miss, the reader falls back to the database and rewrites the cache __
+            return None
+
+        if len(parts) > 1:
+            df = df.drop_duplicates(subset='date', keep='last')
+        if signature is not None and self.signature(df) != signature:
+            return None
+        return df.sort_values(by='date').reset_index(drop=True)
+
+    def write(self, interval: CandleDataInterval, symbol: str, df: pd.DataFrame) -> None:
+        """
+        Replace the candles of a ticker with the given ones (whole history).
+
+        :param interval: The interval of the candles.
+        :param symbol: The ticker symbol.
+        :param df: DataFrame of the candles, with the columns of the candle_data table.
+        """
+        if not self.enabled or df is None or df.empty:
+            return
+
+        old_parts = self.parts(interval, symbol)
+        self._write_part(interval, symbol, df)
+        for part in old_parts:
+            part.unlink(missing_ok=True)
+
+    def append(self, interval: CandleDataInterval, symbol: str, df: pd.DataFrame) -> None:
+        """
+        Append new candles of a ticker already in cache (a ticker not in cache stays a miss).
+
+        :param interval: The interval of the candles.
+        :param symbol: The ticker symbol.
+        :param df: DataFrame of the new candles, with the columns of the candle_data table.
+        """
+        if not self.exists(interval, symbol) or df is None or df.empty:
+            return
+
+        self._write_part(interval, symbol, df)
+
+        # __ compact the parts into a single file __
+        if len(self.parts(interval, symbol)) > self.max_parts:
+            self.write(interval, symbol, self.read(interval, symbol))
+
+    def invalidate(self, interval: CandleDataInterval, symbol: str) -> None:
+        """
+        Remove the candles of a ticker from the cache (e.g. after the history was adjusted in the database).
+
+        :param interval: The interval of the candles.
+        :param symbol: The ticker symbol.
+        """
+        for part in self.parts(interval, symbol):
+            part.unlink(missing_ok=True)
+
+    def _write_part(self, interval: CandleDataInterval, symbol: str, df: pd.DataFrame) -> Path:
+        """Write a new part atomically (temporary file renamed), named so that the parts sort by write time."""
+        ticker_dir = self.ticker_dir(interval, symbol)
+        ticker_dir.mkdir(parents=True, exist_ok=True)
+
+        part = ticker_dir.joinpath(f"part-{pd.Timestamp.now(tz='UTC').strftime('%Y%m%d%H%M%S%f')}.parquet")
+        tmp_part = part.with_suffix('.tmp')
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_part)
+        os.replace(tmp_part, part)
+        return part
+
+
+def candle_signature(count, max_id, max_last_update) -> tuple:
+    return int(count), None if pd.isna(max_id) else int(max_id), None if pd.isna(max_last_update) else pd.Timestamp(max_last_update)
+
+
+def get_candle_signatures(session: sess.Session, model_class: Type[Base], symbols: list[str]) -> dict:
+    """
+    Signature of the candles of each ticker in the database, with one aggregate query: any insert, delete or
+    update (which sets last_update) of the candles changes it.
+
+    :param session: SQLAlchemy session for database operations.
+    :param model_class: The model class for the candle data.
+    :param symbols: The ticker symbols.
+    :return: Dictionary {symbol: (number of candles, max id, max last_update)}, tickers without candles missing.
+    """
+    query = (
+        select(Ticker.symbol, func.count(model_class.id), func.max(model_class.id), func.max(model_class.last_update))
+        .join(Ticker, Ticker.id == model_class.ticker_id)
+        .where(Ticker.symbol.in_(symbols))
+        .group_by(Ticker.symbol)
+    )
+    return {symbol: candle_signature(count, max_id, max_last_update) for symbol, count, max_id, max_last_update in session.execute(query)}
@@ -11,6 +11,9 @@ from src.stock.src.TickerServiceBase import TickerServiceBase
 from src.stock.src.db.models import CandleDataMonth, CandleDataWeek, CandleDataDay, CandleData1Hour, CandleData5Minutes, CandleData1Minute
 from src.stock.src.CandleDataInterval import CandleDataInterval
 from src.stock.src.db.database import Base
+from src.stock.src.db.partitions import ensure_candle_partitions
+from src.stock.src.PipelineStats import PIPELINE_STATS
+from src.stock.src.yf_download import yf_download
 
 from logger_setup import LOGGER
 
@@ -35,6 +38,7 @@ class CandleService(TickerServiceBase):
         CandleDataInterval.WEEK: CandleDataWeek,
         CandleDataInterval.MONTH: CandleDataMonth
     })
+    prefetched_candles: dict = field(default_factory=dict, init=False)  # {interval: (period, downloaded candles)}
 
     @staticmethod
     def is_intraday_interval(interval: CandleDataInterval) -> bool:
@@ -60,20 +64,21 @@ class CandleService(TickerServiceBase):
         # __ prepare the model class name for the bulk update __
         model_class_name = self.format_model_class_name(model_class=model_class)
 
-        # __ fetch the latest candle data for the specified interval __
-        filters = self.prepare_filters(model_class, additional_filters=None)
-        last_candle = self.session.query(model_class).filter(*filters).order_by(model_class.date.desc()).first()  # TODO: use self.fetch_last_records
+        # __ fetch the latest candle data for the specified interval and the period of the new candle data __
+        with PIPELINE_STATS.timer('db'):
+            last_candle, period = self.get_last_candle_and_period(interval=interval)
 
-        # __ get the period for fetching the new candle data __
-        period = self.get_period(last_candle=last_candle, interval=interval)
-
-        # __ download the candle data for the specified interval and period __
-        candle_data = self.download_candle_data(interval=interval, period=period)
+        # __ download the candle data for the specified interval and period (unless prefetched for the same period) __
+        prefetched_period, candle_data = self.prefetched_candles.pop(interval, (None, None))
+        if prefetched_period != period:
+            with PIPELINE_STATS.timer('fetch'):
+                candle_data = self.download_candle_data(interval=interval, period=period)
 
         # TODO: insert here a check for None or empty DataFrame
 
         # __ post-process the downloaded data __
-        candle_data = self.post_download(candle_data, ticker=self.ticker.symbol)
+        with PIPELINE_STATS.timer('transform'):
+            candle_data = self.post_download(candle_data, ticker=self.ticker.symbol)
 
         # __ check if the candle data is empty __
         if candle_data is None or candle_data.empty:
@@ -84,14 +89,23 @@ class CandleService(TickerServiceBase):
         candle_data_len = candle_data.shape[0] if isinstance(candle_data, pd.DataFrame) else 0
 
         # __ prepare the candle data for insertion or update __
-        candle_data = self.prepare_candle_data(candle_data, interval)
+        with PIPELINE_STATS.timer('transform'):
+            candle_data = self.prepare_candle_data(candle_data, interval)
+
+        # __ create the monthly partitions of the new candles (partitioned intraday tables) __
+        with PIPELINE_STATS.timer('db'):
+            if ensure_candle_partitions(self.session, model_class, candle_data['date']):
+                self.commit_ddl()
 
         # __ if there's no last date, bulk update all the data __
         if not last_candle:
             # __ convert DataFrame rows to a list of CandleData instances __
-            new_records = self.create_candle_data_list_of_records(df=candle_data, model_class=model_class, interval=interval)
+            with PIPELINE_STATS.timer('transform'):
+                new_records = self.create_candle_data_list_of_records(df=candle_data, model_class=model_class, interval=interval)
             # __ perform the bulk insert __
-            self.bulk_insert_records(records_to_insert=new_records, model_class_name=model_class_name)
+            with PIPELINE_STATS.timer('db'):
+                self.bulk_insert_records(records_to_insert=new_records, model_class_name=model_class_name)
+            PIPELINE_STATS.rows(inserted=len(new_records))
             return candle_data_len
 
         # __ filter out candles that are older than the last_candle's date __
@@ -116,18 +130,45 @@ class CandleService(TickerServiceBase):
 
         # __ delete the last record if it exists __
         if not last_data_df.empty:
-            self.session.delete(last_candle)
-            self.session.commit()
+            with PIPELINE_STATS.timer('db'):
+                self.session.delete(last_candle)
+                self.commit()
 
         # __ insert the remaining new records __
         if not new_data_df.empty:
             # __ convert DataFrame rows to a list of CandleData instances __
-            new_records = self.create_candle_data_list_of_records(df=new_data_df, model_class=model_class, interval=interval)
+            with PIPELINE_STATS.timer('transform'):
+                new_records = self.create_candle_data_list_of_records(df=new_data_df, model_class=model_class, interval=interval)
             # __ perform the bulk insert __
-            self.bulk_insert_records(records_to_insert=new_records, model_class_name=model_class_name)
+            with PIPELINE_STATS.timer('db'):
+                self.bulk_insert_records(records_to_insert=new_records, model_class_name=model_class_name)
+            PIPELINE_STATS.rows(inserted=len(new_records))
 
         return candle_data_len
 
+    def get_last_candle_and_period(self, interval: CandleDataInterval) -> (Optional[Base], str):
+        """
+        Get the last stored candle of the interval and the period to download after it.
+
+        :param interval: The interval for the candle data.
+        :return: The last candle (None if there is none) and the period for yfinance.
+        """
+        model_class = self.interval_model_map.get(interval)
+        filters = self.prepare_filters(model_class, additional_filters=None)
+        last_candle = self.session.query(model_class).filter(*filters).order_by(model_class.date.desc()).first()  # TODO: use self.fetch_last_records
+        return last_candle, self.get_period(last_candle=last_candle, interval=interval)
+
+    def prefetch_candle_data(self, periods: dict[CandleDataInterval, str]) -> None:
+        """
+        Download the candles of the given intervals and keep them for handle_candle_data (no database access, so
+        it can run in a worker thread). yf.download keeps its results in module-level state, so the downloads are
+        serialized with those of the other tickers and threads (yf_download).
+
+        :param periods: Dictionary {interval: period} returned by get_last_candle_and_period.
+        """
+        for interval, period in periods.items():
+            self.prefetched_candles[interval] = (period, self.download_candle_data(interval=interval, period=period))
+
     def download_candle_data(self, interval: CandleDataInterval, period: str) -> Optional[pd.DataFrame]:
         """
         Download candle data for the given interval and period.
@@ -144,11 +185,11 @@ class CandleService(TickerServiceBase):
 
         # TODO: add a protection when downloading week candles
 
-        # __ download the candle data from Yahoo Finance __
+        # __ download the candle data from Yahoo Finance (serialized with the other threads, see yf_download) __
         candle_data = safe_execute(
             None,
-            lambda: yf.download(
-                tickers=self.ticker.symbol,
+            lambda: yf_download(
+                tickers=self.symbol,
                 interval=interval_str,
                 period=period,
                 progress=False,
@@ -402,7 +443,8 @@ class CandleService(TickerServiceBase):
             if changes_log:
                 for key, value in new_data.items():
                     setattr(existing_record, key, value)
-                self.session.commit()
+                self.update_latest_rows(type(existing_record))
+                self.commit()
                 LOGGER.warning(f"{self.ticker.symbol} - {model_class_name.rjust(50)} - UPDATED record for \"{interval}\" on {new_data['date']}.")
                 for change in changes_log:  # TODO: reuse the generic function
                     LOGGER.debug(change)
@@ -410,5 +452,5 @@ class CandleService(TickerServiceBase):
                 LOGGER.warning(f"{self.ticker.symbol} - {model_class_name.rjust(50)} - No changes detected for \"{interval}\" on {new_data['date']}.")
 
         except Exception as e:
-            self.session.rollback()
+            self.rollback()
             LOGGER.error(f"Error occurred while updating today's candle: {e}")
\ No newline at end of file
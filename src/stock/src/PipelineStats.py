@@ -0,0 +1,213 @@
+import pandas as pd
+from time import perf_counter
+from datetime import datetime
+from threading import Lock
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import PipelineRunSectionStats
+
+from logger_setup import LOGGER
+
+# __ (section, symbol) of the handler running in the current context (thread) __
+_current_section: ContextVar[Optional[tuple[str, str]]] = ContextVar("pipeline_current_section", default=None)
+
+
+@dataclass
+class SectionStats:
+    """
+    Time and rows of one section (dataset) of one ticker, accumulated over the calls of the run.
+    """
+    section: str
+    symbol: str
+    calls: int = 0
+    fetch_time: float = 0.0
+    transform_time: float = 0.0
+    db_time: float = 0.0
+    total_time: float = 0.0
+    rows_inserted: int = 0
+    rows_unchanged: int = 0
+
+
+@dataclass
+class PipelineStats:
+    """
+    Lightweight instrumentation of the stock pipeline: fetch / transform / database time and rows inserted /
+    unchanged per (section, ticker).
+
+    TickerUpdater opens a section() scope around every handler, the code inside records its stages with
+    timer() and rows() without knowing the section (the scope is kept in a context variable, so concurrent
+    workers do not mix their sections). The bulk candle stages record their batch under the symbol '*'.
+    At the end of the run summary() aggregates the stats per section and persist() stores them.
+    """
+    run_id: str = field(default_factory=lambda: datetime.now().strftime('%Y%m%d_%H%M%S'))
+    stats: dict = field(default_factory=dict)   # {(section, symbol): SectionStats}
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def reset(self) -> None:
+        """ Start a new run. """
+        with self._lock:
+            self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.stats = {}
+
+    def record(self, section: str, symbol: str, **values) -> None:
+        """
+        Add the given values (calls, *_time, rows_*) to the stats of the (section, ticker).
+
+        :param section: The section (e.g. TickerUpdaterStatus value).
+        :param symbol: The ticker symbol.
+        :param values: The values to add.
+        """
+        with self._lock:
+            stats = self.stats.setdefault((section, symbol), SectionStats(section=section, symbol=symbol))
+            for name, value in values.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    @contextmanager
+    def section(self, section: str, symbol: str):
+        """
+        Scope of a section handler: counts the call and its total time, and routes timer() and rows() to it.
+
+        :param section: The section (e.g. TickerUpdaterStatus value).
+        :param symbol: The ticker symbol.
+        """
+        token = _current_section.set((section, symbol))
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            _current_section.reset(token)
+            self.record(section, symbol, calls=1, total_time=perf_counter() - start_time)
+
+    @contextmanager
+    def timer(self, stage: str, section: str = None, symbol: str = None):
+        """
+        Time a stage of the current section, or of the given one (outside a section scope, the stage time is
+        also added to its total time).
+
+        :param stage: One of 'fetch', 'transform', 'db'.
+        :param section: The section, default: the one of the current scope (nothing is recorded outside a scope).
+        :param symbol: The ticker symbol, default: the one of the current scope.
+        """
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start_time
+            if section is not None:
+                self.record(section, symbol, **{f"{stage}_time": elapsed, 'total_time': elapsed})
+            elif _current_section.get() is not None:
+                self.record(*_current_section.get(), **{f"{stage}_time": elapsed})
+
+    def rows(self, inserted: int = 0, unchanged: int = 0, section: str = None, symbol: str = None) -> None:
+        """
+        Count the rows inserted and unchanged by the current section (or by the given one).
+
+        :param inserted: Number of rows inserted.
+        :param unchanged: Number of rows already stored.
+        :param section: The section, default: the one of the current scope.
+        :param symbol: The ticker symbol, default: the one of the current scope.
+        """
+        key = (section, symbol) if section is not None else _current_section.get()
+        if key is not None:
+            self.record(*key, rows_inserted=inserted, rows_unchanged=unchanged)
+
+    def touched_symbols(self) -> dict:
+        """
+        Tickers possibly changed by each section of the run: those with rows inserted, or whose section does not
+        count its rows. Sections that only found unchanged rows are left out.
+
+        :return: Dictionary {section: set of symbols}.
+        """
+        touched = {}
+        with self._lock:
+            for (section, symbol), stats in self.stats.items():
+                if symbol != '*' and (stats.rows_inserted > 0 or stats.rows_unchanged == 0):
+                    touched.setdefault(section, set()).add(symbol)
+        return touched
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ Stats per (section, ticker). """
+        with self._lock:
+            return pd.DataFrame([vars(stats) for stats in self.stats.values()], columns=list(SectionStats.__dataclass_fields__))
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Aggregate the stats per section, slowest sections first.
+
+        :return: DataFrame with tickers, calls, total and average time per stage, p95 of the time per ticker and rows.
+        """
+        df = self.to_dataframe()
+        if df.empty:
+            return df
+
+        summary = df.groupby('section').agg(
+            tickers=('symbol', 'nunique'),
+            calls=('calls', 'sum'),
+            fetch_time=('fetch_time', 'sum'),
+            transform_time=('transform_time', 'sum'),
+            db_time=('db_time', 'sum'),
+            total_time=('total_time', 'sum'),
+            p95_time=('total_time', lambda x: x.quantile(0.95)),
+            rows_inserted=('rows_inserted', 'sum'),
+            rows_unchanged=('rows_unchanged', 'sum'),
+        )
+        summary['avg_time'] = summary['total_time'] / summary['tickers']
+        return summary.sort_values(by='total_time', ascending=False).round(3).reset_index()
+
+    def log_summary(self) -> pd.DataFrame:
+        """ Log the summary table of the run. """
+        summary = self.summary()
+        if summary.empty:
+            return summary
+
+        LOGGER.info(f"{'Pipeline stats:'.ljust(25)} run {self.run_id}")
+        LOGGER.info(f"{'section'.rjust(40)} {'tickers':>8} {'fetch':>9} {'transform':>9} {'db':>9} {'total':>9} {'avg':>7} {'p95':>7} {'inserted':>9} {'unchanged':>9}")
+        for row in summary.itertuples():
+            LOGGER.info(f"{row.section.rjust(40)} {row.tickers:>8} {row.fetch_time:>9} {row.transform_time:>9} {row.db_time:>9} "
+                        f"{row.total_time:>9} {row.avg_time:>7} {row.p95_time:>7} {row.rows_inserted:>9} {row.rows_unchanged:>9}")
+        return summary
+
+    def persist(self, session: sess.Session) -> int:
+        """
+        Store the summary of the run in pipeline_run_section_stats (one row per section), to compare the runs.
+
+        :param session: SQLAlchemy session for database operations.
+        :return: Number of sections stored.
+        """
+        summary = self.summary()
+        if summary.empty:
+            return 0
+
+        now = datetime.now()
+        try:
+            session.bulk_save_objects([
+                PipelineRunSectionStats(
+                    run_id=self.run_id,
+                    section=row.section,
+                    tickers=int(row.tickers),
+                    calls=int(row.calls),
+                    fetch_time=float(row.fetch_time),
+                    transform_time=float(row.transform_time),
+                    db_time=float(row.db_time),
+                    total_time=float(row.total_time),
+                    p95_time=float(row.p95_time),
+                    rows_inserted=int(row.rows_inserted),
+                    rows_unchanged=int(row.rows_unchanged),
+                    last_update=now,
+                )
+                for row in summary.itertuples()
+            ])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            LOGGER.error(f"{'Pipeline stats'.rjust(50)} - not stored: {e}")
+            return 0
+        return len(summary)
+
+
+PIPELINE_STATS = PipelineStats()  # Shared by the workers of the run
@@ -0,0 +1,168 @@
+import re
+import threading
+from time import monotonic, sleep
+from datetime import datetime
+from dataclasses import dataclass, field
+
+from logger_setup import LOGGER
+
+THROTTLING_STATUS = 429
+THROTTLING_EXCEPTIONS = ("YFRateLimitError", "JSONDecodeError")  # names of the exception types (JSONDecodeError: empty throttled body)
+# __ the same signals in the messages logged by yfinance: the exception names, the reason phrase or the HTTP status __
+THROTTLING_MESSAGE_PATTERN = re.compile(
+    rf"\b(?:{'|'.join(THROTTLING_EXCEPTIONS)})\b"
+    rf"|\bToo Many Requests\b"
+    rf"|\b(?:HTTP Error|status code|status|response)\s*:?\s*{THROTTLING_STATUS}\b"
+    rf"|\b{THROTTLING_STATUS} Client Error\b",
+    re.IGNORECASE,
+)
+
+
+def is_throttling_error(error) -> bool:
+    """
+    Return True if the error is Yahoo throttling the requests: a rate limit exception, an HTTP error with status
+    429, or a yfinance message naming one of them (not any message that happens to contain "429").
+    """
+    if error is None:
+        return False
+    if isinstance(error, BaseException):
+        if type(error).__name__ in THROTTLING_EXCEPTIONS:
+            return True
+        if getattr(getattr(error, 'response', None), 'status_code', None) == THROTTLING_STATUS:
+            return True
+    return THROTTLING_MESSAGE_PATTERN.search(str(error)) is not None
+
+
+@dataclass
+class RateLimiter:
+    """
+    Token bucket shared by all the workers of a run to cap the global rate of yfinance requests.
+
+    :param rate: Maximum number of requests per second (tokens refilled per second).
+    :param burst: Maximum number of tokens that can be accumulated while idle.
+    """
+    rate: float
+    burst: int = 1
+    _tokens: float = field(default=0.0, init=False)
+    _last_refill: float = field(default_factory=monotonic, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.rate <= 0:
+            raise ValueError(f"Invalid rate: {self.rate}. Expected a positive number of requests per second.")
+        self._tokens = float(self.burst)
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last refill, capped to the burst size."""
+        now = monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until a token is available and consume the requested tokens.
+
+        Requests costing more than one token (e.g. a bulk download of many symbols) are let through as soon as
+        one token is available and leave the bucket in debt, which is paid off by the following callers.
+
+        :param tokens: The number of tokens (requests) to consume.
+        :return: The number of seconds spent waiting for the token.
+        """
+        required = min(tokens, 1.0)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= required:
+                    self._tokens -= tokens
+                    return waited
+                wait_time = (required - self._tokens) / self.rate
+
+            sleep(wait_time)
+            waited += wait_time
+
+
+@dataclass
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate follows an AIMD policy: it grows additively while Yahoo responds cleanly
+    and is cut multiplicatively, with an exponential back-off shared by all the callers, on throttling.
+
+    The callers that hit the same throttling (e.g. the workers in flight when Yahoo starts answering 429) report
+    it once each: the signals received during the back-off belong to the same event and do not cut the rate again.
+
+    :param min_rate: Lower bound of the rate in requests per second.
+    :param max_rate: Upper bound of the rate in requests per second.
+    :param increase_step: Requests per second added for every clean response.
+    :param decrease_factor: Factor applied to the rate on throttling.
+    :param base_backoff: Seconds of back-off after the first throttling signal.
+    :param max_backoff: Upper bound of the back-off in seconds.
+    """
+    min_rate: float = 0.5
+    max_rate: float = 50.0
+    increase_step: float = 0.05
+    decrease_factor: float = 0.5
+    base_backoff: float = 5.0
+    max_backoff: float = 300.0
+    successes: int = field(default=0, init=False)
+    throttles: int = field(default=0, init=False)
+    backoff_events: list = field(default_factory=list, init=False)
+    _consecutive_throttles: int = field(default=0, init=False)
+    _backoff_until: float = field(default=0.0, init=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        if not self.min_rate <= self.rate <= self.max_rate:
+            raise ValueError(f"Invalid rate: {self.rate}. Expected a rate between {self.min_rate} and {self.max_rate}.")
+
+    def on_success(self) -> None:
+        """ Record a clean response and increase the rate by a fixed step. """
+        with self._lock:
+            self._refill()
+            self.successes += 1
+            self._consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, reason: str = '') -> float:
+        """
+        Record a throttling signal: cut the rate and put the bucket in debt for the back-off time,
+        so every caller of acquire waits for it. A signal received during the back-off is the same throttling
+        event: it is counted, but the rate and the back-off are left as they are.
+
+        :param reason: The error that signalled the throttling (for logging).
+        :return: The back-off in seconds (the remaining one for a signal of the current event).
+        """
+        with self._lock:
+            self._refill()
+            self.throttles += 1
+            now = monotonic()
+            if now < self._backoff_until:
+                return self._backoff_until - now
+            self._consecutive_throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_throttles - 1))
+            self._tokens = min(self._tokens, 0.0) - backoff * self.rate
+            self._backoff_until = now + backoff
+            self.backoff_events.append({'time': datetime.now(), 'backoff_secs': backoff, 'rate': self.rate, 'reason': reason})
+
+        LOGGER.warning(f"{'Rate Limiter'.rjust(25)} - throttling detected ({reason}) - backing off {round(backoff, 2)} sec, rate set to {round(self.rate, 3)} req/sec")
+        return backoff
+
+    def backoff(self, reason: str = '') -> float:
+        """
+        Record a throttling signal and wait for the back-off.
+
+        :param reason: The error that signalled the throttling (for logging).
+        :return: The number of seconds spent waiting.
+        """
+        self.on_throttle(reason=reason)
+        return self.acquire(tokens=0)
+
+    def metrics(self) -> dict:
+        """Return the current rate and the back-off statistics."""
+        with self._lock:
+            return {'rate': round(self.rate, 3),
+                    'successes': self.successes,
+                    'throttles': self.throttles,
+                    'backoff_events': len(self.backoff_events),
+                    'backoff_time_secs': round(sum(event['backoff_secs'] for event in self.backoff_events), 2)}
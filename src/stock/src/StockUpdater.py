@@ -4,6 +4,9 @@ import pandas as pd
 from time import time, sleep
 from typing import Optional
 from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from queue import Queue, Empty
+from threading import Thread
 
 from numpy.array_api import floor
 from sqlalchemy.orm import session as sess
@@ -11,22 +14,73 @@ from sqlalchemy import text
 
 from src.common.tools.library import seconds_to_time, safe_execute
 from src.stock.src.CandleBulkService import CandleBulkService
-from src.stock.src.TickerUpdater import TickerUpdater
+from src.stock.src.TickerUpdater import TickerUpdater, TickerUpdatePlanner
 from src.stock.src.TickerService import TickerService
+from src.stock.src.RateLimiter import RateLimiter, AdaptiveRateLimiter, is_throttling_error
 from src.stock.src.db.database import session_local
 from src.stock.src.CandleService import CandleDataInterval, CandleDataDay
 from src.stock.src.Queries import Queries
+from src.stock.src.PipelineStats import PIPELINE_STATS
 
 
-from logger_setup import LOGGER, error_handler
+from logger_setup import LOGGER, yf_error_collector
 import logging
-from src.stock.src.RaiseOnErrorHandler import RaiseOnErrorHandler
+
+
+@dataclass
+class WorkerStats:
+    """
+    Statistics collected by a single worker of StockUpdater.update_all_tickers_concurrently.
+    """
+    worker_id: int
+    completed_symbols: int = 0
+    failed_symbols: list[str] = field(default_factory=list)
+    middle_time_secs: float = 0
+    end_time_secs: float = 0
+    elapsed_time_secs: float = 0
+
+    @property
+    def throughput_per_minute(self) -> float:
+        """Number of tickers processed (completed or failed) per minute of worker time."""
+        processed = self.completed_symbols + len(self.failed_symbols)
+        return round(processed / self.elapsed_time_secs * 60, 2) if self.elapsed_time_secs > 0 else 0
+
+    def to_dict(self) -> dict:
+        return {'worker_id': self.worker_id,
+                'completed_symbols': self.completed_symbols,
+                'failed_symbols': len(self.failed_symbols),
+                'elapsed_time': round(self.elapsed_time_secs, 3),
+                'throughput_per_minute': self.throughput_per_minute}
 
 
 class StockUpdater:
-    def __init__(self, session: sess.Session, symbols_with_errors: Optional[list[str]] = None):
+    def __init__(self,
+                 session: sess.Session,
+                 symbols_with_errors: Optional[list[str]] = None,
+                 max_workers: int = 1,
+                 requests_per_second: Optional[float] = None,
+                 use_ttl: bool = True,
+                 adaptive_rate: bool = True):
+        """
+        :param session: SQLAlchemy session used for the sequential update.
+        :param symbols_with_errors: Symbols with existing yfinance errors.
+        :param max_workers: Number of tickers updated in parallel, each worker with its own session (1 = sequential).
+        :param requests_per_second: Global cap on the yfinance requests of all the workers (None = no cap, or the
+            default AIMD bounds when adaptive_rate is set).
+        :param use_ttl: Whether to skip the datasets that are still fresh according to the TTL table.
+        :param adaptive_rate: Whether the requests go through an AIMD rate limiter that backs off on throttling,
+            instead of the fixed sleeps after failures.
+        """
         self.session = session
         self.symbols_with_errors = symbols_with_errors
+        self.max_workers = max(1, max_workers)
+        if adaptive_rate:
+            self.rate_limiter = AdaptiveRateLimiter(rate=requests_per_second, min_rate=min(0.5, requests_per_second), max_rate=requests_per_second) \
+                if requests_per_second else AdaptiveRateLimiter(rate=10.0)
+        else:
+            self.rate_limiter = RateLimiter(rate=requests_per_second) if requests_per_second else None
+        self.use_ttl = use_ttl
+        self.planner = None
 
     def execute_function(self,
                          default,
@@ -56,20 +110,20 @@ class StockUpdater:
         If an error occurs, it logs the error and returns the default value.
         """
 
-        try:
-            x =  function(*args)
-        except RuntimeError as e:
-            LOGGER.error(f"{e}")
-            x = default
-        except Exception as e:
-            LOGGER.error(f"{e}")
-            x = default
+        with yf_error_collector.collect() as yf_errors:
+            try:
+                x =  function(*args)
+            except RuntimeError as e:
+                LOGGER.error(f"{e}")
+                x = default
+            except Exception as e:
+                LOGGER.error(f"{e}")
+                x = default
 
         if check_yf and isinstance(x, pd.DataFrame) and x.empty:
-            LOGGER.warning(f"{self.symbol} - Empty DataFrame returned from yfinance for {label}. Sleeping for 2.5 seconds to check for exceptions.")
-            sleep(2.5)  # Sleep to wait for the exception to be raised in the ErrorHandler
+            LOGGER.warning(f"{self.symbol} - Empty DataFrame returned from yfinance for {label}. Checking for exceptions.")
             try:
-                error_handler.check_for_exception()  # Check and raise exception in the main thread
+                yf_error_collector.check_for_exception(yf_errors)  # Raise the errors logged by the call
             except RuntimeError as e:
                 lines = str(e).split('\n')
                 sublines = lines[1].split('\n') if len(lines) > 1 else []
@@ -86,6 +140,44 @@ class StockUpdater:
 
         return x, True, "", ""
 
+    def on_symbol_failure(self, error: Exception, pause_secs: float = 1.0) -> None:
+        """
+        Pause after a failed ticker: back off only on throttling with the adaptive limiter, a fixed pause otherwise.
+
+        :param error: The error raised while updating the ticker.
+        :param pause_secs: The fixed pause used without the adaptive limiter.
+        """
+        if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+            if is_throttling_error(error):
+                self.rate_limiter.backoff(reason=str(error).split('\n')[0])
+        elif pause_secs > 0:
+            sleep(pause_secs)
+
+    def update_symbol(self, session: sess.Session, symbol: str, index: int, num_symbols: int) -> (float, float):
+        """
+        Update a single ticker on the given session.
+
+        :param session: SQLAlchemy session used for the update.
+        :param symbol: The symbol of the ticker to update.
+        :param index: Position of the symbol in the run (for logging).
+        :param num_symbols: Total number of symbols in the run (for logging).
+        :return: The time spent before the candles update and the total time spent on the ticker.
+        """
+        # check if the symbol is in the list of yfinance errors
+        if len(self.symbols_with_errors or []) > 0 and symbol in self.symbols_with_errors:
+            has_yf_errors = True
+        else:
+            has_yf_errors = False
+        update_plan = self.planner.plan(symbol) if self.planner is not None else None
+        ticker_updater = TickerUpdater(session=session,
+                                       symbol=symbol,
+                                       has_yf_errors=has_yf_errors,
+                                       rate_limiter=self.rate_limiter,
+                                       update_plan=update_plan)
+        LOGGER.info(f"{symbol.rjust(5)} - {index+1}/{num_symbols} - Start updating...")
+        middle, end = ticker_updater.update_ticker()
+        return middle, end
+
     def update_all_tickers(self, symbols: list[str]) -> dict:
         num_symbols = len(symbols)
 
@@ -97,28 +189,38 @@ class StockUpdater:
         completed_symbols = 0
 
         failed_symbols = []
+        workers_stats = []
+        PIPELINE_STATS.reset()
 
-        # __ update all tickers __
-        for index, symbol in enumerate(symbols):
-            try:
-                # check if the symbol is in the list of yfinance errors
-                if len(self.symbols_with_errors or []) > 0 and symbol in self.symbols_with_errors:
-                    has_yf_errors = True
-                else:
-                    has_yf_errors = False
-                ticker_updater = TickerUpdater(session=self.session, symbol=symbol, has_yf_errors=has_yf_errors)
-                LOGGER.info(f"{symbol.rjust(5)} - {index+1}/{num_symbols} - Start updating...")
-                middle, end = ticker_updater.update_ticker()
-                middle_time_secs += middle
-                end_time_secs += end
-                completed_symbols += 1
-            except RuntimeError as e:
-                LOGGER.error(f"{e}")
-                failed_symbols.append(symbol)
-            except Exception as e:
-                LOGGER.warning(f"{symbol} - Error: {e}")
-                failed_symbols.append(symbol)
-                sleep(1)
+        # __ load the last run of every dataset for the whole batch in one query __
+        if self.use_ttl:
+            self.planner = TickerUpdatePlanner(session=self.session)
+            self.planner.load(symbols=symbols)
+
+        if self.max_workers > 1:
+            # __ update all tickers with a pool of workers, each one with its own session __
+            workers_stats = self.update_all_tickers_concurrently(symbols=symbols)
+            for worker_stats in workers_stats:
+                middle_time_secs += worker_stats.middle_time_secs
+                end_time_secs += worker_stats.end_time_secs
+                completed_symbols += worker_stats.completed_symbols
+                failed_symbols += worker_stats.failed_symbols
+        else:
+            # __ update all tickers __
+            for index, symbol in enumerate(symbols):
+                try:
+                    middle, end = self.update_symbol(session=self.session, symbol=symbol, index=index, num_symbols=num_symbols)
+                    middle_time_secs += middle
+                    end_time_secs += end
+                    completed_symbols += 1
+                except RuntimeError as e:
+                    LOGGER.error(f"{e}")
+                    failed_symbols.append(symbol)
+                    self.on_symbol_failure(e, pause_secs=0)
+                except Exception as e:
+                    LOGGER.warning(f"{symbol} - Error: {e}")
+                    failed_symbols.append(symbol)
+                    self.on_symbol_failure(e)
 
         # __ stop tracking the elapsed time and print the stats __
         end_time = time()
@@ -136,11 +238,93 @@ class StockUpdater:
         LOGGER.info(f"{'Average time per ticker (middle time):'.ljust(25)} {average_time_middle} sec")
         LOGGER.info(f"{'Average time per ticker (end time):'.ljust(25)} {average_time_end} sec")
 
+        # __ print the rate limiter metrics __
+        rate_limiter_metrics = self.log_rate_limiter_metrics()
+
+        # __ print and store the time and rows per section __
+        PIPELINE_STATS.log_summary()
+        PIPELINE_STATS.persist(session=self.session)
+
+        # __ print the throughput of each worker __
+        for worker_stats in workers_stats:
+            LOGGER.info(f"{f'Worker {worker_stats.worker_id}:'.ljust(25)} "
+                        f"{worker_stats.completed_symbols} completed, {len(worker_stats.failed_symbols)} failed, "
+                        f"{worker_stats.throughput_per_minute} tickers/min")
+
         return {'total_time': total_time_str,
                 'completed_symbols': completed_symbols,
                 'failed_symbols': failed_symbols,
                 'average_time_middle': average_time_middle,
-                'average_time_end': average_time_end}
+                'average_time_end': average_time_end,
+                'workers': [worker_stats.to_dict() for worker_stats in workers_stats],
+                'rate_limiter': rate_limiter_metrics}
+
+    def log_rate_limiter_metrics(self) -> Optional[dict]:
+        """Log and return the current rate and back-off events of the adaptive rate limiter, if any."""
+        if not isinstance(self.rate_limiter, AdaptiveRateLimiter):
+            return None
+
+        metrics = self.rate_limiter.metrics()
+        LOGGER.info(f"{'Rate limiter:'.ljust(25)} {metrics['rate']} req/sec, "
+                    f"{metrics['backoff_events']} back-offs ({metrics['backoff_time_secs']} sec)")
+        return metrics
+
+    def update_all_tickers_concurrently(self, symbols: list[str]) -> list[WorkerStats]:
+        """
+        Update all tickers with a bounded pool of worker threads.
+
+        Every worker opens its own session from session_local, pulls symbols from a shared queue and
+        closes the session once the queue is exhausted. The yfinance requests of all the workers go
+        through the shared rate limiter, if any, and their yf.download calls are serialized (yf_download).
+
+        :param symbols: The list of symbols to update.
+        :return: The statistics of each worker.
+        """
+        num_symbols = len(symbols)
+        symbols_queue = Queue()
+        for index, symbol in enumerate(symbols):
+            symbols_queue.put((index, symbol))
+
+        num_workers = min(self.max_workers, num_symbols)
+        workers_stats = [WorkerStats(worker_id=worker_id) for worker_id in range(num_workers)]
+
+        def worker(worker_stats: WorkerStats) -> None:
+            session = session_local()
+            worker_start_time = time()
+            try:
+                while True:
+                    try:
+                        index, symbol = symbols_queue.get_nowait()
+                    except Empty:
+                        break
+
+                    try:
+                        middle, end = self.update_symbol(session=session, symbol=symbol, index=index, num_symbols=num_symbols)
+                        worker_stats.middle_time_secs += middle
+                        worker_stats.end_time_secs += end
+                        worker_stats.completed_symbols += 1
+                    except RuntimeError as e:
+                        LOGGER.error(f"{e}")
+                        session.rollback()
+                        worker_stats.failed_symbols.append(symbol)
+                        self.on_symbol_failure(e, pause_secs=0)
+                    except Exception as e:
+                        LOGGER.warning(f"{symbol} - Error: {e}")
+                        session.rollback()
+                        worker_stats.failed_symbols.append(symbol)
+                        self.on_symbol_failure(e)
+            finally:
+                worker_stats.elapsed_time_secs = time() - worker_start_time
+                session.close()
+
+        threads = [Thread(target=worker, args=(worker_stats,), name=f"StockUpdater-{worker_stats.worker_id}")
+                   for worker_stats in workers_stats]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return workers_stats
 
     def update_only_candles_all_tickers(self, symbols: list[str]):
         # __ start tracking the elapsed time __
@@ -157,13 +341,20 @@ class StockUpdater:
             batch_size = 100
 
         batches = split_into_batches(symbols, batch_size=batch_size)
+        PIPELINE_STATS.reset()
 
         for batch in batches:
             candle_bulk_service = CandleBulkService(session=self.session, symbols=batch, commit_enable=True)
+            if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+                # __ share the request budget (and its back-off) across the batches __
+                candle_bulk_service.rate_limiter = self.rate_limiter
             candle_bulk_service.update_all_tickers_candles()
 
         end_time = time()
         total_time = seconds_to_time(end_time - start_time)
         LOGGER.info(f"{'Total elapsed time:'.ljust(25)} {total_time['hours']} hours {total_time['minutes']} min {total_time['seconds']} sec")
         LOGGER.info(f"{'Total tickers:'.ljust(25)} {len(symbols)}")
-        LOGGER.info(f"{'Average time per ticker:'.ljust(25)} {round((end_time - start_time) / len(symbols), 3)} sec")
\ No newline at end of file
+        LOGGER.info(f"{'Average time per ticker:'.ljust(25)} {round((end_time - start_time) / len(symbols), 3)} sec")
+        self.log_rate_limiter_metrics()
+        PIPELINE_STATS.log_summary()
+        PIPELINE_STATS.persist(session=self.session)
\ No newline at end of file
@@ -2,13 +2,14 @@ import numpy as np
 import pandas as pd
 import yfinance as yf
 from datetime import date
-from typing import Optional
+from typing import Optional, Callable, Any
 from datetime import datetime, date
 from dataclasses import dataclass, field
 from collections import Counter
 
 from sqlalchemy.sql import and_
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from src.common.tools.library import safe_execute
 from src.stock.src.TickerServiceBase import Ticker, TickerServiceBase
@@ -16,6 +17,7 @@ from src.stock.src.db.models import *
 from src.stock.src.CandleService import CandleService
 from src.stock.src.CandleDataInterval import CandleDataInterval
 from src.stock.src.insider_txs_utils import add_state_and_price
+from src.stock.src.PipelineStats import PIPELINE_STATS
 
 from logger_setup import LOGGER
 
@@ -29,6 +31,20 @@ def db_max_last_update(session, model, **filters):
         q = q.filter(getattr(model, col) == val)
     return q.scalar()
 
+def db_last_runs(session, symbols: list[str]) -> dict[str, dict[str, datetime]]:
+    """Return {symbol: {dataset: MAX(last_run)}} for the given symbols in one grouped query (pure DB read)."""
+    rows = (
+        session.query(Ticker.symbol, TickerDatasetUpdate.dataset, func.max(TickerDatasetUpdate.last_run))
+        .join(Ticker, TickerDatasetUpdate.ticker_id == Ticker.id)
+        .filter(Ticker.symbol.in_(symbols))
+        .group_by(Ticker.symbol, TickerDatasetUpdate.dataset)
+        .all()
+    )
+    last_runs = {}
+    for symbol, dataset, last_run in rows:
+        last_runs.setdefault(symbol, {})[dataset] = last_run
+    return last_runs
+
 def age_in_days(last_update, now=None) -> int | None:
     """Return integer age in days; None if last_update is missing."""
     if last_update is None:
@@ -39,11 +55,26 @@ def age_in_days(last_update, now=None) -> int | None:
     return (now - last_update).days
 
 
+# __ model column -> normalized yfinance label of the statements, where they differ (the others match by name) __
+STATEMENT_COLUMN_MAP = {
+    BalanceSheet: {
+        'trade_and_other_payables_non_current': 'tradeand_other_payables_non_current',
+        'investment_in_financial_assets': 'investmentin_financial_assets',
+    },
+    CashFlow: {},
+    Financials: {
+        'diluted_net_income_available_to_common_stockholders': 'diluted_ni_availto_com_stockholders',
+        'net_income_including_non_controlling_interests': 'net_income_including_noncontrolling_interests',
+    },
+}
+
+
 @dataclass
 class TickerService(TickerServiceBase):
     candle_service: CandleService = field(default=None, init=False)
     stock: yf.Ticker = field(default=None, init=False)
     info: dict = field(default=None, init=False)
+    prefetched: dict = field(default_factory=dict, init=False)    # Results of the yfinance requests fetched in advance, by key
 
     def set_stock(self, stock: yf.Ticker):
         """
@@ -61,6 +92,65 @@ class TickerService(TickerServiceBase):
         """
         self.info = info
 
+    def get_fetchers(self) -> dict[str, Callable[[], Any]]:
+        """
+        Get the yfinance request behind every key used by the handlers (see fetch).
+
+        :return: Dictionary {key: function performing the request}.
+        """
+        return {
+            'balance_sheet_yearly': lambda: self.stock.get_balance_sheet(freq='yearly'),
+            'balance_sheet_quarterly': lambda: self.stock.get_balance_sheet(freq='quarterly'),
+            'cash_flow_yearly': lambda: self.stock.get_cashflow(freq='yearly'),
+            'cash_flow_quarterly': lambda: self.stock.get_cashflow(freq='quarterly'),
+            'cash_flow_trailing': lambda: self.stock.get_cashflow(freq='trailing'),
+            'financials_yearly': lambda: self.stock.get_income_stmt(freq='yearly'),
+            'financials_quarterly': lambda: self.stock.get_income_stmt(freq='quarterly'),
+            'financials_trailing': lambda: self.stock.get_income_stmt(freq='trailing'),
+            'actions': lambda: getattr(self.stock, "actions"),
+            'calendar': lambda: getattr(self.stock, "calendar"),
+            'earnings_dates': lambda: self.stock.get_earnings_dates(limit=1000),
+            'earnings_history': lambda: self.stock.get_earnings_history(),
+            'splits': lambda: self.stock.get_splits(),
+            'shares_full': lambda: self.stock.get_shares_full(),
+            'isin': lambda: getattr(self.stock, "isin"),
+            'history_metadata': lambda: getattr(self.stock, "history_metadata"),
+            'fast_info': lambda: getattr(self.stock, "fast_info"),
+            'insider_purchases': lambda: getattr(self.stock, "insider_purchases"),
+            'insider_roster_holders': lambda: getattr(self.stock, "insider_roster_holders"),
+            'insider_transactions': lambda: self.stock.get_insider_transactions(),
+            'institutional_holders': lambda: getattr(self.stock, "institutional_holders"),
+            'major_holders': lambda: getattr(self.stock, "major_holders"),
+            'mutualfund_holders': lambda: getattr(self.stock, "mutualfund_holders"),
+            'recommendations': lambda: getattr(self.stock, "recommendations"),
+            'upgrades_downgrades': lambda: getattr(self.stock, "upgrades_downgrades"),
+        }
+
+    def prefetch(self, keys: list[str]) -> None:
+        """
+        Perform the yfinance requests of the given keys and keep the results for the handlers.
+
+        Only the yf.Ticker is used (no database access), so it can run in a worker thread while the
+        handlers write on the session of the ticker.
+
+        :param keys: The keys of the requests to perform (see get_fetchers).
+        """
+        fetchers = self.get_fetchers()
+        for key in keys:
+            self.prefetched[key] = safe_execute(None, fetchers[key])
+
+    def fetch(self, key: str) -> Any:
+        """
+        Get the result of a yfinance request: the prefetched one if any, otherwise the request is performed now.
+
+        :param key: The key of the request (see get_fetchers).
+        :return: The result of the request, None on error.
+        """
+        if key in self.prefetched:
+            return self.prefetched[key]
+        with PIPELINE_STATS.timer('fetch'):
+            return safe_execute(None, self.get_fetchers()[key])
+
     """ Handle the insertion or update of a Ticker record in the database. """
     def handle_ticker(self, info: dict, error: Optional[str], status: Optional[str]) -> bool:
 
@@ -87,7 +177,7 @@ class TickerService(TickerServiceBase):
         except RuntimeError as e:
                 LOGGER.error(f"{e}")
         except Exception as e:
-            self.session.rollback()
+            self.rollback()
             LOGGER.error(f"{self.symbol} - Error updating or inserting ticker: {e}")
 
         return False
@@ -143,6 +233,28 @@ class TickerService(TickerServiceBase):
         self.commit()  # Commit the changes
         return True
 
+    def handle_dataset_runs(self, dataset_runs: dict[str, datetime]) -> bool:
+        """
+        Upsert the last run timestamp of the datasets fetched for the ticker.
+
+        :param dataset_runs: Dictionary {dataset: last_run} of the datasets fetched in this update.
+        :return: True if the timestamps were written, False otherwise.
+        """
+        if not dataset_runs or self.ticker is None:
+            return False
+
+        stmt = pg_insert(TickerDatasetUpdate).values([
+            {'ticker_id': self.ticker.id, 'dataset': dataset, 'last_run': last_run}
+            for dataset, last_run in dataset_runs.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TickerDatasetUpdate.ticker_id, TickerDatasetUpdate.dataset],
+            set_={'last_run': stmt.excluded.last_run}
+        )
+        self.session.execute(stmt)
+        self.commit()
+        return True
+
     def create_new_ticker(self, ticker_data: dict) -> None:
         """
         Create a new Ticker object with the provided data.
@@ -165,7 +277,7 @@ class TickerService(TickerServiceBase):
         self.initialize_candle_service()  # initialize CandleService
 
     def initialize_candle_service(self):
-        self.candle_service = CandleService(session=self.session, symbol=self.ticker.symbol, commit_enable=self.commit_enable)  # initialize CandleService
+        self.candle_service = CandleService(session=self.session, symbol=self.ticker.symbol, commit_enable=self.commit_enable, unit_of_work=self.unit_of_work)  # initialize CandleService
         self.candle_service.initialize_ticker(ticker=self.ticker)  # initialize CandleService ticker attribute
 
     """Handle of all other information"""
@@ -192,9 +304,9 @@ class TickerService(TickerServiceBase):
         # switch period_type:
         match period_type:
             case 'yearly':
-                balance_sheet = safe_execute(None, lambda: self.stock.get_balance_sheet(freq='yearly'))
+                balance_sheet = self.fetch('balance_sheet_yearly')
             case 'quarterly':
-                balance_sheet = safe_execute(None, lambda: self.stock.get_balance_sheet(freq='quarterly'))
+                balance_sheet = self.fetch('balance_sheet_quarterly')
             case _:
                 LOGGER.error(f"{self.ticker.symbol} - Invalid period_type: {period_type}. Expected 'annual' or 'quarterly'.")
                 return None
@@ -204,111 +316,13 @@ class TickerService(TickerServiceBase):
             LOGGER.warning(f"{self.ticker.symbol} - {'Balance Sheet'.rjust(50)} - no data to insert")
             return None
 
-        # Transpose the DataFrame to have dates as rows
-        balance_sheet = balance_sheet.T
-
-        # Give "Date" name to index
-        balance_sheet.index.name = "Date"
-
-        # Reset the index to include the date as a column
-        balance_sheet.reset_index(inplace=True)
-
-        # Normalize column names and handle any renaming needed (matching the SQLAlchemy model attributes)
-        balance_sheet.columns = [col.replace(' ', '_').lower() for col in balance_sheet.columns]
-
-        for _, row in balance_sheet.iterrows():
-            date_ = row['date']
-
-            # Check if a record with the same ticker_id, date, and period_type already exists
-            existing_record = self.session.query(BalanceSheet).filter(
-                and_(
-                    BalanceSheet.ticker_id == self.ticker.id,
-                    BalanceSheet.date == date_,
-                    BalanceSheet.period_type == period_type
-                )
-            ).first()
-
-            if not existing_record:
-                # Create a new BalanceSheet object
-                new_balance_sheet = BalanceSheet(
-                    ticker_id=self.ticker.id,
-                    date=date_,
-                    period_type=period_type,
-                    treasury_shares_number=row.get('treasury_shares_number', None),
-                    ordinary_shares_number=row.get('ordinary_shares_number', None),
-                    share_issued=row.get('share_issued', None),
-                    net_debt=row.get('net_debt', None),
-                    total_debt=row.get('total_debt', None),
-                    tangible_book_value=row.get('tangible_book_value', None),
-                    invested_capital=row.get('invested_capital', None),
-                    working_capital=row.get('working_capital', None),
-                    net_tangible_assets=row.get('net_tangible_assets', None),
-                    common_stock_equity=row.get('common_stock_equity', None),
-                    total_capitalization=row.get('total_capitalization', None),
-                    total_equity_gross_minority_interest=row.get('total_equity_gross_minority_interest', None),
-                    stockholders_equity=row.get('stockholders_equity', None),
-                    gains_losses_not_affecting_retained_earnings=row.get('gains_losses_not_affecting_retained_earnings', None),
-                    other_equity_adjustments=row.get('other_equity_adjustments', None),
-                    retained_earnings=row.get('retained_earnings', None),
-                    capital_stock=row.get('capital_stock', None),
-                    common_stock=row.get('common_stock', None),
-                    total_liabilities_net_minority_interest=row.get('total_liabilities_net_minority_interest', None),
-                    total_non_current_liabilities_net_minority_interest=row.get('total_non_current_liabilities_net_minority_interest', None),
-                    other_non_current_liabilities=row.get('other_non_current_liabilities', None),
-                    trade_and_other_payables_non_current=row.get('tradeand_other_payables_non_current', None),
-                    long_term_debt_and_capital_lease_obligation=row.get('long_term_debt_and_capital_lease_obligation', None),
-                    long_term_debt=row.get('long_term_debt', None),
-                    current_liabilities=row.get('current_liabilities', None),
-                    other_current_liabilities=row.get('other_current_liabilities', None),
-                    current_deferred_liabilities=row.get('current_deferred_liabilities', None),
-                    current_deferred_revenue=row.get('current_deferred_revenue', None),
-                    current_debt_and_capital_lease_obligation=row.get('current_debt_and_capital_lease_obligation', None),
-                    current_debt=row.get('current_debt', None),
-                    other_current_borrowings=row.get('other_current_borrowings', None),
-                    commercial_paper=row.get('commercial_paper', None),
-                    payables_and_accrued_expenses=row.get('payables_and_accrued_expenses', None),
-                    payables=row.get('payables', None),
-                    accounts_payable=row.get('accounts_payable', None),
-                    total_assets=row.get('total_assets', None),
-                    total_non_current_assets=row.get('total_non_current_assets', None),
-                    other_non_current_assets=row.get('other_non_current_assets', None),
-                    non_current_deferred_assets=row.get('non_current_deferred_assets', None),
-                    non_current_deferred_taxes_assets=row.get('non_current_deferred_taxes_assets', None),
-                    investments_and_advances=row.get('investments_and_advances', None),
-                    other_investments=row.get('other_investments', None),
-                    investment_in_financial_assets=row.get('investmentin_financial_assets', None),
-                    available_for_sale_securities=row.get('available_for_sale_securities', None),
-                    net_ppe=row.get('net_ppe', None),
-                    accumulated_depreciation=row.get('accumulated_depreciation', None),
-                    gross_ppe=row.get('gross_ppe', None),
-                    leases=row.get('leases', None),
-                    machinery_furniture_equipment=row.get('machinery_furniture_equipment', None),
-                    land_and_improvements=row.get('land_and_improvements', None),
-                    properties=row.get('properties', None),
-                    current_assets=row.get('current_assets', None),
-                    other_current_assets=row.get('other_current_assets', None),
-                    inventory=row.get('inventory', None),
-                    receivables=row.get('receivables', None),
-                    other_receivables=row.get('other_receivables', None),
-                    accounts_receivable=row.get('accounts_receivable', None),
-                    cash_cash_equivalents_and_short_term_investments=row.get('cash_cash_equivalents_and_short_term_investments', None),
-                    other_short_term_investments=row.get('other_short_term_investments', None),
-                    cash_and_cash_equivalents=row.get('cash_and_cash_equivalents', None),
-                    cash_equivalents=row.get('cash_equivalents', None),
-                    cash_financial=row.get('cash_financial', None)
-                )
-
-                try:
-                    # Add the object to the session
-                    self.session.add(new_balance_sheet)
-                    # Commit the session to the database
-                    self.commit()
-                    LOGGER.info(f"{self.ticker.symbol} - {'Balance Sheet'.rjust(50)} - inserted balance sheet for date {date_} ({period_type})")
-
-                except Exception as e:
-                    # Rollback the transaction in case of an error
-                    self.session.rollback()
-                    LOGGER.error(f"Error occurred: {e}")
+        # __ insert the periods not stored yet, with one query and one statement __
+        self.handle_statement_bulk_insert(
+            statement=balance_sheet,
+            model_class=BalanceSheet,
+            period_type=period_type,
+            column_map=STATEMENT_COLUMN_MAP.get(BalanceSheet)
+        )
 
     def handle_cash_flow(self, period_type: str) -> None:
         """
@@ -320,11 +334,11 @@ class TickerService(TickerServiceBase):
         # switch period_type:
         match period_type:
             case 'yearly':
-                cash_flow = safe_execute(None, lambda: self.stock.get_cashflow(freq='yearly'))
+                cash_flow = self.fetch('cash_flow_yearly')
             case 'quarterly':
-                cash_flow = safe_execute(None, lambda: self.stock.get_cashflow(freq='quarterly'))
+                cash_flow = self.fetch('cash_flow_quarterly')
             case 'trailing':
-                cash_flow = safe_execute(None, lambda: self.stock.get_cashflow(freq='trailing'))
+                cash_flow = self.fetch('cash_flow_trailing')
             case _:
                 LOGGER.error(f"{self.ticker.symbol} - Invalid period_type: {period_type}. Expected 'annual' or 'quarterly'.")
                 return None
@@ -334,102 +348,13 @@ class TickerService(TickerServiceBase):
             LOGGER.warning(f"{self.ticker.symbol} - {'Cash Flow'.rjust(50)} - no data to insert")
             return None
 
-        # Transpose the DataFrame to have dates as rows
-        cash_flow = cash_flow.T
-
-        # Give "Date" name to index
-        cash_flow.index.name = "Date"
-
-        # Reset the index to include the date as a column
-        cash_flow.reset_index(inplace=True)
-
-        # Normalize column names and handle any renaming needed (matching the SQLAlchemy model attributes)
-        cash_flow.columns = [col.replace(' ', '_').lower() for col in cash_flow.columns]
-
-        for _, row in cash_flow.iterrows():
-            date_ = row['date']
-
-            # Check if a record with the same ticker_id, date, and period_type already exists
-            existing_record = self.session.query(CashFlow).filter(
-                and_(
-                    CashFlow.ticker_id == self.ticker.id,
-                    CashFlow.date == date_,
-                    CashFlow.period_type == period_type
-                )
-            ).first()
-
-            if not existing_record:
-                # Create a new CashFlow object
-                new_cash_flow = CashFlow(
-                    ticker_id=self.ticker.id,
-                    date=date_,
-                    period_type=period_type,
-                    free_cash_flow=row.get('free_cash_flow', None),
-                    repurchase_of_capital_stock=row.get('repurchase_of_capital_stock', None),
-                    repayment_of_debt=row.get('repayment_of_debt', None),
-                    issuance_of_debt=row.get('issuance_of_debt', None),
-                    issuance_of_capital_stock=row.get('issuance_of_capital_stock', None),
-                    capital_expenditure=row.get('capital_expenditure', None),
-                    interest_paid_supplemental_data=row.get('interest_paid_supplemental_data', None),
-                    income_tax_paid_supplemental_data=row.get('income_tax_paid_supplemental_data', None),
-                    end_cash_position=row.get('end_cash_position', None),
-                    beginning_cash_position=row.get('beginning_cash_position', None),
-                    changes_in_cash=row.get('changes_in_cash', None),
-                    financing_cash_flow=row.get('financing_cash_flow', None),
-                    cash_flow_from_continuing_financing_activities=row.get('cash_flow_from_continuing_financing_activities', None),
-                    net_other_financing_charges=row.get('net_other_financing_charges', None),
-                    cash_dividends_paid=row.get('cash_dividends_paid', None),
-                    common_stock_dividend_paid=row.get('common_stock_dividend_paid', None),
-                    net_common_stock_issuance=row.get('net_common_stock_issuance', None),
-                    common_stock_payments=row.get('common_stock_payments', None),
-                    common_stock_issuance=row.get('common_stock_issuance', None),
-                    net_issuance_payments_of_debt=row.get('net_issuance_payments_of_debt', None),
-                    net_short_term_debt_issuance=row.get('net_short_term_debt_issuance', None),
-                    net_long_term_debt_issuance=row.get('net_long_term_debt_issuance', None),
-                    long_term_debt_payments=row.get('long_term_debt_payments', None),
-                    long_term_debt_issuance=row.get('long_term_debt_issuance', None),
-                    investing_cash_flow=row.get('investing_cash_flow', None),
-                    cash_flow_from_continuing_investing_activities=row.get('cash_flow_from_continuing_investing_activities', None),
-                    net_other_investing_changes=row.get('net_other_investing_changes', None),
-                    net_investment_purchase_and_sale=row.get('net_investment_purchase_and_sale', None),
-                    sale_of_investment=row.get('sale_of_investment', None),
-                    purchase_of_investment=row.get('purchase_of_investment', None),
-                    net_business_purchase_and_sale=row.get('net_business_purchase_and_sale', None),
-                    purchase_of_business=row.get('purchase_of_business', None),
-                    net_ppe_purchase_and_sale=row.get('net_ppe_purchase_and_sale', None),
-                    purchase_of_ppe=row.get('purchase_of_ppe', None),
-                    operating_cash_flow=row.get('operating_cash_flow', None),
-                    cash_flow_from_continuing_operating_activities=row.get('cash_flow_from_continuing_operating_activities', None),
-                    change_in_working_capital=row.get('change_in_working_capital', None),
-                    change_in_other_working_capital=row.get('change_in_other_working_capital', None),
-                    change_in_other_current_liabilities=row.get('change_in_other_current_liabilities', None),
-                    change_in_other_current_assets=row.get('change_in_other_current_assets', None),
-                    change_in_payables_and_accrued_expense=row.get('change_in_payables_and_accrued_expense', None),
-                    change_in_payable=row.get('change_in_payable', None),
-                    change_in_account_payable=row.get('change_in_account_payable', None),
-                    change_in_inventory=row.get('change_in_inventory', None),
-                    change_in_receivables=row.get('change_in_receivables', None),
-                    changes_in_account_receivables=row.get('changes_in_account_receivables', None),
-                    other_non_cash_items=row.get('other_non_cash_items', None),
-                    stock_based_compensation=row.get('stock_based_compensation', None),
-                    deferred_tax=row.get('deferred_tax', None),
-                    deferred_income_tax=row.get('deferred_income_tax', None),
-                    depreciation_amortization_depletion=row.get('depreciation_amortization_depletion', None),
-                    depreciation_and_amortization=row.get('depreciation_and_amortization', None),
-                    net_income_from_continuing_operations=row.get('net_income_from_continuing_operations', None)
-                )
-
-                try:
-                    # Add the object to the session
-                    self.session.add(new_cash_flow)
-                    # Commit the session to the database
-                    self.commit()
-                    LOGGER.info(f"{self.ticker.symbol} - {'Cash Flow'.rjust(50)} - inserted cash flow for date {date_} ({period_type})")
-
-                except Exception as e:
-                    # Rollback the transaction in case of an error
-                    self.session.rollback()
-                    LOGGER.error(f"Error occurred: {e}")
+        # __ insert the periods not stored yet, with one query and one statement __
+        self.handle_statement_bulk_insert(
+            statement=cash_flow,
+            model_class=CashFlow,
+            period_type=period_type,
+            column_map=STATEMENT_COLUMN_MAP.get(CashFlow)
+        )
 
     def handle_financials(self, period_type: str) -> None:
         """
@@ -442,11 +367,11 @@ class TickerService(TickerServiceBase):
         #switch period_type:
         match period_type:
             case 'yearly':
-                financials = safe_execute(None, lambda: self.stock.get_income_stmt(freq='yearly'))
+                financials = self.fetch('financials_yearly')
             case 'quarterly':
-                financials = safe_execute(None, lambda: self.stock.get_income_stmt(freq='quarterly'))
+                financials = self.fetch('financials_quarterly')
             case 'trailing':
-                financials = safe_execute(None, lambda: self.stock.get_income_stmt(freq='trailing'))
+                financials = self.fetch('financials_trailing')
             case _:
                 LOGGER.error(f"{self.ticker.symbol} - Invalid period_type: {period_type}. Expected 'annual' or 'quarterly'.")
                 return None
@@ -456,88 +381,13 @@ class TickerService(TickerServiceBase):
             LOGGER.warning(f"{self.ticker.symbol} - {'Financials'.rjust(50)} - no data to insert")
             return None
 
-        # Transpose the DataFrame to have dates as rows
-        financials = financials.T
-
-        # Give "Date" name to index
-        financials.index.name = "Date"
-
-        # Reset the index to include the date as a column
-        financials.reset_index(inplace=True)
-
-        # Normalize column names and handle any renaming needed (matching the SQLAlchemy model attributes)
-        financials.columns = [col.replace(' ', '_').lower() for col in financials.columns]
-
-        for _, row in financials.iterrows():
-            date_ = row['date']
-
-            # Check if a record with the same ticker_id, date, and period_type already exists
-            existing_record = self.session.query(Financials).filter(
-                and_(
-                    Financials.ticker_id == self.ticker.id,
-                    Financials.date == date_,
-                    Financials.period_type == period_type
-                )
-            ).first()
-
-            if not existing_record:
-                # Create a new Financials object
-                new_financial = Financials(
-                    ticker_id=self.ticker.id,
-                    date=date_,
-                    period_type=period_type,
-                    tax_effect_of_unusual_items=row.get('tax_effect_of_unusual_items', None),
-                    tax_rate_for_calcs=row.get('tax_rate_for_calcs', None),
-                    normalized_ebitda=row.get('normalized_ebitda', None),
-                    net_income_from_continuing_operation_net_minority_interest=row.get('net_income_from_continuing_operation_net_minority_interest', None),
-                    reconciled_depreciation=row.get('reconciled_depreciation', None),
-                    reconciled_cost_of_revenue=row.get('reconciled_cost_of_revenue', None),
-                    ebitda=row.get('ebitda', None),
-                    ebit=row.get('ebit', None),
-                    net_interest_income=row.get('net_interest_income', None),
-                    interest_expense=row.get('interest_expense', None),
-                    interest_income=row.get('interest_income', None),
-                    normalized_income=row.get('normalized_income', None),
-                    net_income_from_continuing_and_discontinued_operation=row.get('net_income_from_continuing_and_discontinued_operation', None),
-                    total_expenses=row.get('total_expenses', None),
-                    total_operating_income_as_reported=row.get('total_operating_income_as_reported', None),
-                    diluted_average_shares=row.get('diluted_average_shares', None),
-                    basic_average_shares=row.get('basic_average_shares', None),
-                    diluted_eps=row.get('diluted_eps', None),
-                    basic_eps=row.get('basic_eps', None),
-                    diluted_net_income_available_to_common_stockholders=row.get('diluted_ni_availto_com_stockholders', None),
-                    net_income_common_stockholders=row.get('net_income_common_stockholders', None),
-                    net_income=row.get('net_income', None),
-                    net_income_including_non_controlling_interests=row.get('net_income_including_noncontrolling_interests', None),
-                    net_income_continuous_operations=row.get('net_income_continuous_operations', None),
-                    tax_provision=row.get('tax_provision', None),
-                    pretax_income=row.get('pretax_income', None),
-                    other_income_expense=row.get('other_income_expense', None),
-                    other_non_operating_income_expenses=row.get('other_non_operating_income_expenses', None),
-                    net_non_operating_interest_income_expense=row.get('net_non_operating_interest_income_expense', None),
-                    interest_expense_non_operating=row.get('interest_expense_non_operating', None),
-                    interest_income_non_operating=row.get('interest_income_non_operating', None),
-                    operating_income=row.get('operating_income', None),
-                    operating_expense=row.get('operating_expense', None),
-                    research_and_development=row.get('research_and_development', None),
-                    selling_general_and_administration=row.get('selling_general_and_administration', None),
-                    gross_profit=row.get('gross_profit', None),
-                    cost_of_revenue=row.get('cost_of_revenue', None),
-                    total_revenue=row.get('total_revenue', None),
-                    operating_revenue=row.get('operating_revenue', None)
-                )
-
-                try:
-                    # Add the object to the session
-                    self.session.add(new_financial)
-                    # Commit the session to the database
-                    self.commit()
-                    LOGGER.info(f"{self.ticker.symbol} - {'Financials'.rjust(50)} - inserted financials for date {date_} ({period_type})")
-
-                except Exception as e:
-                    # Rollback the transaction in case of an error
-                    self.session.rollback()
-                    LOGGER.error(f"Error occurred: {e}")
+        # __ insert the periods not stored yet, with one query and one statement __
+        self.handle_statement_bulk_insert(
+            statement=financials,
+            model_class=Financials,
+            period_type=period_type,
+            column_map=STATEMENT_COLUMN_MAP.get(Financials)
+        )
 
     def handle_actions(self) -> None:
         """
@@ -546,7 +396,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        actions = safe_execute(None, lambda: getattr(self.stock, "actions"))
+        actions = self.fetch('actions')
 
         # __ if actions is empty, return __
         if actions is None or (isinstance(actions, pd.DataFrame) and actions.empty):
@@ -576,7 +426,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        calendar = safe_execute(None, lambda: getattr(self.stock, "calendar"))
+        calendar = self.fetch('calendar')
 
         # __ if calendar is empty, return __
         if not calendar or not any(calendar.values()):
@@ -606,7 +456,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        earnings_dates = safe_execute(None, lambda: self.stock.get_earnings_dates(limit=1000))
+        earnings_dates = self.fetch('earnings_dates')
 
         # __ if earnings_dates is empty, return __
         if earnings_dates is None or (isinstance(earnings_dates, pd.DataFrame) and earnings_dates.empty):
@@ -658,7 +508,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the earnings history data.
         """
 
-        earnings_history = safe_execute(None, lambda: self.stock.get_earnings_history())
+        earnings_history = self.fetch('earnings_history')
 
         # __ if earnings_dates is empty, return __
         if earnings_history is None or (isinstance(earnings_history, pd.DataFrame) and earnings_history.empty):
@@ -695,7 +545,7 @@ class TickerService(TickerServiceBase):
         """
 
         # 1) Fetch splits (prefer the method; fall back to property)
-        splits_obj = safe_execute(None, lambda: self.stock.get_splits())
+        splits_obj = self.fetch('splits')
         if splits_obj is None:
             splits_obj = safe_execute(None, lambda: self.stock.splits)
 
@@ -835,7 +685,7 @@ class TickerService(TickerServiceBase):
             return pd.DataFrame(out, columns=["date", "shares"])
 
         # 1) Fetch from yfinance (prefer the method; fallback to property if needed)
-        shares_obj = safe_execute(None, lambda: self.stock.get_shares_full())
+        shares_obj = self.fetch('shares_full')
         if shares_obj is None:
             # Some yfinance versions expose .get_shares_full only; no standard property fallback
             pass
@@ -1141,8 +991,8 @@ class TickerService(TickerServiceBase):
         :param info_data: Dictionary containing the general stock information from stock.info.
         """
 
-        isin = safe_execute(None, lambda: getattr(self.stock, "isin"))
-        history_metadata = safe_execute(None, lambda: getattr(self.stock, "history_metadata"))
+        isin = self.fetch('isin')
+        history_metadata = self.fetch('history_metadata')
 
         # __ if info_data is empty, return __
         if not self.info or not history_metadata or not isin:
@@ -1189,8 +1039,8 @@ class TickerService(TickerServiceBase):
         Handle the insertion or update of trading session information into the database.
         """
 
-        basic_info = safe_execute(None, lambda: getattr(self.stock, "fast_info"))
-        history_metadata = safe_execute(None, lambda: getattr(self.stock, "history_metadata"))
+        basic_info = self.fetch('fast_info')
+        history_metadata = self.fetch('history_metadata')
 
         # __ if info is empty, return __
         if not self.info or not history_metadata: # TODO: log based on basic_info
@@ -1282,7 +1132,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        insider_purchases = safe_execute(None, lambda: getattr(self.stock, "insider_purchases"))
+        insider_purchases = self.fetch('insider_purchases')
 
         # __ if insider_purchases is empty, return __
         if insider_purchases is None or (isinstance(insider_purchases, pd.DataFrame) and insider_purchases.empty):
@@ -1360,7 +1210,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        insider_roster_holders = safe_execute(None, lambda: getattr(self.stock, "insider_roster_holders"))
+        insider_roster_holders = self.fetch('insider_roster_holders')
 
         # __ if insider roster holders is empty, return __
         if insider_roster_holders is None or (isinstance(insider_roster_holders, pd.DataFrame) and insider_roster_holders.empty):
@@ -1400,7 +1250,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        insider_transactions = safe_execute(None, lambda: self.stock.get_insider_transactions())
+        insider_transactions = self.fetch('insider_transactions')
 
         # __ if insider transactions is empty, return __
         if insider_transactions is None or (isinstance(insider_transactions, pd.DataFrame) and insider_transactions.empty):
@@ -1434,7 +1284,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        institutional_holders = safe_execute(None, lambda: getattr(self.stock, "institutional_holders"))
+        institutional_holders = self.fetch('institutional_holders')
 
         # __ if institutional holders is empty, return __
         if institutional_holders is None or (isinstance(institutional_holders, pd.DataFrame) and institutional_holders.empty):
@@ -1470,7 +1320,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        major_holders = safe_execute(None, lambda: getattr(self.stock, "major_holders"))
+        major_holders = self.fetch('major_holders')
 
         # __ if major_holders is empty, return __
         if major_holders is None or (isinstance(major_holders, pd.DataFrame) and major_holders.empty):
@@ -1513,7 +1363,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        mutual_fund_holders = safe_execute(None, lambda: getattr(self.stock, "mutualfund_holders"))
+        mutual_fund_holders = self.fetch('mutualfund_holders')
 
         # __ if mutual_fund_holders is empty, return __
         if mutual_fund_holders is None or (isinstance(mutual_fund_holders, pd.DataFrame) and mutual_fund_holders.empty):
@@ -1560,7 +1410,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        mutual_fund_holders = safe_execute(None, lambda: getattr(self.stock, "mutualfund_holders"))
+        mutual_fund_holders = self.fetch('mutualfund_holders')
 
         # __ if mutual_fund_holders is empty, return __
         if mutual_fund_holders is None or (isinstance(mutual_fund_holders, pd.DataFrame) and mutual_fund_holders.empty):
@@ -1596,7 +1446,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        recommendations = safe_execute(None, lambda: getattr(self.stock, "recommendations"))
+        recommendations = self.fetch('recommendations')
 
         # __ if recommendations is empty, return __
         if recommendations is None or (isinstance(recommendations, pd.DataFrame) and recommendations.empty):
@@ -1706,7 +1556,7 @@ class TickerService(TickerServiceBase):
         :param stock: yf.Ticker object containing the insider purchases data.
         """
 
-        upgrades_downgrades = safe_execute(None, lambda: getattr(self.stock, "upgrades_downgrades"))
+        upgrades_downgrades = self.fetch('upgrades_downgrades')
 
         # __ if upgrades_downgrades is empty, return __
         if upgrades_downgrades is None or (isinstance(upgrades_downgrades, pd.DataFrame) and upgrades_downgrades.empty):
@@ -8,8 +8,14 @@ from decimal import Decimal
 from sqlalchemy.orm import session as sess
 from sqlalchemy.sql import literal
 from sqlalchemy.inspection import inspect
+from sqlalchemy import text, select, DateTime, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pandas.core.dtypes.cast import maybe_box_native
 
 from src.stock.src.db.models import Base, Ticker
+from src.stock.src.db.pg_copy import copy_dataframe, create_staging_table, drop_staging_table, get_integer_columns
+from src.stock.src.db.latest_rows import LATEST_TABLES, upsert_latest_row, refresh_latest_rows
+from src.stock.src.PipelineStats import PIPELINE_STATS
 
 from logger_setup import LOGGER
 
@@ -19,17 +25,76 @@ class TickerServiceBase:
     :param session: SQLAlchemy session for database operations.
     :param symbol: The symbol of the ticker to handle.
     :param ticker: The Ticker object for the symbol.
+    :param set_based_bulk_update: Whether handle_generic_bulk_update stages the new data with COPY and inserts
+        the changed rows with a single INSERT ... SELECT, instead of diffing in Python.
+    :param unit_of_work: Whether all the writes of the ticker happen in one transaction: commit() only flushes,
+        every section runs in a savepoint (begin_section / end_section) and commit_unit_of_work() commits once.
     """
     session: sess.Session
     symbol: str
     ticker: Ticker = field(default=None, init=False)
     commit_enable: bool = True
+    set_based_bulk_update: bool = False
+    unit_of_work: bool = False
 
     def commit(self):
         if self.commit_enable:
+            if self.unit_of_work:
+                # __ send the writes, the transaction of the ticker is committed by commit_unit_of_work __
+                self.session.flush()
+                return
             LOGGER.debug(f"{self.symbol} - {'Commit'.rjust(50)} - COMMITTED successfully.")
             self.session.commit()
 
+    def rollback(self):
+        """
+        Roll back the failed writes: the current section only in unit of work mode (the savepoint is opened again
+        for the rest of the section), the whole transaction otherwise.
+        """
+        savepoint = self.session.info.get('section_savepoint')
+        if self.unit_of_work and savepoint is not None:
+            if savepoint.is_active:
+                savepoint.rollback()
+            self.session.info['section_savepoint'] = self.session.begin_nested()
+        else:
+            self.session.rollback()
+
+    def commit_ddl(self) -> None:
+        """
+        Commit DDL right away, also in unit of work mode: its ACCESS EXCLUSIVE lock must not be held until the ticker
+        commits, and a section rollback must not undo it. In unit of work mode the writes of the ticker so far are
+        committed with it and the savepoint of the section is opened again.
+        """
+        LOGGER.debug(f"{self.symbol} - {'Commit'.rjust(50)} - COMMITTED DDL.")
+        self.session.commit()
+        if self.unit_of_work and 'section_savepoint' in self.session.info:
+            self.session.info['section_savepoint'] = self.session.begin_nested()
+
+    def begin_section(self) -> None:
+        """ Open the savepoint of a section in unit of work mode (shared by the services of the same session). """
+        if self.unit_of_work:
+            self.session.info['section_savepoint'] = self.session.begin_nested()
+
+    def end_section(self, failed: bool = False) -> None:
+        """
+        Release the savepoint of the section, or roll it back if the section failed (the other sections are kept).
+
+        :param failed: Whether the section raised an error.
+        """
+        savepoint = self.session.info.pop('section_savepoint', None)
+        if savepoint is None or not savepoint.is_active:
+            return
+        if failed:
+            savepoint.rollback()
+        else:
+            savepoint.commit()
+
+    def commit_unit_of_work(self) -> None:
+        """ Commit the transaction of the ticker in unit of work mode (no-op otherwise, every handler committed). """
+        if self.unit_of_work and self.commit_enable:
+            LOGGER.debug(f"{self.symbol} - {'Commit'.rjust(50)} - COMMITTED unit of work.")
+            self.session.commit()
+
     def initialize_ticker(self, ticker: Ticker) -> None:
         """
         Initialize the Ticker object for the symbol.
@@ -66,7 +131,8 @@ class TickerServiceBase:
             filters = self.prepare_filters(model_class, additional_filters)
 
             # Retrieve the most recent record that matches the filters
-            last_record = self.fetch_last_record(model_class, filters)
+            with PIPELINE_STATS.timer('db'):
+                last_record = self.fetch_last_record(model_class, filters)
 
             # Compare the new data with the last record and log any changes
             changes_log = self.compare_and_log_changes(last_record, new_record_data, model_class_name)
@@ -77,18 +143,25 @@ class TickerServiceBase:
                 # Create and add a new record if there are changes or no previous record exists
                 self.create_new_record(new_record_data, model_class, current_timestamp)
 
+                # Keep the latest row of the ticker in step, in the same transaction
+                upsert_latest_row(self.session, model_class, new_record_data)
+
                 # Commit changes to the session and print the changes log
-                self.commit_changes(last_record, model_class_name, changes_log)
+                with PIPELINE_STATS.timer('db'):
+                    self.commit_changes(last_record, model_class_name, changes_log)
+                PIPELINE_STATS.rows(inserted=1)
 
                 return True
 
+            PIPELINE_STATS.rows(unchanged=1)
+
             # Log that no changes were detected if specified
             # self.log_no_changes(model_class_name, print_no_changes)
             return False
 
         except Exception as e:
             # Rollback the transaction in case of an error
-            self.session.rollback()
+            self.rollback()
             LOGGER.error(f"Error occurred: {e}")
             return False
 
@@ -219,46 +292,201 @@ class TickerServiceBase:
         :param comparison_columns: List of columns to compare for detecting changes.
         """
         try:
-            # __ prepare model class name for logging __
-            model_class_name = self.format_model_class_name(model_class=model_class)
-
-            # __ get comparison columns and non-nullable columns __
-            comparison_columns = self.get_comparison_columns(model_class=model_class)
-            non_nullable_columns = self.get_non_nullable_columns(model_class=model_class)
-
-            # __ prepare new data __
-            new_data_df = self.prepare_new_data(new_data_df=new_data_df, comparison_columns=comparison_columns, non_nullable_columns=non_nullable_columns)
+            with PIPELINE_STATS.timer('transform'):
+                # __ prepare model class name for logging __
+                model_class_name = self.format_model_class_name(model_class=model_class)
+
+                # __ get comparison columns and non-nullable columns __
+                comparison_columns = self.get_comparison_columns(model_class=model_class)
+                non_nullable_columns = self.get_non_nullable_columns(model_class=model_class)
+
+                # __ prepare new data __
+                new_data_df = self.prepare_new_data(new_data_df=new_data_df, comparison_columns=comparison_columns, non_nullable_columns=non_nullable_columns)
+
+                # __ get columns of table from model __
+                columns = [c.name for c in inspect(model_class).columns]
+                if any(col not in columns for col in new_data_df.columns):
+                    additional_columns = [col for col in new_data_df.columns if col not in columns]
+                    LOGGER.warning(f"{self.symbol} - {model_class_name} - Found additional columns in the new data: {additional_columns}")
+                    # __ remove additional columns from new data __
+                    new_data_df = new_data_df.drop(columns=additional_columns)
+
+            # __ set-based path: let Postgres diff the staged data against the latest rows __
+            if self.set_based_bulk_update and comparison_columns:
+                with PIPELINE_STATS.timer('db'):
+                    inserted = self.set_based_bulk_insert(new_data_df=new_data_df, model_class=model_class, comparison_columns=comparison_columns)
+                    if inserted > 0:
+                        self.update_latest_rows(model_class)
+                    self.commit()
+                PIPELINE_STATS.rows(inserted=inserted, unchanged=max(len(new_data_df) - inserted, 0))
+                if inserted > 0:
+                    LOGGER.info(f"{self.ticker.symbol} - {model_class_name} - {inserted} records inserted.")
+                return
 
             # __ read existing data from the database __
-            existing_data_dict = self.read_existing_data(model_class, comparison_columns)
-
-            # __ normalize comparison keys __
-            normalize_value = self.get_normalize_value_function()
-
-            # __ get columns of table from model __
-            columns = [c.name for c in inspect(model_class).columns]
-            if any(col not in columns for col in new_data_df.columns):
-                additional_columns = [col for col in new_data_df.columns if col not in columns]
-                LOGGER.warning(f"{self.symbol} - {model_class_name} - Found additional columns in the new data: {additional_columns}")
-                # __ remove additional columns from new data __
-                new_data_df = new_data_df.drop(columns=additional_columns)
-
-            # __ prepare the list for records to insert __
-            records_to_insert = self.compare_and_prepare_inserts(
-                new_data_df,
-                existing_data_dict,
-                model_class,
-                comparison_columns,
-                normalize_value
-            )
+            with PIPELINE_STATS.timer('db'):
+                existing_data_dict = self.read_existing_data(model_class, comparison_columns)
+
+            with PIPELINE_STATS.timer('transform'):
+                # __ normalize comparison keys __
+                normalize_value = self.get_normalize_value_function()
+
+                # __ prepare the list for records to insert __
+                records_to_insert = self.compare_and_prepare_inserts(
+                    new_data_df,
+                    existing_data_dict,
+                    model_class,
+                    comparison_columns,
+                    normalize_value
+                )
 
             # __ perform the bulk insert __
-            self.bulk_insert_records(records_to_insert=records_to_insert, model_class_name=model_class_name)
+            with PIPELINE_STATS.timer('db'):
+                self.bulk_insert_records(records_to_insert=records_to_insert, model_class_name=model_class_name)
+            PIPELINE_STATS.rows(inserted=len(records_to_insert), unchanged=max(len(new_data_df) - len(records_to_insert), 0))
 
         except Exception as e:
-            self.session.rollback()
+            self.rollback()
             LOGGER.error(f"Error occurred during bulk update: {e}")
 
+    def set_based_bulk_insert(self, new_data_df: pd.DataFrame, model_class: Type[Base], comparison_columns: list[str]) -> int:
+        """
+        Insert the new or changed records with one statement, letting Postgres do the comparison.
+
+        The prepared DataFrame is streamed with COPY into a temporary table shaped like the target one, then a single
+        INSERT ... SELECT keeps only the staged rows for which the latest stored version (by last_update) with the same
+        comparison columns is missing or differs, with the rules of the Python path (read_existing_data and
+        compare_and_log_changes): timestamps are compared as dates, empty strings as NULL in the keys, a missing
+        value (None) is not a change but a NaN in a float column is, unless the stored value is NULL as well.
+
+        :param new_data_df: Prepared DataFrame containing the new data.
+        :param model_class: The SQLAlchemy model class to interact with.
+        :param comparison_columns: List of columns to compare for detecting changes.
+        :return: Number of records inserted.
+        """
+        quote = self.session.get_bind().dialect.identifier_preparer.quote
+        table_name = model_class.__tablename__
+        staging_table = f"tmp_{table_name}"
+        columns = list(new_data_df.columns)
+        value_columns = [col for col in columns if col not in comparison_columns + ["ticker_id", "last_update"]]
+        column_types = {column.name: column.type for column in model_class.__table__.columns}
+
+        # __ stage the new data __
+        create_staging_table(session=self.session, model_class=model_class, staging_table=staging_table, columns=columns)
+        copy_dataframe(session=self.session, df=new_data_df, table_name=staging_table, columns=columns, integer_columns=get_integer_columns(model_class))
+
+        def compared(alias: str, col: str, is_key: bool) -> str:
+            # __ normalize_value / compare_and_log_changes: datetimes reduced to dates, '' as None in the keys __
+            expression = f'{alias}.{quote(col)}'
+            if isinstance(column_types.get(col), DateTime):
+                return f'CAST({expression} AS date)'
+            if is_key and isinstance(column_types.get(col), String):
+                return f"NULLIF({expression}, '')"
+            return expression
+
+        def unchanged(col: str, is_key: bool = False) -> str:
+            condition = f'{compared("t", col, is_key)} IS NOT DISTINCT FROM {compared("s", col, is_key)}'
+            # __ a None is never a change, a NaN (float column, staged as NULL) is one unless the stored value is NULL __
+            if is_key or pd.api.types.is_float_dtype(new_data_df[col]):
+                return condition
+            return f's.{quote(col)} IS NULL OR {condition}'
+
+        key_list = ', '.join(compared('h', col, is_key=True) for col in comparison_columns)
+        column_list = ', '.join(quote(col) for col in columns)
+        select_list = ', '.join(f's.{quote(col)}' for col in columns)
+        unchanged_conditions = [unchanged(col, is_key=True) for col in comparison_columns]
+        unchanged_conditions += [f'({unchanged(col)})' for col in value_columns]
+
+        query = f"""
+            WITH latest AS (
+                SELECT DISTINCT ON ({key_list}) *
+                FROM {quote(table_name)} h
+                WHERE ticker_id = :ticker_id
+                ORDER BY {key_list}, last_update DESC NULLS LAST
+            )
+            INSERT INTO {quote(table_name)} ({column_list})
+            SELECT {select_list}
+            FROM {quote(staging_table)} s
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM latest t
+                WHERE {' AND '.join(unchanged_conditions)}
+            )
+        """
+        result = self.session.execute(text(query), {"ticker_id": self.ticker.id})
+
+        drop_staging_table(session=self.session, staging_table=staging_table)
+        return result.rowcount
+
+    """ Column-mapped bulk insert handler for the periodic statements (balance sheet, cash flow, financials). """
+    def handle_statement_bulk_insert(
+            self,
+            statement: pd.DataFrame,
+            model_class: Type[Base],
+            period_type: str,
+            column_map: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Insert the periods of a yfinance statement (one column per date) not stored yet for the ticker.
+
+        The statement is transposed to one row per date and its row labels are normalized (e.g. 'Net Debt' ->
+        'net_debt') and mapped to the model columns: by name, or through column_map for the labels that differ.
+        The stored dates are read with one query and the new periods are inserted with one statement and one commit.
+
+        :param statement: DataFrame of the statement as returned by yfinance (row labels x dates).
+        :param model_class: The SQLAlchemy model class, keyed by ticker_id, date and period_type.
+        :param period_type: The period type of the statement (e.g. 'yearly', 'quarterly', 'trailing').
+        :param column_map: Dictionary {model column: normalized label} for the labels named differently.
+        :return: Number of periods inserted.
+        """
+        model_class_name = self.format_model_class_name(model_class=model_class)
+
+        with PIPELINE_STATS.timer('transform'):
+            # __ one row per date, labels normalized as the model columns __
+            df = statement.T
+            df.index.name = "Date"
+            df = df.reset_index()
+            df.columns = [col.replace(' ', '_').lower() for col in df.columns]
+            df = df.rename(columns={label: column for column, label in (column_map or {}).items()})
+
+            # __ keep the model columns only (the missing ones are stored as NULL) __
+            model_columns = [c.name for c in inspect(model_class).columns if c.name not in ("ticker_id", "period_type")]
+            df = df.loc[:, ~df.columns.duplicated()]
+            df = df[[col for col in model_columns if col in df.columns]].copy()
+            df['date'] = pd.to_datetime(df['date']).dt.date
+
+        # __ dates already stored for the ticker and period type, in one query __
+        with PIPELINE_STATS.timer('db'):
+            existing_dates = set(self.session.execute(
+                select(model_class.date).where(
+                    model_class.ticker_id == self.ticker.id,
+                    model_class.period_type == period_type,
+                    model_class.date.in_(df['date'].tolist())
+                )
+            ).scalars())
+
+        new_df = df[~df['date'].isin(existing_dates)].drop_duplicates(subset='date')
+        PIPELINE_STATS.rows(inserted=len(new_df), unchanged=len(df) - len(new_df))
+        if new_df.empty:
+            return 0
+
+        records = [{**{key: maybe_box_native(value) for key, value in record.items()}, 'ticker_id': self.ticker.id, 'period_type': period_type}
+                   for record in new_df.to_dict(orient='records')]
+
+        try:
+            with PIPELINE_STATS.timer('db'):
+                # __ one statement for all the new periods, a concurrent insert of the same period is skipped __
+                self.session.execute(pg_insert(model_class).values(records).on_conflict_do_nothing())
+                self.commit()
+        except Exception as e:
+            self.rollback()
+            LOGGER.error(f"{self.ticker.symbol} - {model_class_name} - Error occurred: {e}")
+            return 0
+
+        dates = ', '.join(str(date_) for date_ in sorted(new_df['date']))
+        LOGGER.info(f"{self.ticker.symbol} - {model_class_name} - inserted {len(records)} periods ({period_type}): {dates}")
+        return len(records)
+
     @staticmethod
     def get_primary_keys_columns(model_class: Type[Base]) -> List[str]:
         """
@@ -380,17 +608,17 @@ class TickerServiceBase:
         """
         records_to_insert = []
 
-        for _, row in new_data_df.iterrows():
-            record_key = tuple(normalize_value(row[col]) for col in comparison_columns)
-            new_record_data = row.to_dict()
+        # __ index the existing keys by canonical key for single hash probes __
+        canonical_key = self.get_canonical_key_function()
+        existing_key_index = self.build_existing_key_index(existing_data_dict, canonical_key)
+
+        for new_record_data in self.iter_records(new_data_df):
+            record_key = tuple(normalize_value(new_record_data[col]) for col in comparison_columns)
 
             insert_new_record = True
 
-            # Use keys_equal function to find a matching key in the existing data dictionary
-            matching_key = next(
-                (existing_key for existing_key in existing_data_dict.keys() if self.keys_equal(record_key, existing_key)),
-                None
-            )
+            # Find a matching key in the existing data dictionary (hash probe, keys_equal as a fallback)
+            matching_key = self.find_matching_key(record_key, existing_data_dict, existing_key_index, canonical_key)
 
             if matching_key:
                 existing_record = existing_data_dict[matching_key]
@@ -408,6 +636,102 @@ class TickerServiceBase:
 
         return records_to_insert
 
+    @staticmethod
+    def iter_records(df: pd.DataFrame):
+        """
+        Iterate over the rows of a DataFrame as dictionaries, without building a Series per row.
+
+        The values are the same as the ones of row.to_dict() in df.iterrows(): the rows are taken from
+        the interleaved df.values array and numpy scalars are boxed to native Python types.
+
+        :param df: DataFrame to iterate.
+        :return: Generator of dictionaries {column: value}.
+        """
+        values = df.values
+        if values.dtype.kind not in "biufO":
+            # __ keep the iterrows semantics for uncommon dtypes (e.g. all datetime columns) __
+            for _, row in df.iterrows():
+                yield row.to_dict()
+            return
+
+        columns = list(df.columns)
+        if values.dtype.kind == "O":
+            for row in values:
+                yield dict(zip(columns, map(maybe_box_native, row)))
+        else:
+            for row in values.tolist():
+                yield dict(zip(columns, row))
+
+    @staticmethod
+    def get_canonical_key_function() -> callable:
+        """
+        Get a function to turn a normalized comparison key into a hashable canonical key.
+
+        NaN/NaT/None are unified to None, datetimes are reduced to dates and floats are rounded,
+        so that keys considered equal by keys_equal fall (almost always) in the same hash bucket.
+
+        :return: Function to canonicalize a key tuple.
+        """
+        def canonical_value(value):
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                return None
+            if isinstance(value, datetime):
+                return value.date()
+            if isinstance(value, float):
+                return round(value, 12)
+            return value
+
+        def canonical_key(key: tuple) -> tuple:
+            return tuple(canonical_value(value) for value in key)
+
+        return canonical_key
+
+    @staticmethod
+    def build_existing_key_index(existing_data_dict: dict, canonical_key: callable) -> dict:
+        """
+        Build the hash index of the existing keys.
+
+        :param existing_data_dict: Dictionary of existing data keyed by normalized comparison columns.
+        :param canonical_key: Function to canonicalize a key tuple.
+        :return: Dictionary {canonical key: [existing keys]} preserving the order of existing_data_dict.
+        """
+        existing_key_index = {}
+        for existing_key in existing_data_dict.keys():
+            try:
+                existing_key_index.setdefault(canonical_key(existing_key), []).append(existing_key)
+            except TypeError:
+                # __ unhashable values are only reachable through the linear fallback __
+                continue
+        return existing_key_index
+
+    def find_matching_key(self, record_key: tuple, existing_data_dict: dict, existing_key_index: dict, canonical_key: callable):
+        """
+        Find the existing key matching the record key.
+
+        The canonical key is probed first; the linear scan with keys_equal is only used when the probe misses
+        and the key contains floats (tolerance across rounding boundaries) or unhashable values.
+
+        :param record_key: Normalized key of the new record.
+        :param existing_data_dict: Dictionary of existing data keyed by normalized comparison columns.
+        :param existing_key_index: Hash index built by build_existing_key_index.
+        :param canonical_key: Function to canonicalize a key tuple.
+        :return: The matching existing key, or None.
+        """
+        try:
+            candidates = existing_key_index.get(canonical_key(record_key), [])
+        except TypeError:
+            candidates = None
+
+        if candidates is not None:
+            matching_key = next((existing_key for existing_key in candidates if self.keys_equal(record_key, existing_key)), None)
+            if matching_key is not None or not any(isinstance(value, float) for value in record_key):
+                return matching_key
+
+        return next(
+            (existing_key for existing_key in existing_data_dict.keys() if self.keys_equal(record_key, existing_key)),
+            None
+        )
+
     @staticmethod
     def keys_equal(key1, key2) -> bool:
         """
@@ -436,11 +760,22 @@ class TickerServiceBase:
         """
         if records_to_insert:
             self.session.bulk_save_objects(records_to_insert)
+            self.update_latest_rows(type(records_to_insert[0]))
             self.commit()
             LOGGER.info(f"{self.ticker.symbol} - {model_class_name} - {len(records_to_insert)} records inserted.")
         # else:
         #     print(f"{self.ticker.symbol} - {model_class_name} - no changes detected")
 
+    def update_latest_rows(self, model_class: Type[Base]) -> None:
+        """
+        Rebuild the latest row of the ticker from the history table just written, if the dataset has a
+        latest-state table (see db/latest_rows.py). Called before the commit, so both are written together.
+
+        :param model_class: The SQLAlchemy model class of the history table.
+        """
+        if model_class in LATEST_TABLES:
+            refresh_latest_rows(self.session, model_class, ticker_ids=[self.ticker.id])
+
     def bulk_insert(self, data: pd.DataFrame, model_class: Type[Base]) -> None:
         """
         Bulk insert the given data into the database.
@@ -2,6 +2,7 @@ import yfinance as yf
 import numpy as np
 import pandas as pd
 import re
+from concurrent.futures import ThreadPoolExecutor
 from time import time, sleep
 from typing import Optional
 from datetime import datetime, timedelta
@@ -13,15 +14,16 @@ from sqlalchemy import text
 from sqlalchemy.util import symbol
 
 from src.common.tools.library import seconds_to_time, safe_execute
-from src.stock.src.TickerService import TickerService
+from src.stock.src.TickerService import TickerService, db_last_runs
 from src.stock.src.db.database import session_local
 from src.stock.src.CandleService import CandleDataInterval, CandleDataDay
 from src.stock.src.Queries import Queries
 from src.stock.src.CandleBulkService import CandleBulkService
+from src.stock.src.RateLimiter import RateLimiter, AdaptiveRateLimiter, is_throttling_error
+from src.stock.src.PipelineStats import PIPELINE_STATS
 
-from logger_setup import LOGGER, error_handler
+from logger_setup import LOGGER, yf_error_collector
 import logging
-from src.stock.src.RaiseOnErrorHandler import RaiseOnErrorHandler
 from enum import Enum
 
 UPDATE_BALANCE_SHEET_ANNUAL = True
@@ -62,6 +64,10 @@ UPDATE_STOCK_SPLITS = True
 UPDATE_SHARES_FULL = True
 
 DISABLE_YF_CHECK = False
+SET_BASED_BULK_UPDATE = False
+PREFETCH_SECTIONS = True    # fetch the yfinance data of all the sections of a ticker concurrently before writing them
+PREFETCH_WORKERS = 8        # threads fetching the sections of a ticker
+UNIT_OF_WORK = False        # one transaction per ticker (a savepoint per section) committed at the end of update_ticker
 
 
 class TickerUpdaterStatus(Enum):
@@ -167,6 +173,50 @@ TTL = {
     TickerUpdaterStatus.SECTOR_INDUSTRY_HISTORY: timedelta(days=90),
 }
 
+# __ yfinance requests (TickerService.get_fetchers keys) performed by the handler of each section __
+SECTION_FETCH_KEYS = {
+    TickerUpdaterStatus.BALANCE_SHEET_ANNUAL: ['balance_sheet_yearly'],
+    TickerUpdaterStatus.BALANCE_SHEET_QUARTERLY: ['balance_sheet_quarterly'],
+    TickerUpdaterStatus.CASH_FLOW_ANNUAL: ['cash_flow_yearly'],
+    TickerUpdaterStatus.CASH_FLOW_QUARTERLY: ['cash_flow_quarterly'],
+    TickerUpdaterStatus.CASH_FLOW_TRAILING: ['cash_flow_trailing'],
+    TickerUpdaterStatus.FINANCIALS_ANNUAL: ['financials_yearly'],
+    TickerUpdaterStatus.FINANCIALS_QUARTERLY: ['financials_quarterly'],
+    TickerUpdaterStatus.FINANCIALS_TRAILING: ['financials_trailing'],
+    TickerUpdaterStatus.ACTIONS: ['actions'],
+    TickerUpdaterStatus.CALENDAR: ['calendar'],
+    TickerUpdaterStatus.EARNINGS_DATES: ['earnings_dates'],
+    TickerUpdaterStatus.EARNINGS_HISTORY: ['earnings_history'],
+    TickerUpdaterStatus.INSIDER_PURCHASES: ['insider_purchases'],
+    TickerUpdaterStatus.INSIDER_ROSTER_HOLDERS: ['insider_roster_holders'],
+    TickerUpdaterStatus.INSIDER_TRANSACTIONS: ['insider_transactions'],
+    TickerUpdaterStatus.INSTITUTIONAL_HOLDERS: ['institutional_holders'],
+    TickerUpdaterStatus.MAJOR_HOLDERS: ['major_holders'],
+    TickerUpdaterStatus.MUTUAL_FUND_HOLDERS: ['mutualfund_holders'],
+    TickerUpdaterStatus.RECOMMENDATIONS: ['recommendations'],
+    TickerUpdaterStatus.UPGRADES_DOWNGRADES: ['upgrades_downgrades'],
+    TickerUpdaterStatus.STOCK_SPLITS: ['splits'],
+    TickerUpdaterStatus.SHARES_FULL: ['shares_full'],
+    TickerUpdaterStatus.INFO_GENERAL_STOCK: ['isin', 'history_metadata'],
+    TickerUpdaterStatus.INFO_TRADING_SESSION: ['fast_info', 'history_metadata'],
+}
+
+# __ requests served by the same yfinance response (one lazy load per yf.Ticker): fetched by the same thread __
+FETCH_GROUPS = [
+    ['insider_purchases', 'insider_roster_holders', 'insider_transactions', 'institutional_holders', 'major_holders', 'mutualfund_holders'],
+    ['actions', 'splits', 'history_metadata', 'fast_info'],
+]
+
+CANDLE_SECTIONS = {
+    TickerUpdaterStatus.CANDLE_MONTH: CandleDataInterval.MONTH,
+    TickerUpdaterStatus.CANDLE_WEEK: CandleDataInterval.WEEK,
+    TickerUpdaterStatus.CANDLE_DAY: CandleDataInterval.DAY,
+    TickerUpdaterStatus.CANDLE_HOUR: CandleDataInterval.HOUR,
+    TickerUpdaterStatus.CANDLE_MINUTE_5: CandleDataInterval.MINUTE_5,
+    TickerUpdaterStatus.CANDLE_MINUTE_1: CandleDataInterval.MINUTE_1,
+}
+
+
 def should_run(last_run: datetime | None, status: TickerUpdaterStatus, now: datetime) -> bool:
     """Return True if TTL expired for the given status."""
     if last_run is None:
@@ -174,16 +224,73 @@ def should_run(last_run: datetime | None, status: TickerUpdaterStatus, now: date
     return now - last_run >= TTL[status]
 
 
+@dataclass
+class TickerUpdatePlanner:
+    """
+    Freshness planner: decides per (ticker, dataset) whether the dataset has to be fetched again.
+
+    The last run of every dataset is loaded for a whole batch of tickers with one grouped query
+    on ticker_dataset_update, so that fresh datasets are skipped before any yfinance request.
+    """
+    session: sess.Session
+    now: datetime = field(default_factory=datetime.now)
+    last_runs: dict = field(default_factory=dict, init=False)
+
+    def load(self, symbols: list[str]) -> None:
+        """
+        Load the last run of every dataset for the given symbols.
+
+        :param symbols: The list of symbols of the batch.
+        """
+        self.last_runs = db_last_runs(self.session, symbols)
+        LOGGER.info(f"{'Tickers with dataset runs:'.ljust(25)} {len(self.last_runs)}/{len(symbols)}")
+
+    def get_last_runs(self, symbol: str) -> dict[TickerUpdaterStatus, datetime]:
+        """
+        Get the last run of every dataset of the ticker, keyed by status.
+
+        :param symbol: The symbol of the ticker.
+        :return: Dictionary {status: last_run}.
+        """
+        statuses = {status.value: status for status in TTL}
+        return {statuses[dataset]: last_run
+                for dataset, last_run in self.last_runs.get(symbol, {}).items()
+                if dataset in statuses}
+
+    def plan(self, symbol: str) -> dict[TickerUpdaterStatus, bool]:
+        """
+        Decide for every dataset with a TTL whether it has to run for the ticker.
+
+        :param symbol: The symbol of the ticker.
+        :return: Dictionary {status: should_run}.
+        """
+        last_runs = self.get_last_runs(symbol)
+        return {status: should_run(last_runs.get(status), status, self.now) for status in TTL}
+
+
 @dataclass
 class TickerUpdater:
-    def __init__(self, session: sess.Session, symbol: str, has_yf_errors: bool = False):
+    def __init__(self,
+                 session: sess.Session,
+                 symbol: str,
+                 has_yf_errors: bool = False,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 update_plan: Optional[dict[TickerUpdaterStatus, bool]] = None):
         self.session = session
         self.symbol = symbol
         self.has_yf_errors = has_yf_errors
+        self.rate_limiter = rate_limiter
+        self.update_plan = update_plan  # None = run every dataset
+        self.dataset_runs = {}
+        self.skipped_datasets = []
         self.ticker_service = None
         self.function_map = {}
         self.errors = []
+        self.yf_exceptions = []
         self.results_len = {}
+        self.prefetched_sections = set()
+        self.failed_prefetch_keys = set()  # requests / candle intervals whose prefetch logged yfinance errors
+        self.section_times = {}     # {section: {'fetch': secs, 'write': secs}}
         self._set_is_index()
 
     def _set_is_index(self):
@@ -197,7 +304,7 @@ class TickerUpdater:
         stock = yf.Ticker(self.symbol)
 
         # __ update the database with new data __
-        ticker_service = TickerService(session=self.session, symbol=self.symbol, commit_enable=True)
+        ticker_service = TickerService(session=self.session, symbol=self.symbol, commit_enable=True, set_based_bulk_update=SET_BASED_BULK_UPDATE, unit_of_work=UNIT_OF_WORK)
         ticker_service.set_stock(stock=stock)
         self.ticker_service = ticker_service
         self.set_mapping()  # Set the mapping of ticker update statuses to functions
@@ -217,59 +324,49 @@ class TickerUpdater:
                 print('passing yf_errors')
             self.execute_function(None, lambda: self.ticker_service.handle_ticker_status(status=status, error=error))
             self.execute_function(None, ticker_service.final_update_ticker)
-            LOGGER.warning(f"{self.symbol} - Ticker not updated - sleeping 30 seconds")
-            sleep(1)
+            ticker_service.commit_unit_of_work()
+            if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+                LOGGER.warning(f"{self.symbol} - Ticker not updated")
+                if is_throttling_error(error):
+                    self.rate_limiter.backoff(reason=error)
+            else:
+                LOGGER.warning(f"{self.symbol} - Ticker not updated - sleeping 1 second")
+                sleep(1)
             return False
 
-        if not self.is_index:
-            self.map_and_execute_function(TickerUpdaterStatus.BALANCE_SHEET_ANNUAL) if UPDATE_BALANCE_SHEET_ANNUAL else None
-            self.map_and_execute_function(TickerUpdaterStatus.BALANCE_SHEET_QUARTERLY) if UPDATE_BALANCE_SHEET_QUARTERLY else None
-            self.map_and_execute_function(TickerUpdaterStatus.CASH_FLOW_ANNUAL) if UPDATE_CASH_FLOW_ANNUAL else None
-            self.map_and_execute_function(TickerUpdaterStatus.CASH_FLOW_QUARTERLY) if UPDATE_CASH_FLOW_QUARTERLY else None
-            self.map_and_execute_function(TickerUpdaterStatus.CASH_FLOW_TRAILING) if UPDATE_CASH_FLOW_TRAILING else None
-            self.map_and_execute_function(TickerUpdaterStatus.FINANCIALS_ANNUAL) if UPDATE_FINANCIALS_ANNUAL else None
-            self.map_and_execute_function(TickerUpdaterStatus.FINANCIALS_QUARTERLY) if UPDATE_FINANCIALS_QUARTERLY else None
-            self.map_and_execute_function(TickerUpdaterStatus.FINANCIALS_TRAILING) if UPDATE_FINANCIALS_TRAILING else None
-            self.map_and_execute_function(TickerUpdaterStatus.ACTIONS) if UPDATE_ACTIONS else None
-            self.map_and_execute_function(TickerUpdaterStatus.CALENDAR) if UPDATE_CALENDAR else None
-            self.map_and_execute_function(TickerUpdaterStatus.EARNINGS_DATES) if UPDATE_EARNINGS_DATES else None
-            self.map_and_execute_function(TickerUpdaterStatus.EARNINGS_HISTORY) if UPDATE_EARNINGS_HISTORY else None
-            self.map_and_execute_function(TickerUpdaterStatus.INSIDER_PURCHASES) if UPDATE_INSIDER_PURCHASES else None
-            self.map_and_execute_function(TickerUpdaterStatus.INSIDER_ROSTER_HOLDERS) if UPDATE_INSIDER_ROSTER_HOLDERS else None
-            self.map_and_execute_function(TickerUpdaterStatus.INSIDER_TRANSACTIONS) if UPDATE_INSIDER_TRANSACTIONS else None
-            self.map_and_execute_function(TickerUpdaterStatus.INSTITUTIONAL_HOLDERS) if UPDATE_INSTITUTIONAL_HOLDERS else None
-            self.map_and_execute_function(TickerUpdaterStatus.MAJOR_HOLDERS) if UPDATE_MAJOR_HOLDERS else None
-            self.map_and_execute_function(TickerUpdaterStatus.MUTUAL_FUND_HOLDERS) if UPDATE_MUTUAL_FUND_HOLDERS else None
-            self.map_and_execute_function(TickerUpdaterStatus.RECOMMENDATIONS) if UPDATE_RECOMMENDATIONS else None
-            self.map_and_execute_function(TickerUpdaterStatus.UPGRADES_DOWNGRADES) if UPDATE_UPGRADES_DOWNGRADES else None
-            self.map_and_execute_function(TickerUpdaterStatus.STOCK_SPLITS) if UPDATE_STOCK_SPLITS else None
-            self.map_and_execute_function(TickerUpdaterStatus.SHARES_FULL) if UPDATE_SHARES_FULL else None
-
-        if info is not None:
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_COMPANY_ADDRESS) if UPDATE_INFO_COMPANY_ADDRESS else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_TARGET_PRICE_AND_RECOMMENDATION) if UPDATE_INFO_TARGET_PRICE_AND_RECOMMENDATION else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_GOVERNANCE) if UPDATE_INFO_GOVERNANCE else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_CASH_AND_FINANCIAL_RATIOS) if UPDATE_INFO_CASH_AND_FINANCIAL_RATIOS else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_MARKET_AND_FINANCIAL_METRICS) if UPDATE_INFO_MARKET_AND_FINANCIAL_METRICS else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_GENERAL_STOCK) if UPDATE_INFO_GENERAL_STOCK else None
-            self.map_and_execute_function(TickerUpdaterStatus.INFO_TRADING_SESSION) if UPDATE_INFO_TRADING_SESSION else None
-            if not self.is_index:
-                self.map_and_execute_function(TickerUpdaterStatus.SECTOR_INDUSTRY_HISTORY) if UPDATE_SECTOR_INDUSTRY_HISTORY else None
+        sections = self.get_sections(has_info=info is not None)
+        candle_sections = [section for section, enabled in [
+            (TickerUpdaterStatus.CANDLE_MONTH, UPDATE_CANDLE_MONTH),
+            (TickerUpdaterStatus.CANDLE_WEEK, UPDATE_CANDLE_WEEK),
+            (TickerUpdaterStatus.CANDLE_DAY, UPDATE_CANDLE_DAY),
+            (TickerUpdaterStatus.CANDLE_HOUR, UPDATE_CANDLE_HOUR),
+            (TickerUpdaterStatus.CANDLE_MINUTE_5, UPDATE_CANDLE_MINUTE_5),
+            (TickerUpdaterStatus.CANDLE_MINUTE_1, UPDATE_CANDLE_MINUTE_1),
+        ] if enabled]
+
+        # __ fetch the yfinance data of all the sections concurrently, then write them one after the other __
+        if PREFETCH_SECTIONS:
+            self.prefetch_sections(sections + candle_sections)
+
+        for section in sections:
+            self.map_and_execute_function(section)
 
         before_candle_time = time()
 
         # __ handle candle data update/insert __
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_MONTH) if UPDATE_CANDLE_MONTH else None
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_WEEK) if UPDATE_CANDLE_WEEK else None
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_DAY) if UPDATE_CANDLE_DAY else None
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_HOUR) if UPDATE_CANDLE_HOUR else None
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_MINUTE_5) if UPDATE_CANDLE_MINUTE_5 else None
-        self.map_and_execute_function(TickerUpdaterStatus.CANDLE_MINUTE_1) if UPDATE_CANDLE_MINUTE_1 else None
+        for section in candle_sections:
+            self.map_and_execute_function(section)
 
         # intervals = list(CandleDataInterval)
         # for interval in intervals:
         #     self.execute_function(None, ticker_service.handle_candle_data, interval=interval)
 
+        # __ store the last run of the fetched datasets and log the skipped ones __
+        if self.dataset_runs:
+            self.execute_function(None, ticker_service.handle_dataset_runs, self.dataset_runs)
+        if self.skipped_datasets:
+            LOGGER.info(f"{self.symbol} - {'Fresh datasets skipped'.rjust(50)} - {len(self.skipped_datasets)}")
+
         if not DISABLE_YF_CHECK:
             if not any([x for x in self.results_len if type(self.results_len[x]) == int and len(self.results_len) > 0]):
                 yf_errors = self.check_yfinance_exceptions()
@@ -285,19 +382,183 @@ class TickerUpdater:
                             AND valid = true"""
                          ).bindparams(symbol=self.symbol)
                 )
-                self.session.commit()
+                ticker_service.commit()
                 LOGGER.info(f"{self.symbol} - Removed valid flag from existing yfinance errors")
 
             self.execute_function(None, ticker_service.final_update_ticker)
 
+        # __ commit all the sections of the ticker at once (unit of work mode) __
+        ticker_service.commit_unit_of_work()
+
         # __ stop tracking the elapsed time and print the difference __
         end_time = time()
         before_candle_time_secs = before_candle_time - start_time
         total_time_secs = end_time - start_time
         total_time = seconds_to_time(total_time_secs)
+        self.log_section_times()
         LOGGER.info(f"{self.symbol} - Total time: {total_time['minutes']} min {total_time['seconds']} sec\n")
         return before_candle_time_secs, total_time_secs
 
+    def get_sections(self, has_info: bool) -> list[TickerUpdaterStatus]:
+        """
+        Get the enabled sections of the ticker (candles excluded), in update order.
+
+        :param has_info: Whether the info of the ticker is available.
+        :return: The list of the sections to update.
+        """
+        sections = []
+        if not self.is_index:
+            sections += [
+                (TickerUpdaterStatus.BALANCE_SHEET_ANNUAL, UPDATE_BALANCE_SHEET_ANNUAL),
+                (TickerUpdaterStatus.BALANCE_SHEET_QUARTERLY, UPDATE_BALANCE_SHEET_QUARTERLY),
+                (TickerUpdaterStatus.CASH_FLOW_ANNUAL, UPDATE_CASH_FLOW_ANNUAL),
+                (TickerUpdaterStatus.CASH_FLOW_QUARTERLY, UPDATE_CASH_FLOW_QUARTERLY),
+                (TickerUpdaterStatus.CASH_FLOW_TRAILING, UPDATE_CASH_FLOW_TRAILING),
+                (TickerUpdaterStatus.FINANCIALS_ANNUAL, UPDATE_FINANCIALS_ANNUAL),
+                (TickerUpdaterStatus.FINANCIALS_QUARTERLY, UPDATE_FINANCIALS_QUARTERLY),
+                (TickerUpdaterStatus.FINANCIALS_TRAILING, UPDATE_FINANCIALS_TRAILING),
+                (TickerUpdaterStatus.ACTIONS, UPDATE_ACTIONS),
+                (TickerUpdaterStatus.CALENDAR, UPDATE_CALENDAR),
+                (TickerUpdaterStatus.EARNINGS_DATES, UPDATE_EARNINGS_DATES),
+                (TickerUpdaterStatus.EARNINGS_HISTORY, UPDATE_EARNINGS_HISTORY),
+                (TickerUpdaterStatus.INSIDER_PURCHASES, UPDATE_INSIDER_PURCHASES),
+                (TickerUpdaterStatus.INSIDER_ROSTER_HOLDERS, UPDATE_INSIDER_ROSTER_HOLDERS),
+                (TickerUpdaterStatus.INSIDER_TRANSACTIONS, UPDATE_INSIDER_TRANSACTIONS),
+                (TickerUpdaterStatus.INSTITUTIONAL_HOLDERS, UPDATE_INSTITUTIONAL_HOLDERS),
+                (TickerUpdaterStatus.MAJOR_HOLDERS, UPDATE_MAJOR_HOLDERS),
+                (TickerUpdaterStatus.MUTUAL_FUND_HOLDERS, UPDATE_MUTUAL_FUND_HOLDERS),
+                (TickerUpdaterStatus.RECOMMENDATIONS, UPDATE_RECOMMENDATIONS),
+                (TickerUpdaterStatus.UPGRADES_DOWNGRADES, UPDATE_UPGRADES_DOWNGRADES),
+                (TickerUpdaterStatus.STOCK_SPLITS, UPDATE_STOCK_SPLITS),
+                (TickerUpdaterStatus.SHARES_FULL, UPDATE_SHARES_FULL),
+            ]
+
+        if has_info:
+            sections += [
+                (TickerUpdaterStatus.INFO_COMPANY_ADDRESS, UPDATE_INFO_COMPANY_ADDRESS),
+                (TickerUpdaterStatus.INFO_TARGET_PRICE_AND_RECOMMENDATION, UPDATE_INFO_TARGET_PRICE_AND_RECOMMENDATION),
+                (TickerUpdaterStatus.INFO_GOVERNANCE, UPDATE_INFO_GOVERNANCE),
+                (TickerUpdaterStatus.INFO_CASH_AND_FINANCIAL_RATIOS, UPDATE_INFO_CASH_AND_FINANCIAL_RATIOS),
+                (TickerUpdaterStatus.INFO_MARKET_AND_FINANCIAL_METRICS, UPDATE_INFO_MARKET_AND_FINANCIAL_METRICS),
+                (TickerUpdaterStatus.INFO_GENERAL_STOCK, UPDATE_INFO_GENERAL_STOCK),
+                (TickerUpdaterStatus.INFO_TRADING_SESSION, UPDATE_INFO_TRADING_SESSION),
+            ]
+            if not self.is_index:
+                sections.append((TickerUpdaterStatus.SECTOR_INDUSTRY_HISTORY, UPDATE_SECTOR_INDUSTRY_HISTORY))
+
+        return [section for section, enabled in sections if enabled]
+
+    def is_planned(self, ticker_update_status: TickerUpdaterStatus) -> bool:
+        """Return False if the dataset is still fresh according to the TTL table."""
+        return self.update_plan is None or self.update_plan.get(ticker_update_status, True)
+
+    def prefetch_sections(self, sections: list[TickerUpdaterStatus]) -> None:
+        """
+        Fetch the yfinance data of the given sections with a bounded pool of threads, before the handlers run.
+
+        The threads only use the yf.Ticker (and yf.download for the candles): the last candles, which decide the
+        period to download, are read here on the session of the ticker, and all the database writes stay in the
+        handlers, executed sequentially by map_and_execute_function. The requests served by the same yfinance
+        response are fetched by the same thread (FETCH_GROUPS), and the candle intervals one after the other
+        (yf.download is also serialized across the tickers by yf_download, while the yf.Ticker requests overlap).
+
+        :param sections: The sections to update.
+        """
+        sections = [section for section in sections if section in self.function_map and self.is_planned(section)]
+
+        # __ one task per group of requests __
+        keys = list(dict.fromkeys(key for section in sections for key in SECTION_FETCH_KEYS.get(section, [])))
+        tasks = [[key for key in group if key in keys] for group in FETCH_GROUPS]
+        tasks += [[key] for key in keys if not any(key in group for group in FETCH_GROUPS)]
+        tasks = [task for task in tasks if task]
+
+        # __ candles: the periods depend on the last stored candles, read before starting the threads __
+        candle_periods = {}
+        candle_service = self.ticker_service.candle_service
+        if candle_service is not None:
+            for section in sections:
+                if section in CANDLE_SECTIONS:
+                    _, period = self.execute_function((None, None), candle_service.get_last_candle_and_period, interval=CANDLE_SECTIONS[section])[0]
+                    if period is not None:
+                        candle_periods[CANDLE_SECTIONS[section]] = period
+
+        if not tasks and not candle_periods:
+            return
+
+        fetch_times = {}
+
+        def fetch(task_keys: list[str]) -> None:
+            start_time = time()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(tokens=len(task_keys))
+            with yf_error_collector.collect() as yf_errors:
+                self.ticker_service.prefetch(task_keys)
+            self.on_prefetch_errors(yf_errors, keys=task_keys)
+            for key in task_keys:
+                fetch_times[key] = time() - start_time
+
+        def fetch_candles() -> None:
+            for interval, period in candle_periods.items():
+                start_time = time()
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                with yf_error_collector.collect() as yf_errors:
+                    candle_service.prefetch_candle_data({interval: period})
+                self.on_prefetch_errors(yf_errors, keys=[interval])
+                fetch_times[interval] = time() - start_time
+
+        start_time = time()
+        num_workers = min(PREFETCH_WORKERS, len(tasks) + (1 if candle_periods else 0))
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix=f"Prefetch-{self.symbol}") as executor:
+            futures = [executor.submit(fetch, task) for task in tasks]
+            if candle_periods:
+                futures.append(executor.submit(fetch_candles))
+            for future in futures:
+                future.result()
+
+        # __ fetch time of each section: its slowest request __
+        for section in sections:
+            section_keys = self.section_fetch_keys(section)
+            if section_keys and all(key in fetch_times for key in section_keys):
+                self.prefetched_sections.add(section)
+                self.section_times.setdefault(section, {})['fetch'] = max(fetch_times[key] for key in section_keys)
+                PIPELINE_STATS.record(section.value, self.symbol, fetch_time=self.section_times[section]['fetch'])
+
+        LOGGER.debug(f"{self.symbol} - {'Prefetch'.rjust(50)} - {len(self.prefetched_sections)} sections in {round(time() - start_time, 3)} sec")
+
+    @staticmethod
+    def section_fetch_keys(section: TickerUpdaterStatus) -> list:
+        """ The prefetch keys of a section: its candle interval, or its yf.Ticker requests. """
+        return [CANDLE_SECTIONS[section]] if section in CANDLE_SECTIONS else SECTION_FETCH_KEYS.get(section, [])
+
+    def on_prefetch_errors(self, yf_errors: list[str], keys: list) -> None:
+        """
+        Keep the yfinance errors logged by a prefetch thread for check_yfinance_exceptions and back off on throttling.
+        The keys are remembered, so that the sections fetched by them are not recorded as run (TTL).
+
+        :param yf_errors: The error messages collected in the thread.
+        :param keys: The requests (or candle intervals) fetched by the thread.
+        """
+        if not yf_errors:
+            return
+        self.failed_prefetch_keys.update(keys)
+        exception = yf_error_collector.to_exception(yf_errors)
+        self.yf_exceptions.append(exception)
+        if isinstance(self.rate_limiter, AdaptiveRateLimiter) and is_throttling_error(str(exception)):
+            self.rate_limiter.backoff(reason=str(exception).split('\n')[0])
+
+    def log_section_times(self) -> None:
+        """ Log the fetch and write time of every section of the ticker. """
+        for section, times in self.section_times.items():
+            LOGGER.debug(f"{self.symbol} - {section.value.rjust(50)} - fetch: {round(times.get('fetch', 0), 3)} sec, "
+                         f"write: {round(times.get('write', 0), 3)} sec")
+
+        fetch_time = sum(times.get('fetch', 0) for times in self.section_times.values())
+        write_time = sum(times.get('write', 0) for times in self.section_times.values())
+        slowest = sorted(self.section_times, key=lambda x: sum(self.section_times[x].values()), reverse=True)[:3]
+        LOGGER.info(f"{self.symbol} - {'Sections time'.rjust(50)} - fetch: {round(fetch_time, 3)} sec, write: {round(write_time, 3)} sec"
+                    f" - slowest: {', '.join(section.value for section in slowest)}")
+
     def set_mapping(self):
         """
         self.execute_function(None, ticker_service.final_update_ticker)
@@ -385,9 +646,45 @@ class TickerUpdater:
             ticker_update_status: The status of the ticker update.
         """
         if ticker_update_status in self.function_map:
-            result = self.function_map[ticker_update_status]()
+            # __ skip the dataset if it is still fresh according to the TTL table __
+            if not self.is_planned(ticker_update_status):
+                LOGGER.debug(f"{self.symbol} - {ticker_update_status.value.rjust(50)} - skipped (TTL not expired)")
+                self.skipped_datasets.append(ticker_update_status)
+                return None, False
+
+            # __ wait for the global request budget when running concurrently (already spent by the prefetch) __
+            if self.rate_limiter is not None and ticker_update_status not in self.prefetched_sections:
+                self.rate_limiter.acquire()
+
+            errors_before = len(self.errors)
+            yf_exceptions_before = len(self.yf_exceptions)
+            start_time = time()
+            self.ticker_service.begin_section()
+            with PIPELINE_STATS.section(ticker_update_status.value, self.symbol):
+                result = self.function_map[ticker_update_status]()
+            # __ a failing section rolls back only its own writes (unit of work mode) __
+            self.ticker_service.end_section(failed=any(e["status"] != "Empty DataFrame" for e in self.errors[errors_before:]))
+            if ticker_update_status != TickerUpdaterStatus.GET_INFO:
+                self.section_times.setdefault(ticker_update_status, {})['write'] = time() - start_time
             if isinstance(result, tuple) and len(result) == 2 and type(result[0]) == int:
                 self.results_len.update({ticker_update_status: result[0]})
+
+            # __ record the run of datasets with a TTL unless the handler raised or yfinance logged errors (a throttled
+            #    or failed request returns None, seen as an empty DataFrame), in the section or in its prefetch __
+            if (ticker_update_status in TTL
+                    and all(e["status"] == "Empty DataFrame" for e in self.errors[errors_before:])
+                    and len(self.yf_exceptions) == yf_exceptions_before
+                    and not self.failed_prefetch_keys.intersection(self.section_fetch_keys(ticker_update_status))):
+                self.dataset_runs[ticker_update_status.value] = datetime.now()
+
+            # __ speed up on clean responses, back off on throttling __
+            if isinstance(self.rate_limiter, AdaptiveRateLimiter):
+                new_errors = [e["error"] for e in self.errors[errors_before:]] + [str(e) for e in self.yf_exceptions[yf_exceptions_before:]]
+                throttling_errors = [error for error in new_errors if is_throttling_error(error)]
+                if throttling_errors:
+                    self.rate_limiter.backoff(reason=throttling_errors[0])
+                else:
+                    self.rate_limiter.on_success()
             return result
         else:
             LOGGER.error(f"Ticker update status {ticker_update_status} not found in function map.")
@@ -408,28 +705,31 @@ class TickerUpdater:
         """
         func_name = getattr(function, '__name__', '<anonymous>')
 
-        try:
-            result = function(*args, **kwargs)
-            if result is None or (isinstance(result, pd.DataFrame) and result.empty) or(isinstance(result, bool) and not result):
-                self.errors.append({"label": func_name, "status": "Empty DataFrame", "error": "Function returned an empty DataFrame."})
+        # __ attach the yfinance errors logged by the call to this ticker __
+        with yf_error_collector.collect() as yf_errors:
+            try:
+                result = function(*args, **kwargs)
+                if result is None or (isinstance(result, pd.DataFrame) and result.empty) or(isinstance(result, bool) and not result):
+                    self.errors.append({"label": func_name, "status": "Empty DataFrame", "error": "Function returned an empty DataFrame."})
+                    return default, False
+                return result, True
+            except RuntimeError as e:
+                LOGGER.error(f"{e}")
+                self.errors.append({"label": func_name, "status":"Runtime Error", "error": str(e)})
+                return default, False
+            except Exception as e:
+                LOGGER.error(f"{e}")
+                self.errors.append({"label": func_name, "status": "Exception", "error": str(e)})
                 return default, False
-            return result, True
-        except RuntimeError as e:
-            LOGGER.error(f"{e}")
-            self.errors.append({"label": func_name, "status":"Runtime Error", "error": str(e)})
-            return default, False
-        except Exception as e:
-            LOGGER.error(f"{e}")
-            self.errors.append({"label": func_name, "status": "Exception", "error": str(e)})
-            return default, False
+            finally:
+                if yf_errors:
+                    self.yf_exceptions.append(yf_error_collector.to_exception(yf_errors))
 
-    @staticmethod
-    def check_yfinance_exceptions() -> (bool, str):
-        """Check for yfinance exceptions and handle them accordingly."""
+    def check_yfinance_exceptions(self) -> (bool, str):
+        """Check for the yfinance exceptions collected by the calls of this ticker and handle them accordingly."""
         yf_errors = []
-        sleep(2.5)  # Sleep to wait for the exception to be raised in the ErrorHandler
-        exceptions = error_handler.get_exceptions()  # Check and raise exception in the main thread
-        error_handler.clean_exceptions()
+        exceptions = self.yf_exceptions
+        self.yf_exceptions = []
         for exc in exceptions:
             try:
                 raise exc
@@ -0,0 +1,59 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_collected_errors: ContextVar[Optional[list[str]]] = ContextVar("yfinance_collected_errors", default=None)
+
+
+class YFinanceErrorCollector(logging.Handler):
+    """
+    Attaches the yfinance ERROR records to the call that produced them, synchronously.
+
+    The records are appended to the list of the innermost collect() scope of the current context, so no
+    flush delay is needed and concurrent workers (each thread has its own context) never see each other's
+    errors. Records emitted outside any scope, or from threads that do not copy the context, are dropped.
+    """
+    def emit(self, record):
+        if record.levelno >= logging.ERROR:
+            errors = _collected_errors.get()
+            if errors is not None:
+                errors.append(record.getMessage())
+
+    @staticmethod
+    @contextmanager
+    def collect():
+        """
+        Collect the yfinance errors logged inside the with block.
+
+        :return: The list filled with the error messages of the block.
+        """
+        errors = []
+        token = _collected_errors.set(errors)
+        try:
+            yield errors
+        finally:
+            _collected_errors.reset(token)
+
+    @staticmethod
+    def to_exception(errors: list[str]) -> Optional[RuntimeError]:
+        """
+        Build the same RuntimeError raised by RaiseOnErrorHandler from the collected error messages.
+
+        :param errors: The error messages collected in a scope.
+        :return: The exception, or None if no error was collected.
+        """
+        if not errors:
+            return None
+        full_message = "\n".join(errors)
+        return RuntimeError(f"yfinance ERROR:\n{full_message}")
+
+    def check_for_exception(self, errors: list[str]) -> None:
+        """
+        Raise the collected errors, if any.
+
+        :param errors: The error messages collected in a scope.
+        """
+        exception = self.to_exception(errors)
+        if exception is not None:
+            raise exception
@@ -0,0 +1,154 @@
+import pandas as pd
+from datetime import datetime
+from typing import Type, Optional
+
+from sqlalchemy import text, Boolean
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import Base, CandleAnalysisCandlestickDay, CandleAnalysisIndicatorsDay, CandleAnalysisTrendMethod1Day
+from src.stock.src.db.pg_copy import copy_dataframe, create_staging_table, drop_staging_table, get_integer_columns
+
+# __ analysis DataFrame column -> model column, per analysis table __
+ANALYSIS_COLUMN_MAPS = {
+    CandleAnalysisCandlestickDay: {
+        'id': 'candle_data_day_id',
+        'bullish': 'bullish',
+        'bodyDelta': 'body_delta',
+        'shadowDelta': 'shadow_delta',
+        '%body': 'percent_body',
+        '%upperShadow': 'percent_upper_shadow',
+        '%lowerShadow': 'percent_lower_shadow',
+        'longBody': 'long_body',
+        'shadowImbalance': 'shadow_imbalance',
+        'shavenHead': 'shaven_head',
+        'shavenBottom': 'shaven_bottom',
+        'doji': 'doji',
+        'spinningTop': 'spinning_top',
+        'umbrellaLine': 'umbrella_line',
+        'umbrellaLineInverted': 'umbrella_line_inverted',
+        'midBody': 'mid_body',
+        'bodyATR%': 'body_atr_percent',
+        'body2ATR%': 'body2atr_percent',
+        'longATRCandle': 'long_atr_candle',
+        'body2ATR%2shadowImbalanceRatio': 'body2atr2_shadow_imbalance_ratio',
+        'longCandleLight': 'long_candle_light',
+        'longCandleBullishLight': 'long_candle_bullish_light',
+        'longCandleBearishLight': 'long_candle_bearish_light',
+        'longCandle': 'long_candle',
+        'longCandleBullish': 'long_candle_bullish',
+        'longCandleBearish': 'long_candle_bearish',
+        'engulfingBullish': 'engulfing_bullish',
+        'engulfingBearish': 'engulfing_bearish',
+        'darkCloudCover': 'dark_cloud_cover',
+        'darkCloudCoverLight': 'dark_cloud_cover_light',
+        'piercingPattern': 'piercing_pattern',
+        'piercingPatternLight': 'piercing_pattern_light',
+        'onNeckPattern': 'on_neck_pattern',
+        'inNeckPattern': 'in_neck_pattern',
+        'thrustingPattern': 'thrusting_pattern',
+        'star': 'star',
+        'eveningStar': 'evening_star',
+        'morningStar': 'morning_star',
+    },
+    CandleAnalysisIndicatorsDay: {
+        'id': 'candle_data_day_id',
+        'prevClose': 'prev_close',
+        'TR': 'tr',
+        'ATR': 'atr',
+        'ATR%': 'atr_percent',
+        'MA50': 'ma50',
+        'MA100': 'ma100',
+        'MA200': 'ma200',
+        'MA200Distance%': 'ma200_distance_percent',
+        'RSI': 'rsi',
+    },
+    CandleAnalysisTrendMethod1Day: {
+        'id': 'candle_data_day_id',
+        'TrendAllTimeHigh': 'trend_all_time_high',
+        'TrendDownFromAllTimeHigh': 'trend_down_from_all_time_high',
+        'TrendDaysFromAllTimeHigh': 'trend_days_from_all_time_high',
+        'currMax': 'curr_max',
+        'currMin': 'curr_min',
+        'DownFromHigh': 'down_from_high',
+        'UpFromLow': 'up_from_low',
+        'Trend': 'trend',
+        'TrendChange': 'trend_change',
+        'reversing': 'reversing',
+        'Session': 'session',
+        'block': 'block',
+        'currMin_min': 'curr_min_min',
+        'min_1': 'min_1',
+        'min_2': 'min_2',
+        'session_min_1': 'session_min_1',
+        'session_min_2': 'session_min_2',
+        'currMax_max': 'curr_max_max',
+        'max_1': 'max_1',
+        'max_2': 'max_2',
+        'session_max_1': 'session_max_1',
+        'session_max_2': 'session_max_2',
+    },
+}
+
+
+def to_analysis_frame(df: pd.DataFrame, model_class: Type[Base]) -> pd.DataFrame:
+    """
+    Rename the columns of the analysis DataFrame to the columns of the analysis table, once for the whole frame.
+
+    Boolean columns are converted to the nullable boolean dtype (flags computed on shifted values may be 1.0 / 0.0
+    / NaN), and last_update is set if the table has it.
+
+    :param df: DataFrame containing the candlestick analysis data.
+    :param model_class: The SQLAlchemy model class of the analysis table.
+    :return: DataFrame with the columns of the table.
+    """
+    column_map = ANALYSIS_COLUMN_MAPS[model_class]
+    frame = df[list(column_map)].rename(columns=column_map)
+
+    for column in model_class.__table__.columns:
+        if isinstance(column.type, Boolean) and column.name in frame.columns:
+            frame[column.name] = frame[column.name].astype('boolean')
+    if 'last_update' in model_class.__table__.columns:
+        frame['last_update'] = datetime.now()
+    return frame
+
+
+def upsert_analysis_frame(session: sess.Session, df: pd.DataFrame, model_class: Type[Base], replace_ticker_ids: Optional[list[int]] = None) -> int:
+    """
+    Write the analysis DataFrame to the analysis table without ORM objects: COPY into a staging table, then one
+    INSERT ... ON CONFLICT (candle_data_day_id) DO UPDATE.
+
+    :param session: SQLAlchemy session for database operations.
+    :param df: DataFrame containing the candlestick analysis data.
+    :param model_class: The SQLAlchemy model class of the analysis table.
+    :param replace_ticker_ids: Tickers whose whole analysis is replaced: their rows missing from the frame are deleted.
+    :return: Number of rows written.
+    """
+    frame = to_analysis_frame(df=df, model_class=model_class)
+    if frame.empty:
+        return 0
+
+    table_name = model_class.__tablename__
+    staging_table = f"{table_name}_staging"
+    columns = list(frame.columns)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    updates = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in columns if col != 'candle_data_day_id')
+
+    create_staging_table(session, model_class=model_class, staging_table=staging_table, columns=columns)
+    copy_dataframe(session=session, df=frame, table_name=staging_table, columns=columns, integer_columns=get_integer_columns(model_class))
+
+    if replace_ticker_ids:
+        session.execute(text(f"""
+            DELETE FROM {table_name} a
+            USING candle_data_day c
+            WHERE a.candle_data_day_id = c.id
+              AND c.ticker_id = ANY(:ticker_ids)
+              AND NOT EXISTS (SELECT 1 FROM {staging_table} s WHERE s.candle_data_day_id = a.candle_data_day_id)
+        """), {'ticker_ids': list(replace_ticker_ids)})
+
+    result = session.execute(text(f"""
+        INSERT INTO {table_name} ({column_list})
+        SELECT {column_list} FROM {staging_table}
+        ON CONFLICT (candle_data_day_id) DO UPDATE SET {updates}
+    """))
+    drop_staging_table(session, staging_table=staging_table)
+    return result.rowcount
@@ -0,0 +1,107 @@
+from typing import Type
+
+from sqlalchemy import text
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import Base
+from src.stock.src.CandleDataInterval import CandleDataInterval
+
+# __ derived interval -> (source interval, bucket width; None = calendar month) __
+ROLLUP_SOURCES = {
+    CandleDataInterval.MINUTE_5: (CandleDataInterval.MINUTE_1, '5 minutes'),
+    CandleDataInterval.HOUR: (CandleDataInterval.MINUTE_1, '1 hour'),
+    CandleDataInterval.WEEK: (CandleDataInterval.DAY, '7 days'),
+    CandleDataInterval.MONTH: (CandleDataInterval.DAY, None),
+}
+
+
+def get_covered_tickers(session: sess.Session, source_model: Type[Base], target_model: Type[Base], ticker_ids: list[int]) -> list[tuple]:
+    """
+    Select the tickers whose candles of the target interval can be derived from the source interval: the
+    source starts at or before the last target candle (the bucket to rebuild) and is as recent as the
+    freshest source candle of the batch (same day).
+
+    Tickers without target candles are not covered: their bucket alignment is unknown and the source
+    history may be shorter than the target one (e.g. 1m candles are only available for the last days).
+
+    :param session: SQLAlchemy session for database operations.
+    :param source_model: The model class of the finer interval.
+    :param target_model: The model class of the derived interval.
+    :param ticker_ids: The ids of the tickers of the batch.
+    :return: List of (ticker_id, date of the last target candle).
+    """
+    if not ticker_ids:
+        return []
+
+    source, target = source_model.__tablename__, target_model.__tablename__
+    rows = session.execute(text(f"""
+        WITH fresh AS (
+            SELECT date_trunc('day', max(date)) AS since FROM {source} WHERE ticker_id = ANY(:ticker_ids)
+        ),
+        bounds AS (
+            SELECT ticker_id, max(date) AS from_date FROM {target} WHERE ticker_id = ANY(:ticker_ids) GROUP BY ticker_id
+        )
+        SELECT b.ticker_id, b.from_date
+        FROM bounds b
+        CROSS JOIN fresh
+        JOIN LATERAL (
+            SELECT min(s.date) AS min_date, max(s.date) AS max_date FROM {source} s WHERE s.ticker_id = b.ticker_id
+        ) s ON true
+        WHERE s.min_date <= b.from_date AND s.max_date >= fresh.since
+    """), {'ticker_ids': list(ticker_ids)}).all()
+    return [(row.ticker_id, row.from_date) for row in rows]
+
+
+def rollup_candles(session: sess.Session, source_model: Type[Base], target_model: Type[Base], bucket: str, covered: list[tuple], intraday: bool) -> int:
+    """
+    Rebuild the candles of the target interval from the last target candle of each covered ticker onwards,
+    aggregating the source candles with one DELETE and one INSERT ... SELECT ... GROUP BY.
+
+    The buckets are aligned on the last target candle (date_bin with it as origin), so they match the candles
+    downloaded before (e.g. hourly candles starting at :30); months use the calendar month.
+
+    :param session: SQLAlchemy session for database operations.
+    :param source_model: The model class of the finer interval.
+    :param target_model: The model class of the derived interval.
+    :param bucket: The width of the buckets (interval literal), None for calendar months.
+    :param covered: List of (ticker_id, date of the last target candle) returned by get_covered_tickers.
+    :param intraday: Whether the candles are intraday (timestamptz dates and time_zone column).
+    :return: Number of candles inserted.
+    """
+    if not covered:
+        return 0
+
+    source, target = source_model.__tablename__, target_model.__tablename__
+    params = {'ticker_ids': [ticker_id for ticker_id, _ in covered], 'from_dates': [from_date for _, from_date in covered]}
+    bounds = "(SELECT unnest(:ticker_ids) AS ticker_id, unnest(:from_dates) AS from_date)"
+
+    if bucket is None:
+        bucket_expr = "date_trunc('month', s.date)::date"
+    elif intraday:
+        bucket_expr = f"date_bin('{bucket}', s.date, v.from_date)"
+    else:
+        bucket_expr = f"date_bin('{bucket}', s.date::timestamp, v.from_date::timestamp)::date"
+
+    time_zone_column, time_zone_value = ("time_zone, ", "max(s.time_zone), ") if intraday else ("", "")
+
+    session.execute(text(f"""
+        DELETE FROM {target} c USING {bounds} v
+        WHERE c.ticker_id = v.ticker_id AND c.date >= v.from_date
+    """), params)
+
+    result = session.execute(text(f"""
+        INSERT INTO {target} (ticker_id, date, {time_zone_column}open, high, low, close, adj_close, volume, last_update)
+        SELECT s.ticker_id,
+               {bucket_expr} AS bucket,
+               {time_zone_value}(array_agg(s.open ORDER BY s.date))[1],
+               max(s.high),
+               min(s.low),
+               (array_agg(s.close ORDER BY s.date DESC))[1],
+               (array_agg(s.adj_close ORDER BY s.date DESC))[1],
+               sum(s.volume),
+               now()::timestamp
+        FROM {source} s
+        JOIN {bounds} v ON s.ticker_id = v.ticker_id AND s.date >= v.from_date
+        GROUP BY s.ticker_id, bucket
+    """), params)
+    return result.rowcount
@@ -0,0 +1,174 @@
+import argparse
+from typing import Optional, Type
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.orm import session as sess
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.stock.src.db.models import Base, CandleDataDay, InfoTradingSession, InfoGeneralStock, InfoSectorIndustryHistory
+from src.stock.src.db.models import LatestCandleDataDay, LatestInfoTradingSession, LatestInfoGeneralStock, LatestInfoSectorIndustry
+
+from logger_setup import LOGGER
+
+
+@dataclass(frozen=True)
+class LatestTable:
+    """
+    A "latest row per ticker" table kept in step with a history table.
+
+    :param model: The model class of the latest-state table (primary key ticker_id).
+    :param order_by: The column of the history table ordering the rows of a ticker (the latest is the greatest).
+    """
+    model: Type[Base]
+    order_by: str
+
+    @property
+    def columns(self) -> list[str]:
+        """ The columns copied from the history table, ticker_id excluded. """
+        return [column.name for column in self.model.__table__.columns if column.name != 'ticker_id']
+
+
+# __ history model -> latest-state table __
+LATEST_TABLES = {
+    CandleDataDay: LatestTable(model=LatestCandleDataDay, order_by='date'),
+    InfoTradingSession: LatestTable(model=LatestInfoTradingSession, order_by='last_update'),
+    InfoGeneralStock: LatestTable(model=LatestInfoGeneralStock, order_by='last_update'),
+    InfoSectorIndustryHistory: LatestTable(model=LatestInfoSectorIndustry, order_by='last_update'),
+}
+
+
+def upsert_latest_row(session: sess.Session, history_model: Type[Base], record: dict) -> None:
+    """
+    Upsert the record just written to the history table into its latest-state table, in the same transaction.
+    An older record (e.g. written late) does not replace a newer one.
+
+    :param session: SQLAlchemy session for database operations.
+    :param history_model: The model class of the history table.
+    :param record: The values of the history record, including ticker_id.
+    """
+    latest = LATEST_TABLES.get(history_model)
+    if latest is None:
+        return
+
+    table = latest.model.__table__
+    statement = pg_insert(table).values({column: record.get(column) for column in ['ticker_id'] + latest.columns})
+    session.execute(statement.on_conflict_do_update(
+        index_elements=['ticker_id'],
+        set_={column: statement.excluded[column] for column in latest.columns},
+        where=table.c[latest.order_by] <= statement.excluded[latest.order_by],
+    ))
+
+
+def refresh_latest_rows(session: sess.Session, history_model: Type[Base], ticker_ids: Optional[list[int]] = None) -> int:
+    """
+    Rebuild the latest-state rows of the tickers from the history table (one DISTINCT ON per ticker), used by the
+    bulk writers after their inserts / deletes and, for all the tickers, as backfill.
+
+    :param session: SQLAlchemy session for database operations.
+    :param history_model: The model class of the history table.
+    :param ticker_ids: The tickers to rebuild, None for all of them.
+    :return: Number of rows upserted.
+    """
+    latest = LATEST_TABLES.get(history_model)
+    if latest is None or ticker_ids == []:
+        return 0
+
+    session.flush()  # __ the pending ORM changes of the history table __
+    columns = ', '.join(latest.columns)
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in latest.columns)
+    where, params = ("WHERE ticker_id = ANY(:ticker_ids)", {'ticker_ids': list(ticker_ids)}) if ticker_ids is not None else ("", {})
+
+    result = session.execute(text(f"""
+        INSERT INTO {latest.model.__tablename__} (ticker_id, {columns})
+        SELECT DISTINCT ON (ticker_id) ticker_id, {columns}
+        FROM {history_model.__tablename__}
+        {where}
+        ORDER BY ticker_id, {latest.order_by} DESC
+        ON CONFLICT (ticker_id) DO UPDATE SET {updates}
+    """), params)
+
+    # __ tickers whose history is gone __
+    session.execute(text(f"""
+        DELETE FROM {latest.model.__tablename__} l
+        WHERE {"l.ticker_id = ANY(:ticker_ids) AND " if ticker_ids is not None else ""}
+              NOT EXISTS (SELECT 1 FROM {history_model.__tablename__} h WHERE h.ticker_id = l.ticker_id)
+    """), params)
+    return result.rowcount
+
+
+def check_latest_rows(session: sess.Session, history_model: Type[Base]) -> list[tuple]:
+    """
+    Compare the latest-state table with the last row per ticker of the history table.
+
+    :param session: SQLAlchemy session for database operations.
+    :param history_model: The model class of the history table.
+    :return: List of (ticker_id, issue) with issue one of 'missing', 'extra', 'different'.
+    """
+    latest = LATEST_TABLES[history_model]
+    columns = ', '.join(latest.columns)
+    expected_row = ', '.join(f"e.{column}" for column in latest.columns)
+    latest_row = ', '.join(f"l.{column}" for column in latest.columns)
+
+    rows = session.execute(text(f"""
+        WITH expected AS (
+            SELECT DISTINCT ON (ticker_id) ticker_id, {columns}
+            FROM {history_model.__tablename__}
+            ORDER BY ticker_id, {latest.order_by} DESC
+        )
+        SELECT coalesce(e.ticker_id, l.ticker_id) AS ticker_id,
+               CASE WHEN l.ticker_id IS NULL THEN 'missing' WHEN e.ticker_id IS NULL THEN 'extra' ELSE 'different' END AS issue
+        FROM expected e
+        FULL JOIN {latest.model.__tablename__} l ON l.ticker_id = e.ticker_id
+        WHERE e.ticker_id IS NULL OR l.ticker_id IS NULL OR ROW({expected_row}) IS DISTINCT FROM ROW({latest_row})
+        ORDER BY 1
+    """)).all()
+    return [(row.ticker_id, row.issue) for row in rows]
+
+
+def backfill_latest_tables(session: sess.Session) -> None:
+    """ Build all the latest-state tables from their history tables (one-off, e.g. after the migration). """
+    for history_model, latest in LATEST_TABLES.items():
+        rows = refresh_latest_rows(session, history_model)
+        session.commit()
+        LOGGER.info(f"{latest.model.__tablename__.rjust(50)} - {rows} rows backfilled")
+
+
+def check_latest_tables(session: sess.Session, fix: bool = False) -> dict:
+    """
+    Check all the latest-state tables against their history tables.
+
+    :param session: SQLAlchemy session for database operations.
+    :param fix: Whether to rebuild the rows of the inconsistent tickers.
+    :return: Dictionary {latest table name: list of (ticker_id, issue)}.
+    """
+    report = {}
+    for history_model, latest in LATEST_TABLES.items():
+        issues = check_latest_rows(session, history_model)
+        report[latest.model.__tablename__] = issues
+        if not issues:
+            LOGGER.info(f"{latest.model.__tablename__.rjust(50)} - consistent")
+            continue
+
+        LOGGER.warning(f"{latest.model.__tablename__.rjust(50)} - {len(issues)} inconsistent tickers: {issues[:20]}{' ...' if len(issues) > 20 else ''}")
+        if fix:
+            refresh_latest_rows(session, history_model, ticker_ids=[ticker_id for ticker_id, _ in issues])
+            session.commit()
+            LOGGER.info(f"{latest.model.__tablename__.rjust(50)} - {len(issues)} tickers rebuilt")
+    return report
+
+
+if __name__ == '__main__':
+    from src.stock.src.db.database import session_local
+
+    parser = argparse.ArgumentParser(description="Latest row per ticker tables")
+    parser.add_argument('command', choices=['backfill', 'check'], help='backfill: build the tables from the history, check: compare them with the history')
+    parser.add_argument('--fix', action='store_true', help='rebuild the inconsistent tickers found by check')
+    args = parser.parse_args()
+
+    session = session_local()
+    if args.command == 'backfill':
+        backfill_latest_tables(session)
+    else:
+        check_latest_tables(session, fix=args.fix)
+    session.close()
@@ -16,3 +16,6 @@ FROM (
 ) AS s
 WHERE s.rn = 1
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_last_info_sector_industry_uidx ON public.mv_last_info_sector_industry (ticker_id);
@@ -26,3 +26,6 @@ FROM (
 ) AS t
 WHERE t.rn = 1
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_last_info_trading_session_uidx ON public.mv_last_info_trading_session (ticker_id);
@@ -60,3 +60,6 @@ FROM monthly_totals
 JOIN ticker AS tk ON tk.id = monthly_totals.ticker_id
 ORDER BY monthly_totals.month DESC, monthly_totals.buy_value_usd DESC
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_monthly_net_insider_transactions_uidx ON public.mv_monthly_net_insider_transactions (ticker, month);
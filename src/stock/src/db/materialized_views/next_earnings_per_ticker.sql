@@ -39,3 +39,6 @@ SELECT
 FROM ranked
 WHERE ranked.rn = 1
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_next_earnings_per_ticker_uidx ON public.mv_next_earnings_per_ticker (ticker_id);
@@ -23,3 +23,6 @@ FROM (
 ) AS sub
 WHERE sub.rn = 1
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_pe_uidx ON public.mv_pe ("Ticker", date);
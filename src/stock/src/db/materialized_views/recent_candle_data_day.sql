@@ -33,3 +33,6 @@ SELECT
 FROM ranked_data
 WHERE ranked_data.rn = 1
 WITH DATA;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_recent_candle_data_day_uidx ON public.mv_recent_candle_data_day (ticker_id);
@@ -1,5 +1,6 @@
 -- === MATERIALIZED VIEW: mv_ticker_overview ===
 -- Join via ticker_id; no dependency on dot/dash or renames
+-- Reads the latest row per ticker tables (maintained on write, see db/latest_rows.py)
 CREATE MATERIALIZED VIEW public.mv_ticker_overview
 AS
 SELECT
@@ -24,13 +25,16 @@ SELECT
     lisi.last_update        AS sector_industry_last_update,
     (sp.ticker_id IS NOT NULL) AS sp500
 FROM ticker t
-LEFT JOIN mv_last_info_general_stock   igs  ON igs.ticker_id = t.id
-LEFT JOIN mv_last_info_trading_session its  ON its.ticker_id = t.id
-LEFT JOIN mv_recent_candle_data_day    rcd  ON rcd.ticker_id = t.id
+LEFT JOIN latest_info_general_stock    igs  ON igs.ticker_id = t.id
+LEFT JOIN latest_info_trading_session  its  ON its.ticker_id = t.id
+LEFT JOIN latest_candle_data_day       rcd  ON rcd.ticker_id = t.id
 LEFT JOIN mv_sp_500_latest_date        sp   ON sp.ticker_id   = t.id
-LEFT JOIN mv_last_info_sector_industry lisi ON lisi.ticker_id = t.id
+LEFT JOIN latest_info_sector_industry  lisi ON lisi.ticker_id = t.id
 WITH DATA;
 
 -- (Optional) helpful indexes on the overview MV
 CREATE INDEX IF NOT EXISTS mv_ticker_overview_tid_idx ON public.mv_ticker_overview (ticker_id);
 CREATE INDEX IF NOT EXISTS mv_ticker_overview_sym_idx ON public.mv_ticker_overview (symbol);
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_ticker_overview_uidx ON public.mv_ticker_overview (ticker_id);
@@ -937,14 +937,14 @@ class CandleDataDay(Base):
 class CandleData1Hour(Base):
     __tablename__ = 'candle_data_1_hour'
 
-    # Unique identifier for each candle
+    # Unique identifier for each candle (with date in the primary key, as required by the partitioning)
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     # Foreign key to the ticker table, indexed for fast queries
     ticker_id = Column(Integer, ForeignKey('ticker.id'), nullable=False, index=True)
 
     # Date and time of the candlestick with timezone, indexed for fast queries
-    date = Column(DateTime(timezone=True), nullable=False, index=True)
+    date = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True)
 
     # Time zone information
     time_zone = Column(String(50), nullable=True)               # Time zone information
@@ -967,6 +967,7 @@ class CandleData1Hour(Base):
     __table_args__ = (
         UniqueConstraint('ticker_id', 'date', name='uix_candle_data_1_hour_ticker_date'),
         Index('ix_candle_data_1_hour_ticker_id_date', 'ticker_id', 'date'),  # Combined index on ticker_id and date
+        {'postgresql_partition_by': 'RANGE (date)'},  # Monthly partitions, see db/partitions.py
     )
 
     def __repr__(self):
@@ -978,14 +979,14 @@ class CandleData1Hour(Base):
 class CandleData5Minutes(Base):
     __tablename__ = 'candle_data_5_minutes'
 
-    # Unique identifier for each candle
+    # Unique identifier for each candle (with date in the primary key, as required by the partitioning)
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     # Foreign key to the ticker table, indexed for fast queries
     ticker_id = Column(Integer, ForeignKey('ticker.id'), nullable=False, index=True)
 
     # Date and time of the candlestick with timezone, indexed for fast queries
-    date = Column(DateTime(timezone=True), nullable=False, index=True)
+    date = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True)
 
     # Time zone information
     time_zone = Column(String(50), nullable=True)
@@ -1008,6 +1009,7 @@ class CandleData5Minutes(Base):
     __table_args__ = (
         UniqueConstraint('ticker_id', 'date', name='uix_candle_data_5_minutes_ticker_date'),
         Index('ix_candle_data_5_minutes_ticker_id_date', 'ticker_id', 'date'),  # Combined index on ticker_id and date
+        {'postgresql_partition_by': 'RANGE (date)'},  # Monthly partitions, see db/partitions.py
     )
 
     def __repr__(self):
@@ -1019,14 +1021,14 @@ class CandleData5Minutes(Base):
 class CandleData1Minute(Base):
     __tablename__ = 'candle_data_1_minute'
 
-    # Unique identifier for each candle
+    # Unique identifier for each candle (with date in the primary key, as required by the partitioning)
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     # Foreign key to the ticker table, indexed for fast queries
     ticker_id = Column(Integer, ForeignKey('ticker.id'), nullable=False, index=True)
 
     # Date and time of the candlestick with timezone, indexed for fast queries
-    date = Column(DateTime(timezone=True), nullable=False, index=True)
+    date = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True)
 
     # Time zone information
     time_zone = Column(String(50), nullable=True)
@@ -1049,6 +1051,7 @@ class CandleData1Minute(Base):
     __table_args__ = (
         UniqueConstraint('ticker_id', 'date', name='uix_candle_data_1_minute_ticker_date'),
         Index('ix_candle_data_1_minute_ticker_id_date', 'ticker_id', 'date'),  # Combined index on ticker_id and date
+        {'postgresql_partition_by': 'RANGE (date)'},  # Monthly partitions, see db/partitions.py
     )
 
     def __repr__(self):
@@ -1301,6 +1304,24 @@ class SP500Historical(Base):
         return f"<SP500Historical(date={self.date}, ticker={self.ticker})>"
 
 
+class SP500Membership(Base):
+    __tablename__ = 'sp_500_membership'
+
+    # One row per continuous membership of a ticker, derived from sp_500_historical + sp_500_changes
+    ticker_id = Column(Integer, ForeignKey("ticker.id"), primary_key=True, nullable=False)
+    valid_from = Column(Date, primary_key=True, nullable=False)     # first day in the index
+    valid_to = Column(Date, nullable=True)                          # day of the removal (excluded), NULL = still a member
+    last_update = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # As-of lookups: members with valid_from <= D < valid_to
+        Index("ix_sp_500_membership_valid_from_valid_to", "valid_from", "valid_to"),
+    )
+
+    def __repr__(self):
+        return f"<SP500Membership(ticker_id={self.ticker_id}, valid_from={self.valid_from}, valid_to={self.valid_to})>"
+
+
 class EarningsHistory(Base):
     __tablename__ = 'earnings_history'
 
@@ -1388,4 +1409,100 @@ class SharesFull(Base):
     )
 
     def __repr__(self):
-        return f"<SharesFull(ticker_id={self.ticker_id}, date={self.date}, shares={self.shares})>"
\ No newline at end of file
+        return f"<SharesFull(ticker_id={self.ticker_id}, date={self.date}, shares={self.shares})>"
+
+
+class TickerDatasetUpdate(Base):
+    __tablename__ = "ticker_dataset_update"
+
+    # One row per ticker per dataset (TickerUpdaterStatus value)
+    ticker_id = Column(Integer, ForeignKey("ticker.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    dataset   = Column(String(50), primary_key=True, nullable=False)
+    last_run  = Column(DateTime, nullable=False)   # last time the dataset was fetched from yfinance (even without changes)
+
+    def __repr__(self):
+        return f"<TickerDatasetUpdate(ticker_id={self.ticker_id}, dataset={self.dataset}, last_run={self.last_run})>"
+
+
+class PipelineRunSectionStats(Base):
+    __tablename__ = "pipeline_run_section_stats"
+
+    # One row per run per section (TickerUpdaterStatus value or bulk candle stage), see PipelineStats
+    run_id          = Column(String(20), primary_key=True, nullable=False)   # start of the run (YYYYmmdd_HHMMSS)
+    section         = Column(String(50), primary_key=True, nullable=False)
+    tickers         = Column(Integer, nullable=False)
+    calls           = Column(Integer, nullable=False)
+    fetch_time      = Column(Float, nullable=False)     # seconds, summed over the tickers
+    transform_time  = Column(Float, nullable=False)
+    db_time         = Column(Float, nullable=False)
+    total_time      = Column(Float, nullable=False)
+    p95_time        = Column(Float, nullable=True)      # 95th percentile of the time per ticker
+    rows_inserted   = Column(Integer, nullable=False)
+    rows_unchanged  = Column(Integer, nullable=False)
+    last_update     = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (f"<PipelineRunSectionStats(run_id={self.run_id}, section={self.section}, tickers={self.tickers}, "
+                f"total_time={self.total_time}, rows_inserted={self.rows_inserted})>")
+
+
+class LatestCandleDataDay(Base):
+    __tablename__ = "latest_candle_data_day"
+
+    # Last daily candle per ticker, kept in step with candle_data_day by the writers (see db/latest_rows.py)
+    ticker_id   = Column(Integer, ForeignKey('ticker.id'), primary_key=True, nullable=False)
+    date        = Column(Date, nullable=False)
+    open        = Column(Float, nullable=False)
+    high        = Column(Float, nullable=False)
+    low         = Column(Float, nullable=False)
+    close       = Column(Float, nullable=False)
+    adj_close   = Column(Float, nullable=True)
+    volume      = Column(Float, nullable=True)
+    last_update = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<LatestCandleDataDay(ticker_id={self.ticker_id}, date={self.date}, close={self.close})>"
+
+
+class LatestInfoTradingSession(Base):
+    __tablename__ = "latest_info_trading_session"
+
+    # Last info_trading_session record per ticker (the columns read by the overview)
+    ticker_id               = Column(Integer, ForeignKey('ticker.id'), primary_key=True, nullable=False)
+    last_update             = Column(DateTime, nullable=False)
+    market_cap              = Column(BigInteger, nullable=True)
+    current_price           = Column(Numeric(10, 4), nullable=True)
+    two_hundred_day_average = Column(Numeric(13, 5), nullable=True)
+    fifty_two_week_high     = Column(Numeric(10, 4), nullable=True)
+    fifty_two_week_low      = Column(Numeric(10, 4), nullable=True)
+    trailing_pe             = Column(Numeric(13, 7), nullable=True)
+    forward_pe              = Column(Numeric(13, 7), nullable=True)
+
+    def __repr__(self):
+        return f"<LatestInfoTradingSession(ticker_id={self.ticker_id}, last_update={self.last_update}, market_cap={self.market_cap})>"
+
+
+class LatestInfoGeneralStock(Base):
+    __tablename__ = "latest_info_general_stock"
+
+    # Last info_general_stock record per ticker (the columns read by the overview)
+    ticker_id   = Column(Integer, ForeignKey('ticker.id'), primary_key=True, nullable=False)
+    last_update = Column(DateTime, nullable=False)
+    symbol      = Column(String(10), nullable=False)
+    exchange    = Column(String(10), nullable=True)
+
+    def __repr__(self):
+        return f"<LatestInfoGeneralStock(ticker_id={self.ticker_id}, symbol={self.symbol}, exchange={self.exchange})>"
+
+
+class LatestInfoSectorIndustry(Base):
+    __tablename__ = "latest_info_sector_industry"
+
+    # Last info_sector_industry_history record per ticker
+    ticker_id   = Column(Integer, ForeignKey('ticker.id'), primary_key=True, nullable=False)
+    last_update = Column(DateTime, nullable=False)
+    sector      = Column(String(100), nullable=False)
+    industry    = Column(String(100), nullable=False)
+
+    def __repr__(self):
+        return f"<LatestInfoSectorIndustry(ticker_id={self.ticker_id}, sector={self.sector}, industry={self.industry})>"
@@ -0,0 +1,127 @@
+from time import time
+from typing import Optional
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.orm import session as sess
+
+from logger_setup import LOGGER
+
+
+@dataclass(frozen=True)
+class MaterializedView:
+    """
+    A materialized view refreshed after the pipeline runs.
+
+    :param name: The name of the materialized view.
+    :param sections: The pipeline sections (PipelineStats sections) writing its source tables.
+    :param depends_on: The materialized views it reads from (refreshed before it).
+    :param volatile: Whether its content changes without writes (e.g. filtered on CURRENT_DATE).
+    """
+    name: str
+    sections: tuple = ()
+    depends_on: tuple = ()
+    volatile: bool = False
+
+
+# __ every view has a unique index, so it can be refreshed CONCURRENTLY without blocking the readers __
+MATERIALIZED_VIEWS = {view.name: view for view in [
+    MaterializedView('mv_recent_candle_data_day', sections=('candle_day', 'bulk_candle_1d')),
+    MaterializedView('mv_last_info_trading_session', sections=('info_trading_session',)),
+    MaterializedView('mv_last_info_general_stock', sections=('info_general_stock',)),
+    MaterializedView('mv_last_info_sector_industry', sections=('sector_industry_history',)),
+    MaterializedView('mv_sp_500_latest_date'),  # refreshed by the S&P 500 update, here only on full refresh
+    # __ reads the latest row per ticker tables written by these sections (see db/latest_rows.py) __
+    MaterializedView('mv_ticker_overview', sections=(
+        'info_getattr',
+        'info_general_stock',
+        'info_trading_session',
+        'candle_day',
+        'bulk_candle_1d',
+        'sector_industry_history',
+    ), depends_on=('mv_sp_500_latest_date',)),
+    MaterializedView('mv_pe', sections=('info_trading_session',)),
+    MaterializedView('mv_next_earnings_per_ticker', sections=('earnings_dates',), volatile=True),
+    MaterializedView('mv_monthly_net_insider_transactions', sections=('insider_transactions',)),
+]}
+
+
+def get_refresh_plan(touched: Optional[dict] = None) -> list[str]:
+    """
+    Select the materialized views to refresh and order them so every view comes after its inputs.
+
+    A view is refreshed if one of its sections touched a ticker in the run, if it is volatile or if one of
+    its inputs is refreshed.
+
+    :param touched: Dictionary {section: set of symbols touched in the run}, None to refresh all the views.
+    :return: The names of the views to refresh, in dependency order.
+    """
+    if touched is None:
+        stale = set(MATERIALIZED_VIEWS)
+    else:
+        stale = {name for name, view in MATERIALIZED_VIEWS.items()
+                 if view.volatile or any(touched.get(section) for section in view.sections)}
+
+    plan = []
+
+    def visit(name: str) -> bool:
+        # __ depth-first: the inputs are placed first, a view is stale if any of its inputs is __
+        if name in plan:
+            return True
+        view = MATERIALIZED_VIEWS[name]
+        inputs_stale = [visit(dependency) for dependency in view.depends_on]
+        if name in stale or any(inputs_stale):
+            plan.append(name)
+            return True
+        return False
+
+    for view_name in MATERIALIZED_VIEWS:
+        visit(view_name)
+    return plan
+
+
+def refresh_materialized_view(session: sess.Session, view_name: str, concurrently: bool = True) -> bool:
+    """
+    Refresh a materialized view and commit, so the readers see it as soon as it is ready.
+
+    CONCURRENTLY keeps the view readable during the refresh; it falls back to a blocking refresh if the view
+    cannot be refreshed concurrently (not populated yet or missing unique index).
+
+    :param session: SQLAlchemy session for database operations.
+    :param view_name: The name of the materialized view.
+    :param concurrently: Whether to refresh without blocking the readers.
+    :return: True if the view was refreshed concurrently.
+    """
+    if concurrently:
+        try:
+            session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name};"))
+            session.commit()
+            return True
+        except Exception as e:
+            session.rollback()
+            LOGGER.warning(f"{view_name.rjust(50)} - concurrent refresh failed, refreshing with lock: {e}")
+
+    session.execute(text(f"REFRESH MATERIALIZED VIEW {view_name};"))
+    session.commit()
+    return False
+
+
+def refresh_materialized_views(session: sess.Session, touched: Optional[dict] = None, concurrently: bool = True) -> list[str]:
+    """
+    Refresh the materialized views affected by the run, inputs first.
+
+    :param session: SQLAlchemy session for database operations.
+    :param touched: Dictionary {section: set of symbols touched in the run}, None to refresh all the views.
+    :param concurrently: Whether to refresh without blocking the readers.
+    :return: The names of the refreshed views.
+    """
+    plan = get_refresh_plan(touched=touched)
+    if touched is not None:
+        symbols = set().union(*touched.values()) if touched else set()
+        LOGGER.info(f"{'Materialized views:'.ljust(25)} {len(plan)}/{len(MATERIALIZED_VIEWS)} to refresh for {len(symbols)} touched tickers")
+
+    for view_name in plan:
+        start_time = time()
+        refresh_materialized_view(session=session, view_name=view_name, concurrently=concurrently)
+        LOGGER.info(f"{view_name.rjust(50)} - refreshed in {time() - start_time:.2f} sec")
+    return plan
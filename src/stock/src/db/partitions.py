@@ -0,0 +1,142 @@
+import pandas as pd
+from typing import Optional, Type
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import Base
+
+from logger_setup import LOGGER
+
+# __ candle tables partitioned by month on date, with the months of history kept (None = keep everything) __
+PARTITIONED_CANDLE_TABLES = {
+    'candle_data_1_minute': None,
+    'candle_data_5_minutes': None,
+    'candle_data_1_hour': None,
+}
+
+
+def is_partitioned(model_class: Type[Base]) -> bool:
+    """Return True if the table of the model is partitioned by month."""
+    return model_class.__tablename__ in PARTITIONED_CANDLE_TABLES
+
+
+def month_start(value) -> date:
+    """Return the first day of the month of a date / datetime (UTC for timezone-aware values)."""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert('UTC')
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """Return the first day of the month `months` after the given one."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    """Return the name of the partition of the table holding the given month (e.g. candle_data_1_minute_y2024m01)."""
+    return f"{table_name}_y{month.year}m{month.month:02d}"
+
+
+def get_partitions(session: sess.Session, table_name: str) -> list[str]:
+    """Return the names of the partitions attached to the table."""
+    rows = session.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table_name
+    """), {'table_name': table_name}).all()
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(session: sess.Session, table_name: str, start, end) -> list[str]:
+    """
+    Create the missing monthly partitions of the table covering the dates from start to end (included).
+
+    Existing partitions are skipped without locking the parent table, so the check is cheap on every write.
+
+    :param session: SQLAlchemy session for database operations.
+    :param table_name: Name of the partitioned table.
+    :param start: First date (or datetime) to cover.
+    :param end: Last date (or datetime) to cover.
+    :return: Names of the partitions created.
+    """
+    existing = set(get_partitions(session, table_name))
+    created = []
+
+    month, last_month = month_start(start), month_start(end)
+    while month <= last_month:
+        name = partition_name(table_name, month)
+        if name not in existing:
+            lower = datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+            upper_month = add_months(month, 1)
+            upper = datetime(upper_month.year, upper_month.month, 1, tzinfo=timezone.utc).isoformat()
+            session.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+            created.append(name)
+        month = add_months(month, 1)
+
+    if created:
+        LOGGER.info(f"{'Partitions'.rjust(50)} - {table_name} - created {', '.join(created)}")
+    return created
+
+
+def ensure_candle_partitions(session: sess.Session, model_class: Type[Base], dates: pd.Series) -> list[str]:
+    """
+    Create the monthly partitions needed to insert the given candles (no-op for tables that are not partitioned).
+
+    :param session: SQLAlchemy session for database operations.
+    :param model_class: The model class for the candle data.
+    :param dates: The dates of the candles to insert.
+    :return: Names of the partitions created.
+    """
+    if not is_partitioned(model_class) or dates is None or dates.empty:
+        return []
+    return ensure_partitions(session, model_class.__tablename__, dates.min(), dates.max())
+
+
+def drop_expired_partitions(session: sess.Session, table_name: str, retention_months: Optional[int], today: date = None) -> list[str]:
+    """
+    Detach and drop the monthly partitions entirely older than the retention (the current month is month 0).
+
+    :param session: SQLAlchemy session for database operations.
+    :param table_name: Name of the partitioned table.
+    :param retention_months: Number of months of history to keep (None = keep everything).
+    :param today: Reference date (default: today).
+    :return: Names of the partitions dropped.
+    """
+    if retention_months is None:
+        return []
+
+    oldest_kept = partition_name(table_name, add_months(month_start(today or date.today()), -retention_months))
+    # __ the names sort as the months they hold __
+    expired = sorted(name for name in get_partitions(session, table_name)
+                     if name.startswith(f"{table_name}_y") and name < oldest_kept)
+
+    for name in expired:
+        session.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+        session.execute(text(f"DROP TABLE {name}"))
+
+    if expired:
+        LOGGER.info(f"{'Partitions'.rjust(50)} - {table_name} - dropped {', '.join(expired)}")
+    return expired
+
+
+def maintain_candle_partitions(session: sess.Session, months_ahead: int = 2, retention: dict = None) -> None:
+    """
+    Create the partitions of the current and upcoming months and drop the expired ones, for every partitioned
+    candle table, then commit.
+
+    :param session: SQLAlchemy session for database operations.
+    :param months_ahead: Number of upcoming months to create.
+    :param retention: Months of history kept per table (default: PARTITIONED_CANDLE_TABLES).
+    """
+    retention = {**PARTITIONED_CANDLE_TABLES, **(retention or {})}
+    today = date.today()
+    for table_name, retention_months in retention.items():
+        ensure_partitions(session, table_name, today, add_months(month_start(today), months_ahead))
+        drop_expired_partitions(session, table_name, retention_months, today=today)
+    session.commit()
@@ -0,0 +1,101 @@
+import io
+import pandas as pd
+from typing import Type
+
+from sqlalchemy import text
+from sqlalchemy.orm import session as sess
+
+from src.stock.src.db.models import Base
+
+# __ explicit NULL marker of the COPY: an unquoted empty field stays an empty string (e.g. a Trend of '') __
+COPY_NULL = '\\N'
+
+
+def get_integer_columns(model_class: Type[Base]) -> list[str]:
+    """Return the names of the integer columns of the model (pure metadata read)."""
+    integer_columns = []
+    for column in model_class.__table__.columns:
+        try:
+            if column.type.python_type is int:
+                integer_columns.append(column.name)
+        except NotImplementedError:
+            continue
+    return integer_columns
+
+
+def dataframe_to_csv_buffer(df: pd.DataFrame, columns: list[str], integer_columns: list[str] = None) -> io.StringIO:
+    """
+    Serialize the given columns of a DataFrame to an in-memory CSV buffer readable by COPY ... FROM STDIN.
+
+    NaN/None are written as COPY_NULL, so empty strings are kept as such. Integer columns holding
+    NaN are upcast to float by pandas, so they are converted back to nullable integers to avoid "5.0"
+    being rejected by Postgres.
+
+    :param df: DataFrame to serialize.
+    :param columns: Columns to write, in the order of the COPY column list.
+    :param integer_columns: Columns to write as integers.
+    :return: CSV buffer positioned at the start.
+    """
+    df = df[columns]
+    for col in integer_columns or []:
+        if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+            df = df.assign(**{col: df[col].round().astype('Int64')})
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_dataframe(session: sess.Session, df: pd.DataFrame, table_name: str, columns: list[str], integer_columns: list[str] = None) -> int:
+    """
+    Stream a DataFrame into a table with COPY, inside the current transaction of the session.
+
+    :param session: SQLAlchemy session for database operations.
+    :param df: DataFrame to copy.
+    :param table_name: Name of the target table.
+    :param columns: Columns to copy.
+    :param integer_columns: Columns to write as integers.
+    :return: Number of rows copied.
+    """
+    if df.empty:
+        return 0
+
+    buffer = dataframe_to_csv_buffer(df=df, columns=columns, integer_columns=integer_columns)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+
+    # __ use the DBAPI connection bound to the session, so COPY shares its transaction __
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def create_staging_table(session: sess.Session, model_class: Type[Base], staging_table: str, columns: list[str]) -> None:
+    """
+    Create an empty temporary table with the given columns of the model's table, keeping their types.
+
+    Only the types are copied (no constraints nor defaults), so rows missing generated columns can be staged.
+    The table is dropped first if a previous run of the same session left it behind (commit disabled),
+    and it is dropped automatically at the end of the transaction.
+
+    :param session: SQLAlchemy session for database operations.
+    :param model_class: The SQLAlchemy model class whose table is mirrored.
+    :param staging_table: Name of the temporary table.
+    :param columns: Columns of the model's table to stage.
+    """
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    session.execute(text(f'DROP TABLE IF EXISTS {staging_table}'))
+    session.execute(text(f'CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS SELECT {column_list} FROM {model_class.__tablename__} WITH NO DATA'))
+
+
+def drop_staging_table(session: sess.Session, staging_table: str) -> None:
+    """
+    Drop a temporary table created with create_staging_table.
+
+    :param session: SQLAlchemy session for database operations.
+    :param staging_table: Name of the temporary table.
+    """
+    session.execute(text(f'DROP TABLE IF EXISTS {staging_table}'))
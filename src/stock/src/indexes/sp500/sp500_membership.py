@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# -------------------- Interval builder --------------------
+
+def build_membership_intervals(base_date: date,
+                               base_ids: Set[int],
+                               changes: List[Tuple[date, int, bool, bool]]) -> List[Tuple[int, date, Optional[date]]]:
+    """
+    Turn a membership snapshot and the following changes into membership intervals.
+
+    Every day applies its removes first, then its adds (same order as the snapshots of sp_500_historical).
+    A ticker removed and added again on the same day keeps one interval.
+
+    :param base_date: Date of the snapshot the intervals start from.
+    :param base_ids: Ticker ids in the index at base_date.
+    :param changes: (date, ticker_id, add, remove) after base_date.
+    :return: List of (ticker_id, valid_from, valid_to), valid_to excluded and None for current members.
+    """
+    open_from: Dict[int, date] = {tid: base_date for tid in base_ids}
+    intervals: List[Tuple[int, date, Optional[date]]] = []
+
+    by_day: Dict[date, Dict[str, Set[int]]] = {}
+    for day, tid, add, remove in changes:
+        ops = by_day.setdefault(day, {"add": set(), "remove": set()})
+        if remove:
+            ops["remove"].add(tid)
+        if add:
+            ops["add"].add(tid)
+
+    for day in sorted(by_day):
+        removed_today = {}
+        for tid in by_day[day]["remove"]:
+            if tid in open_from:
+                removed_today[tid] = open_from.pop(tid)
+        for tid in by_day[day]["add"]:
+            if tid not in open_from:
+                # __ removed and added again the same day: the interval continues __
+                open_from[tid] = removed_today.pop(tid, day)
+        intervals.extend((tid, valid_from, day) for tid, valid_from in removed_today.items())
+
+    intervals.extend((tid, valid_from, None) for tid, valid_from in open_from.items())
+    return sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+
+# -------------------- Persistence --------------------
+
+def rebuild_sp500_membership(session) -> int:
+    """
+    Rebuild sp_500_membership from the first sp_500_historical snapshot and the sp_500_changes after it,
+    replacing the table in one transaction (a few thousand rows).
+
+    :param session: SQLAlchemy session for database operations.
+    :return: Number of intervals stored.
+    """
+    base_date = session.execute(text("SELECT MIN(date) FROM sp_500_historical;")).scalar()
+    if base_date is None:
+        print("[membership] No historical snapshots found. Nothing to do.")
+        return 0
+
+    base_ids = {r[0] for r in session.execute(
+        text("SELECT ticker_id FROM sp_500_historical WHERE date = :d;"), {"d": base_date}
+    ).fetchall()}
+    changes = [tuple(r) for r in session.execute(
+        text("SELECT date, ticker_id, add, remove FROM sp_500_changes WHERE date > :d ORDER BY date, ticker_id;"),
+        {"d": base_date},
+    ).fetchall()]
+
+    intervals = build_membership_intervals(base_date=base_date, base_ids=base_ids, changes=changes)
+    now_ts = datetime.utcnow()
+    session.execute(text("DELETE FROM sp_500_membership;"))
+    session.execute(
+        text("""
+            INSERT INTO sp_500_membership (ticker_id, valid_from, valid_to, last_update)
+            VALUES (:tid, :valid_from, :valid_to, :last_update);
+        """),
+        [{"tid": tid, "valid_from": valid_from, "valid_to": valid_to, "last_update": now_ts}
+         for tid, valid_from, valid_to in intervals],
+    )
+    session.commit()
+    print(f"[membership] Stored {len(intervals)} intervals from {base_date} ({len(changes)} changes).")
+    return len(intervals)
+
+
+def verify_sp500_membership(session, snapshot_date: Optional[date] = None) -> bool:
+    """
+    Compare the members as of a snapshot date with the sp_500_historical snapshot of that date.
+
+    :param session: SQLAlchemy session for database operations.
+    :param snapshot_date: Date of the snapshot, default: the last one.
+    :return: True if they match.
+    """
+    snapshot_date = snapshot_date or session.execute(text("SELECT MAX(date) FROM sp_500_historical;")).scalar()
+    snapshot = {r[0] for r in session.execute(
+        text("SELECT ticker_id FROM sp_500_historical WHERE date = :d;"), {"d": snapshot_date}
+    ).fetchall()}
+    members = set(get_sp500_members_as_of(session, snapshot_date))
+
+    if members == snapshot:
+        print(f"[membership] Members as of {snapshot_date} match the snapshot ({len(members)} constituents).")
+        return True
+    print(f"[membership:DIFF] Members as of {snapshot_date} differ from the snapshot: "
+          f"missing {sorted(snapshot - members)[:20]}, extra {sorted(members - snapshot)[:20]}")
+    return False
+
+# -------------------- As-of API --------------------
+
+# __ members at :as_of, usable as a subquery (uses ix_sp_500_membership_valid_from_valid_to) __
+MEMBERS_AS_OF_SQL = """
+    SELECT ticker_id
+    FROM sp_500_membership
+    WHERE valid_from <= :as_of AND (valid_to IS NULL OR valid_to > :as_of)
+"""
+
+
+def get_sp500_members_as_of(session, as_of: date) -> List[int]:
+    """
+    Ticker ids in the S&P 500 at the given date (point in time, no survivorship bias).
+
+    :param session: SQLAlchemy session for database operations.
+    :param as_of: The date.
+    :return: Sorted list of ticker ids.
+    """
+    rows = session.execute(text(MEMBERS_AS_OF_SQL + " ORDER BY ticker_id;"), {"as_of": as_of}).fetchall()
+    return [r[0] for r in rows]
+
+
+def get_sp500_membership_intervals(session, start_date: date, end_date: date) -> pd.DataFrame:
+    """
+    Membership intervals overlapping the date range.
+
+    :param session: SQLAlchemy session for database operations.
+    :param start_date: First date of the range.
+    :param end_date: Last date of the range (included).
+    :return: DataFrame with ticker_id, valid_from, valid_to.
+    """
+    rows = session.execute(
+        text("""
+            SELECT ticker_id, valid_from, valid_to
+            FROM sp_500_membership
+            WHERE valid_from <= :end_date AND (valid_to IS NULL OR valid_to > :start_date)
+            ORDER BY ticker_id, valid_from;
+        """),
+        {"start_date": start_date, "end_date": end_date},
+    ).fetchall()
+    return pd.DataFrame(rows, columns=["ticker_id", "valid_from", "valid_to"])
+
+
+def get_sp500_membership_mask(session, start_date: date, end_date: date, dates: Optional[pd.DatetimeIndex] = None) -> pd.DataFrame:
+    """
+    Boolean membership mask (dates x ticker ids) for a date range, from one query of the intervals: each interval
+    sets the dates between its bounds, found by binary search on the sorted dates.
+
+    :param session: SQLAlchemy session for database operations.
+    :param start_date: First date of the range.
+    :param end_date: Last date of the range (included).
+    :param dates: Dates of the mask (e.g. the trading days of the backtest), default: business days of the range.
+    :return: DataFrame indexed by date, one boolean column per ticker id.
+    """
+    dates = pd.DatetimeIndex(dates if dates is not None else pd.bdate_range(start_date, end_date)).sort_values()
+    intervals = get_sp500_membership_intervals(session, start_date=start_date, end_date=end_date)
+    ticker_ids = sorted(intervals["ticker_id"].unique())
+    mask = np.zeros((len(dates), len(ticker_ids)), dtype=bool)
+    if intervals.empty:
+        return pd.DataFrame(mask, index=dates, columns=ticker_ids)
+
+    columns = np.searchsorted(ticker_ids, intervals["ticker_id"].to_numpy())
+    starts = dates.searchsorted(pd.to_datetime(intervals["valid_from"]), side="left")
+    valid_to = pd.to_datetime(intervals["valid_to"])
+    ends = np.where(valid_to.isna(), len(dates), dates.searchsorted(valid_to.fillna(pd.Timestamp.max), side="left"))
+    for column, start, end in zip(columns, starts, ends):
+        mask[start:end, column] = True
+    return pd.DataFrame(mask, index=dates, columns=ticker_ids)
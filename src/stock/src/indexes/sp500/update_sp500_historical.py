@@ -11,6 +11,7 @@ from sqlalchemy import text, select
 
 from src.stock.src.db.database import session_local
 from src.stock.src.db.models import SP500Historical, SP500Changes, Ticker
+from src.stock.src.indexes.sp500.sp500_membership import rebuild_sp500_membership, verify_sp500_membership
 
 # -------------------- Wikipedia helpers --------------------
 
@@ -262,7 +263,11 @@ def update_sp500_historical_from_change(verify_with_wikipedia: bool = True) -> N
         if verify_with_wikipedia:
             _verify_against_wikipedia(session, snapshots[-1][0])
 
-        # 5) Refresh materialized views if needed
+        # 5) Rebuild the point-in-time membership intervals and check them against the last snapshot
+        rebuild_sp500_membership(session)
+        verify_sp500_membership(session, snapshots[-1][0])
+
+        # 6) Refresh materialized views if needed
         session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_sp_500_latest_date;"))
         session.commit()
         print("[ok] Materialized views refreshed.")
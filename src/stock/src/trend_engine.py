@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the pure Python kernel gives the same results
+    njit = None
+
+TREND_NONE, TREND_UP, TREND_DOWN = 0, 1, -1
+TREND_LABELS = {TREND_NONE: '', TREND_UP: 'up', TREND_DOWN: 'down'}
+TREND_CODES = {label: code for code, label in TREND_LABELS.items()}
+
+
+def _trend_kernel(high, low, close, sens_up, sens_down, index,
+                  curr_max, curr_min, all_time_high, all_time_high_index, trend,
+                  out_all_time_high, out_down_from_all_time_high, out_days_from_all_time_high,
+                  out_curr_max, out_curr_min, out_down_from_high, out_up_from_low,
+                  out_trend, out_trend_change, out_reversing):
+    """
+    State machine of the trend, one pass over contiguous arrays (same steps of the former iterrows loop).
+
+    Works on numpy arrays, in Python and compiled by numba, with numpy float semantics: a zero price (bad data)
+    gives inf / nan, as the former loop did, instead of raising ZeroDivisionError. The initial state is given, and the final
+    state (curr_max, curr_min, all_time_high, all_time_high_index, trend) is returned, so a run can be
+    resumed from the last analyzed candle.
+    """
+    for i in range(len(high)):
+        trend_change = False
+
+        up_from_low = (high[i] - curr_min) / curr_min * 100
+        down_from_high = (curr_max - low[i]) / curr_max * 100
+
+        if up_from_low >= sens_up[i] and trend != TREND_UP:
+            trend = TREND_UP
+            curr_max = high[i]
+            trend_change = True
+        elif down_from_high >= sens_down[i] and trend != TREND_DOWN:
+            trend = TREND_DOWN
+            curr_min = low[i]
+            trend_change = True
+
+        if high[i] > curr_max:
+            curr_max = high[i]
+
+        if high[i] > all_time_high:
+            all_time_high = high[i]
+            all_time_high_index = index[i]
+
+        if low[i] < curr_min:
+            curr_min = low[i]
+
+        down_from_high = (curr_max - close[i]) / curr_max * 100
+        up_from_low = (close[i] - curr_min) / curr_min * 100
+
+        out_all_time_high[i] = all_time_high
+        out_down_from_all_time_high[i] = (all_time_high - close[i]) / all_time_high * 100
+        out_days_from_all_time_high[i] = index[i] - all_time_high_index
+        out_curr_max[i] = curr_max
+        out_curr_min[i] = curr_min
+        out_down_from_high[i] = down_from_high
+        out_up_from_low[i] = up_from_low
+        out_trend[i] = trend
+        out_trend_change[i] = trend_change
+        out_reversing[i] = (trend == TREND_UP and down_from_high > up_from_low) or (trend == TREND_DOWN and up_from_low > down_from_high)
+
+    return curr_max, curr_min, all_time_high, all_time_high_index, trend
+
+
+_trend_kernel_compiled = njit(cache=True, error_model='numpy')(_trend_kernel) if njit is not None else None
+
+
+def initial_trend_state(high: float, low: float) -> dict:
+    """Return the state of the trend before the first candle, as initialized by add_trend / add_trend_atr."""
+    return {'curr_max': high, 'curr_min': low, 'all_time_high': high, 'all_time_high_index': 0, 'trend': TREND_NONE}
+
+
+def compute_trend(high: np.ndarray, low: np.ndarray, close: np.ndarray, sens_up: np.ndarray, sens_down: np.ndarray,
+                  index: np.ndarray, state: dict = None, use_numba: bool = True) -> (dict, dict):
+    """
+    Compute the trend columns for the given candles.
+
+    :param high: High prices.
+    :param low: Low prices.
+    :param close: Close prices.
+    :param sens_up: Percentage rise from the current minimum that starts an up trend, for each candle.
+    :param sens_down: Percentage drop from the current maximum that starts a down trend, for each candle.
+    :param index: Index labels of the candles (used for TrendDaysFromAllTimeHigh).
+    :param state: Trend state before the first candle (None = start from the first candle).
+    :param use_numba: Whether to use the compiled kernel, when numba is installed.
+    :return: The columns as numpy arrays (Trend as int codes) and the state after the last candle.
+    """
+    n = len(high)
+    if state is None:
+        state = initial_trend_state(high=high[0], low=low[0])
+
+    initial_state = (state['curr_max'], state['curr_min'], state['all_time_high'], state['all_time_high_index'], state['trend'])
+
+    if use_numba and _trend_kernel_compiled is not None:
+        outputs = [np.empty(n) for _ in range(7)] + [np.empty(n, dtype=np.int64), np.empty(n, dtype=np.bool_), np.empty(n, dtype=np.bool_)]
+        final_state = _trend_kernel_compiled(
+            np.ascontiguousarray(high, dtype=np.float64), np.ascontiguousarray(low, dtype=np.float64),
+            np.ascontiguousarray(close, dtype=np.float64), np.ascontiguousarray(sens_up, dtype=np.float64),
+            np.ascontiguousarray(sens_down, dtype=np.float64), np.ascontiguousarray(index, dtype=np.int64),
+            *(float(x) for x in initial_state[:3]), int(initial_state[3]), int(initial_state[4]), *outputs)
+    else:
+        outputs = [[None] * n for _ in range(10)]
+        arrays = [high, low, close, sens_up, sens_down]
+        # __ numpy floats (not python floats) so that zero prices give inf / nan as before instead of raising __
+        with np.errstate(divide='ignore', invalid='ignore'):
+            final_state = _trend_kernel(*(np.asarray(a, dtype=np.float64) for a in arrays), np.asarray(index).tolist(),
+                                        *(np.float64(x) for x in initial_state[:3]), *initial_state[3:], *outputs)
+        outputs = [np.asarray(values, dtype=np.float64) for values in outputs[:7]] + \
+                  [np.asarray(outputs[7], dtype=np.int64), np.asarray(outputs[8], dtype=np.bool_), np.asarray(outputs[9], dtype=np.bool_)]
+
+    columns = dict(zip(['TrendAllTimeHigh', 'TrendDownFromAllTimeHigh', 'TrendDaysFromAllTimeHigh', 'currMax', 'currMin',
+                        'DownFromHigh', 'UpFromLow', 'Trend', 'TrendChange', 'reversing'], outputs))
+    final_state = dict(zip(['curr_max', 'curr_min', 'all_time_high', 'all_time_high_index', 'trend'], final_state))
+    return columns, final_state
+
+
+def trend_columns_to_frame(columns: dict, index: pd.Index, names: list[str]) -> pd.DataFrame:
+    """
+    Build the DataFrame of the trend columns with the dtypes produced by the former candles.at assignments
+    (float64 for numbers, object for Trend, TrendChange and reversing).
+
+    :param columns: The columns returned by compute_trend.
+    :param index: Index of the candles.
+    :param names: Names (and order) of the columns to return.
+    :return: DataFrame of the trend columns.
+    """
+    data = {}
+    for name in names:
+        values = columns[name]
+        if name == 'Trend':
+            values = np.array([TREND_LABELS[code] for code in values.tolist()], dtype=object)
+        elif values.dtype == np.bool_:
+            values = np.array(values.tolist(), dtype=object)
+        data[name] = values
+    return pd.DataFrame(data, index=index)
@@ -0,0 +1,20 @@
+import threading
+from typing import Optional
+
+import pandas as pd
+import yfinance as yf
+
+# __ yf.download keeps its results and errors in module-level state (yfinance.shared._DFS / _ERRORS) and resets it
+#    on every call, so concurrent calls (worker pool, prefetch threads) can lose data or swap errors __
+YF_DOWNLOAD_LOCK = threading.Lock()
+
+
+def yf_download(**kwargs) -> Optional[pd.DataFrame]:
+    """
+    Call yf.download with the given arguments, one call at a time across all the threads of the process.
+
+    :param kwargs: The arguments of yf.download.
+    :return: The DataFrame returned by yf.download.
+    """
+    with YF_DOWNLOAD_LOCK:
+        return yf.download(**kwargs)
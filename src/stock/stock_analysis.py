@@ -1,5 +1,6 @@
 import yfinance as yf
 import pandas as pd
+from datetime import date
 from sqlalchemy import func, desc
 from sqlalchemy.orm import aliased
 from sqlalchemy import text
@@ -7,22 +8,72 @@ from sqlalchemy import text
 from src.common.tools.library import *
 from src.stock.src.db.database import session_local
 from src.stock.src.db.models import CandleAnalysisCandlestickDay, CandleDataDay, Ticker, InfoTradingSession, InfoMarketAndFinancialMetrics
+from src.stock.src.db.models import LatestInfoTradingSession
 from stock.src.CandleAnalysisService import CandleAnalysisService
+from stock.src.CandleBatchAnalysisService import CandleBatchAnalysisService
 from stock.src.CandleDataInterval import CandleDataInterval
-# from stock.stock_main import get_all_not_updated_analysis_symbols_from_db
 from stock.src.indexes.sp500.sp500Handler import SP500Handler
+from src.stock.src.indexes.sp500.sp500_membership import MEMBERS_AS_OF_SQL
 
 
-def update_analysis(_session):
-    symbols = get_all_not_updated_analysis_symbols_from_db(_session)
+def get_all_not_updated_analysis_symbols_from_db(_session) -> list[str]:
+    """
+    Symbols whose last daily candle has no analysis, or an analysis older than the candle (candle rewritten).
+
+    :param _session: SQLAlchemy session for database operations.
+    :return: Sorted list of symbols.
+    """
+    query = text("""
+    SELECT T.symbol
+    FROM ticker T
+    JOIN latest_candle_data_day L ON L.ticker_id = T.id
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM candle_data_day C
+        JOIN candle_analysis_trend_method_1_day A ON A.candle_data_day_id = C.id
+        WHERE C.ticker_id = T.id AND C.date = L.date AND (C.last_update IS NULL OR A.last_update >= C.last_update)
+    )
+    ORDER BY T.symbol
+    """)
+    return [row[0] for row in _session.execute(query).fetchall()]
+
+
+def update_analysis(_session, incremental: bool = True, symbols: list[str] = None):
+    symbols = symbols if symbols is not None else get_all_not_updated_analysis_symbols_from_db(_session)
 
     print(f"There are {len(symbols)} tickers to analyze")
+    if not symbols:
+        return
 
     initial_time = time()
     for symbol in symbols:
         start_time = time()
         print(f"{symbol} - Start analyzing candlestick data with interval {CandleDataInterval.DAY.value}...")
-        analysis = CandleAnalysisService(session=_session, symbol=symbol, interval=CandleDataInterval.DAY)
+        analysis = CandleAnalysisService(session=_session, symbol=symbol, interval=CandleDataInterval.DAY, incremental=incremental)
+        candle_data_ = analysis.analyze()
+        analysis.handle_candle_analysis_data(candle_data_)
+        print(f"        - Candlestick data analysis data handled in {time() - start_time:.2f} seconds")
+
+    end_time = time()
+    total_time = seconds_to_time(end_time - initial_time)
+    print(f"{'Total elapsed time:'.ljust(25)} {total_time['hours']} hours {total_time['minutes']} min {total_time['seconds']} sec")
+    print(f"{'Total tickers:'.ljust(25)} {len(symbols)}")
+    print(f"{'Average time per ticker:'.ljust(25)} {round((end_time - initial_time) / len(symbols), 3)} sec")
+
+
+def update_analysis_batch(_session, batch_size: int = 100, symbols: list[str] = None):
+    symbols = symbols if symbols is not None else get_all_not_updated_analysis_symbols_from_db(_session)
+
+    print(f"There are {len(symbols)} tickers to analyze")
+    if not symbols:
+        return
+
+    initial_time = time()
+    for i in range(0, len(symbols), batch_size):
+        start_time = time()
+        batch = symbols[i:i + batch_size]
+        print(f"Batch {i // batch_size + 1} - Start analyzing candlestick data of {len(batch)} tickers with interval {CandleDataInterval.DAY.value}...")
+        analysis = CandleBatchAnalysisService(session=_session, symbols=batch)
         candle_data_ = analysis.analyze()
         analysis.handle_candle_analysis_data(candle_data_)
         print(f"        - Candlestick data analysis data handled in {time() - start_time:.2f} seconds")
@@ -100,32 +151,23 @@ def build_sp_500_value(_session):
 
 
 def get_last_market_cap_for_ticker_from_db(_session, _symbol):
-    result = (_session.query(InfoTradingSession.market_cap, Ticker.symbol).
-              join(Ticker, InfoTradingSession.ticker_id == Ticker.id).
+    # __ latest info_trading_session record of the ticker, maintained on write __
+    result = (_session.query(LatestInfoTradingSession.market_cap, Ticker.symbol).
+              join(Ticker, LatestInfoTradingSession.ticker_id == Ticker.id).
               filter(Ticker.symbol == _symbol)
-              .order_by(desc(InfoTradingSession.last_update))
               .first())
 
     return result[0] if result else None
 
 
 def get_latest_market_caps_from_db(_session):
-    # Get the most recent market_cap, last_update for each ticker
-    subquery = _session.query(
-        InfoTradingSession.ticker_id,
-        func.max(InfoTradingSession.last_update).label('latest_update')
-    ).group_by(InfoTradingSession.ticker_id).subquery()
-
+    # Get the most recent market_cap, last_update for each ticker (one row per ticker in the latest-state table)
     results = (_session.query(
         Ticker.symbol,
-        InfoTradingSession.market_cap,
-        InfoTradingSession.last_update
-    ).join(
-        subquery,
-        (InfoTradingSession.ticker_id == subquery.c.ticker_id) &
-        (InfoTradingSession.last_update == subquery.c.latest_update)
-    ).join(Ticker, InfoTradingSession.ticker_id == Ticker.id)
-               .order_by(desc(InfoTradingSession.market_cap))
+        LatestInfoTradingSession.market_cap,
+        LatestInfoTradingSession.last_update
+    ).join(Ticker, LatestInfoTradingSession.ticker_id == Ticker.id)
+               .order_by(desc(LatestInfoTradingSession.market_cap))
                .all())
 
     return results
@@ -141,120 +183,93 @@ def get_outstanding_shares_history_for_ticker_from_db(_session, _symbol):
     return pd.DataFrame(results, columns=['Ticker', 'Shares Outstanding', 'last_update']) if results else None
 
 
-def get_sp500_stocks_above_200_ma(_session) -> pd.DataFrame:
+def get_sp500_stocks_above_200_ma(_session, as_of: date = None) -> pd.DataFrame:
+    """
+    Last close vs 200-day moving average of the S&P 500 constituents at the given date, computed in the database:
+    the members at the date (sp_500_membership), and their last candle on or before the date (one index probe per
+    member).
+
+    :param _session: SQLAlchemy session for database operations.
+    :param as_of: Date of the membership and of the candles, default: today.
+    :return: DataFrame with symbol, date, close, ma200, above_200_ma, percentage_above_200_ma.
+    """
     query = text(f"""
-    SELECT
-        C.close,  -- Close price from CandleDataDay
-        I.ma200,  -- 200-day moving average from CandleAnalysisIndicatorsDay
-        T.symbol,  -- Symbol from Ticker
-        C.date  -- Date from CandleDataDay
-    FROM
-        candle_data_day C
-    JOIN
-        candle_analysis_indicators_day I ON I.candle_data_day_id = C.id
-    JOIN
-        ticker T ON C.ticker_id = T.id
-    WHERE
-        EXISTS (
-            SELECT 1
-            FROM candle_data_day sub_C
-            WHERE sub_C.ticker_id = C.ticker_id
-            AND sub_C.date = C.date
-            AND sub_C.date = (
-                SELECT MAX(latest_sub.date)
-                FROM candle_data_day latest_sub
-                WHERE latest_sub.ticker_id = C.ticker_id
-            )
-        )
+    WITH members AS ({MEMBERS_AS_OF_SQL})
+    SELECT T.symbol,
+           C.date,
+           C.close,
+           I.ma200,
+           C.close > I.ma200 AS above_200_ma,
+           (C.close - I.ma200) / NULLIF(I.ma200, 0) * 100 AS percentage_above_200_ma
+    FROM members M
+    JOIN ticker T ON T.id = M.ticker_id
+    CROSS JOIN LATERAL (
+        SELECT id, date, close
+        FROM candle_data_day
+        WHERE ticker_id = M.ticker_id AND date <= :as_of
+        ORDER BY date DESC
+        LIMIT 1
+    ) C
+    JOIN candle_analysis_indicators_day I ON I.candle_data_day_id = C.id
     ORDER BY T.symbol
     ;""")
 
-    # Execute the query through the session
-    results = session.execute(query).fetchall()
-
-    # __ convert the query results to a list of dictionaries
-    results_as_dicts = [
-        {'close': result[0],
-         'ma200': result[1],
-         'symbol': result[2],
-         'date': result[3]}
-        for result in results
-    ]
-
-    # Create a DataFrame from the list of dictionaries
-    df = pd.DataFrame(results_as_dicts)
-    df['above_200_ma'] = df['close'] > df['ma200']
-    df['percentage_above_200_ma'] = (df['close'] - df['ma200']) / df['ma200'] * 100
-
-    # __ get the S&P 500 symbols __
-    sp500_handler = SP500Handler()
-    symbols = sp500_handler.get_sp500_from_wikipedia()
-
-    # __ select only the S&P 500 stocks __
-    filtered_df = df[df['symbol'].isin(symbols)]
+    results = _session.execute(query, {'as_of': as_of or date.today()}).fetchall()
+    df = pd.DataFrame(results, columns=['symbol', 'date', 'close', 'ma200', 'above_200_ma', 'percentage_above_200_ma'])
 
     # __ print percentage of stocks above 200 ma __
-    print(f"Percentage of stocks above 200-day moving average: {filtered_df['above_200_ma'].mean() * 100:.2f}%")
-
-    return filtered_df
-
+    print(f"Percentage of stocks above 200-day moving average: {df['above_200_ma'].mean() * 100:.2f}%")
 
-def get_sp500_historical_percentage_above_200_ma(_session) -> pd.DataFrame:
-    query = text(f"""
-    SELECT T.symbol,
-            C.date,
-            C.close,
-            I.ma200
-    FROM ticker T
-    JOIN candle_data_day C ON T.id = C.ticker_id
-    JOIN candle_analysis_indicators_day I ON C.id = I.candle_data_day_id
-    WHERE C.date >= '2020-01-01' AND C.date <= '2024-09-29'
-    ;
-    """)
-
-    # Execute the query through the session
-    results = session.execute(query).fetchall()
-
-    # __ convert the query results to a list of dictionaries
-    results_as_dicts = [
-        {'symbol': result[0],
-         'date': result[1],
-         'close': result[2],
-         'ma200': result[3],
-         }
-        for result in results
-    ]
-
-    # Create a DataFrame from the list of dictionaries
-    df = pd.DataFrame(results_as_dicts)
-    df['above_200_ma'] = df['close'] > df['ma200']
-    df['percentage_above_200_ma'] = (df['close'] - df['ma200']) / df['ma200'] * 100
+    return df
 
-    # __ get the S&P 500 symbols __
-    sp500_handler = SP500Handler()
-    symbols = sp500_handler.get_sp500_from_wikipedia()
 
-    # __ select only the S&P 500 stocks __
-    filtered_df = df[df['symbol'].isin(symbols)]
+def get_sp500_historical_percentage_above_200_ma(_session, start_date: date = date(2020, 1, 1), end_date: date = None, plot: bool = True) -> pd.DataFrame:
+    """
+    Breadth of the S&P 500 (percentage of the constituents closing above their 200-day moving average) per date,
+    aggregated in the database. The constituents of each date are the members at that date (sp_500_membership
+    intervals), without survivorship bias.
+
+    :param _session: SQLAlchemy session for database operations.
+    :param start_date: First date of the series.
+    :param end_date: Last date of the series, default: today.
+    :param plot: Whether to plot the series.
+    :return: DataFrame indexed by date with total_symbols and percentage_above_200_ma.
+    """
+    query = text("""
+    WITH members AS (
+        SELECT ticker_id, valid_from, valid_to
+        FROM sp_500_membership
+        WHERE valid_from <= :end_date AND (valid_to IS NULL OR valid_to > :start_date)
+    )
+    SELECT C.date,
+           COUNT(*) AS total_symbols,
+           100.0 * COUNT(*) FILTER (WHERE C.close > I.ma200) / COUNT(*) AS percentage_above_200_ma
+    FROM members M
+    JOIN candle_data_day C ON C.ticker_id = M.ticker_id
+                          AND C.date >= GREATEST(M.valid_from, :start_date)
+                          AND C.date <= :end_date
+                          AND (M.valid_to IS NULL OR C.date < M.valid_to)
+    JOIN candle_analysis_indicators_day I ON I.candle_data_day_id = C.id
+    GROUP BY C.date
+    ORDER BY C.date
+    ;""")
 
-    grouped_df = (filtered_df
-                  .groupby('date')
-                  .agg(
-        total_symbols=('symbol', 'count'),
-        percentage_above_200_ma=('above_200_ma', lambda x: (x.sum() / len(x)) * 100)
-    ))
+    results = _session.execute(query, {'start_date': start_date, 'end_date': end_date or date.today()}).fetchall()
+    grouped_df = pd.DataFrame(results, columns=['date', 'total_symbols', 'percentage_above_200_ma']).set_index('date')
+    grouped_df['percentage_above_200_ma'] = grouped_df['percentage_above_200_ma'].astype(float)
 
-    import matplotlib.pyplot as plt
+    if plot:
+        import matplotlib.pyplot as plt
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(grouped_df.index, grouped_df['percentage_above_200_ma'], marker='o', linestyle='-', color='b')
+        plt.figure(figsize=(10, 6))
+        plt.plot(grouped_df.index, grouped_df['percentage_above_200_ma'], marker='o', linestyle='-', color='b')
 
-    plt.title('Percentage of Symbols Above 200 MA Over Time', fontsize=14)
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Percentage Above 200 MA (%)', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.grid(True)
-    plt.show()
+        plt.title('Percentage of Symbols Above 200 MA Over Time', fontsize=14)
+        plt.xlabel('Date', fontsize=12)
+        plt.ylabel('Percentage Above 200 MA (%)', fontsize=12)
+        plt.xticks(rotation=45, ha='right')
+        plt.grid(True)
+        plt.show()
 
     return grouped_df
 
@@ -374,6 +389,7 @@ if __name__ == "__main__":
 
     # __ update analysis __
     # update_analysis(_session=session)
+    # update_analysis_batch(_session=session)
 
     # __ get the historical percentage of S&P 500 stocks above 200 ma __
     # df = get_sp500_historical_percentage_above_200_ma(_session=session)
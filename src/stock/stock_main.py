@@ -10,6 +10,9 @@ from src.stock.src.db.database import session_local
 from src.stock.src.Queries import Queries
 from src.stock.src.StockUpdater import StockUpdater
 from src.stock.src.db.models import *
+from src.stock.src.db.partitions import maintain_candle_partitions
+from src.stock.src.db.mv_refresh import refresh_materialized_views as refresh_views
+from src.stock.src.PipelineStats import PIPELINE_STATS
 
 from src.common.telegram_manager.telegram_manager import TelegramBot
 from src.common.file_manager.FileManager import FileManager
@@ -31,17 +34,11 @@ def archive_logs():
     print('end')
 
 
-def refresh_materialized_views(session: sess.Session):
-    # __ refresh materialized views __
+def refresh_materialized_views(session: sess.Session, full_refresh: bool = False):
+    # __ refresh concurrently the materialized views whose sources were touched by the run, inputs first __
     LOGGER.info("Refreshing materialized views...")
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_recent_candle_data_day;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_last_info_trading_session;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_last_info_general_stock;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_ticker_overview;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_pe;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_next_earnings_per_ticker;"))
-    session.execute(text("REFRESH MATERIALIZED VIEW mv_monthly_net_insider_transactions;"))
-    session.commit()
+    touched = None if full_refresh else PIPELINE_STATS.touched_symbols()
+    refresh_views(session=session, touched=touched)
     LOGGER.info("Materialized views refreshed.")
 
     # __ sqlAlchemy __ close the session
@@ -172,7 +169,11 @@ def main(process_name_: str = None,
          add_sp500: bool = True,
          only_sp500: bool = False,
          only_yf_error: bool = False,
-         refresh_materialized: bool = True):
+         refresh_materialized: bool = True,
+         max_workers: int = 1,
+         requests_per_second: float = None,
+         use_ttl: bool = True,
+         adaptive_rate: bool = True):
 
     LOGGER.info(process_name_)
 
@@ -182,6 +183,9 @@ def main(process_name_: str = None,
     # __ set up telegram bot __
     admin_info, telegram_bot = set_up_telegram_bot()
 
+    # __ create the upcoming partitions of the intraday candle tables and drop the expired ones __
+    maintain_candle_partitions(session=session)
+
     # __ get tickers __
     symbols = select_tickers(session=session, limit=limit, add_sp500=add_sp500, only_sp500=only_sp500, only_yf_error=only_yf_error)
 
@@ -211,7 +215,12 @@ def main(process_name_: str = None,
     #            "0P00019VDZ.F",
     #            "0P00019VE0.F"]
 
-    stock_updater = StockUpdater(session=session, symbols_with_errors=symbols_with_errors)
+    stock_updater = StockUpdater(session=session,
+                                 symbols_with_errors=symbols_with_errors,
+                                 max_workers=max_workers,
+                                 requests_per_second=requests_per_second,
+                                 use_ttl=use_ttl,
+                                 adaptive_rate=adaptive_rate)
     results = stock_updater.update_all_tickers(symbols=symbols)
 
     # __ refresh materialized views __
@@ -257,6 +266,9 @@ def update_only_candles(process_name_: str = None):
     # __ print the number of tickers __
     LOGGER.info(f"{'Total tickers:'.ljust(25)} {len(symbols)}")
 
+    # __ create the upcoming partitions of the intraday candle tables and drop the expired ones __
+    maintain_candle_partitions(session=session)
+
     stock_updater = StockUpdater(session=session)
     stock_updater.update_only_candles_all_tickers(symbols=symbols)
 